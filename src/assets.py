@@ -0,0 +1,287 @@
+import errno
+import json
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+
+import profiler
+from fsutil import write_atomic
+from manifest import file_digest, remove_empty_parents
+
+COMPARE_MODES = ("mtime", "hash")
+
+# Written to the destination when assets are fingerprinted: maps the url
+# of every asset to its fingerprinted url
+ASSET_MANIFEST = "asset-manifest.json"
+FINGERPRINT_LENGTH = 10
+
+
+class SyncStats:
+    def __init__(self):
+        self.copied = 0
+        self.copied_bytes = 0
+        self.skipped = 0
+        self.skipped_bytes = 0
+        self.removed = 0
+        self.removed_bytes = 0
+        self.hashed = 0
+        # {asset url: fingerprinted url}, when fingerprinting
+        self.assets = {}
+
+    def __repr__(self):
+        return (
+            f"SyncStats(copied={self.copied} ({self.copied_bytes} B), "
+            f"skipped={self.skipped} ({self.skipped_bytes} B), "
+            f"removed={self.removed} ({self.removed_bytes} B))"
+        )
+
+
+def gather_files(directory):
+    """
+    Return {relative posix path: os.stat_result} for every file under directory.
+    """
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, directory).replace(os.sep, "/")
+            files[rel] = os.stat(path)
+    return files
+
+
+class HashCache:
+    """
+    sha256 digests of files, kept with the size and mtime they were computed
+    for so that unchanged files are never hashed again.
+    """
+
+    def __init__(self, path=None, entries=None):
+        self.path = path
+        self.entries = entries if entries is not None else {}
+        self.hashed = 0
+
+    @classmethod
+    def load(cls, path):
+        if path is None or not path.exists():
+            return cls(path)
+        try:
+            return cls(path, json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable hash cache {path}: {e}")
+            return cls(path)
+
+    def digest(self, key, path, stat):
+        entry = self.entries.get(key)
+        if entry is not None and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return entry[2]
+        digest = file_digest(path)
+        self.hashed += 1
+        self.entries[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def save(self, keys):
+        """
+        Write the cache, keeping only the entries of keys.
+        """
+        if self.path is None:
+            return
+        self.entries = {k: v for k, v in self.entries.items() if k in keys}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(
+            json.dumps(self.entries, indent=1, sort_keys=True), encoding="utf-8"
+        )
+
+
+def fingerprint_name(rel, digest):
+    """
+    Return rel ("images/a.png") with the start of digest before its suffix
+    ("images/a.1a2b3c4d5e.png").
+    """
+    path = PurePosixPath(rel)
+    fingerprint = digest[:FINGERPRINT_LENGTH]
+    return str(path.with_name(f"{path.stem}.{fingerprint}{path.suffix}"))
+
+
+def load_asset_manifest(destination):
+    """
+    Return the {asset url: fingerprinted url} map written by the last sync,
+    or None when assets are not fingerprinted.
+    """
+    path = destination / ASSET_MANIFEST
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def is_unchanged(source, source_stat, dest, compare, link):
+    try:
+        dest_stat = dest.stat()
+    except FileNotFoundError:
+        return False
+    if link:
+        return os.path.samestat(source_stat, dest_stat)
+    if source_stat.st_size != dest_stat.st_size:
+        return False
+    if compare == "hash":
+        return file_digest(source) == file_digest(dest)
+    return source_stat.st_mtime_ns == dest_stat.st_mtime_ns
+
+
+def copy_file(source, dest, link=False):
+    """
+    Replace dest with a copy of (or, with link=True, a hard link to) source.
+
+    The data is copied inside the kernel with copy_file_range where the
+    platform supports it; otherwise shutil.copyfile, which uses sendfile
+    on Linux. The source mtime is kept so the next sync can compare it.
+    """
+    tmp = dest.with_name(dest.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        if link:
+            os.link(source, tmp)
+        else:
+            _copy_data(source, tmp)
+            stat = source.stat()
+            os.utime(tmp, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(tmp, dest)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _copy_data(source, dest):
+    if hasattr(os, "copy_file_range"):
+        with source.open("rb") as fsrc, dest.open("wb") as fdst:
+            try:
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1 << 30):
+                    pass
+                return
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL):
+                    raise
+    shutil.copyfile(source, dest)
+
+
+def load_synced(state_path):
+    """
+    Return {source path: destination path} of the files synced last time.
+    """
+    if state_path is None or not state_path.exists():
+        return {}
+    try:
+        synced = json.loads(state_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable asset state {state_path}: {e}")
+        return {}
+    if isinstance(synced, list):
+        # Written before fingerprinting, when every file kept its name
+        return {rel: rel for rel in synced}
+    return synced
+
+
+def save_synced(state_path, synced):
+    if state_path is None:
+        return
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    state_path.write_text(
+        json.dumps(synced, indent=1, sort_keys=True), encoding="utf-8"
+    )
+
+
+def sync_static_assets(
+    source,
+    destination,
+    compare="mtime",
+    link=False,
+    jobs=1,
+    state_path=None,
+    fingerprint=False,
+    hash_cache_path=None,
+):
+    """
+    Make the files under destination that came from source match source.
+
+    Files are compared by size and mtime, or by size and content hash with
+    compare="hash", and only changed files are copied. Files synced by an
+    earlier run whose source is gone are removed; the list of synced files
+    is kept in state_path. Anything else in destination, such as the
+    generated pages, is left alone.
+
+    With fingerprint=True every file is copied to a name that contains its
+    content hash (see fingerprint_name) and the url map is written to
+    ASSET_MANIFEST in destination. Hashes are cached in hash_cache_path by
+    size and mtime.
+    """
+    if not source.exists():
+        raise FileNotFoundError(f"Directory {source} does not exist.")
+    if compare not in COMPARE_MODES:
+        raise ValueError(f"Unknown compare mode: {compare}")
+
+    logging.info(f"Syncing static assets from {source} to {destination}")
+    stats = SyncStats()
+    files = gather_files(source)
+    hashes = HashCache.load(hash_cache_path) if fingerprint else None
+
+    targets = {}
+    to_copy = []
+    for rel, stat in sorted(files.items()):
+        src_path = source / rel
+        target = rel
+        if fingerprint:
+            target = fingerprint_name(rel, hashes.digest(rel, src_path, stat))
+            stats.assets[f"/{rel}"] = f"/{target}"
+        targets[rel] = target
+        dest_path = destination / target
+        if is_unchanged(src_path, stat, dest_path, compare, link):
+            stats.skipped += 1
+            stats.skipped_bytes += stat.st_size
+            continue
+        to_copy.append((src_path, dest_path))
+        stats.copied += 1
+        stats.copied_bytes += stat.st_size
+
+    for parent in sorted({dest_path.parent for _, dest_path in to_copy}):
+        parent.mkdir(parents=True, exist_ok=True)
+
+    def copy(paths):
+        logging.debug("Copying file: %s to %s", *paths)
+        with profiler.span("copy", cat="asset", path=str(paths[0])):
+            copy_file(*paths, link=link)
+
+    if jobs > 1 and len(to_copy) > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            list(pool.map(copy, to_copy))
+    else:
+        for paths in to_copy:
+            copy(paths)
+
+    for rel in sorted(set(load_synced(state_path).values()) - set(targets.values())):
+        stale = destination / rel
+        if stale.is_file():
+            logging.debug("Removing stale asset: %s", stale)
+            stats.removed += 1
+            stats.removed_bytes += stale.stat().st_size
+            stale.unlink()
+            remove_empty_parents(stale.parent, destination)
+    save_synced(state_path, targets)
+
+    manifest_path = destination / ASSET_MANIFEST
+    if fingerprint:
+        stats.hashed = hashes.hashed
+        hashes.save(files)
+        # Replaced rather than rewritten: a staged build shares the file
+        # with the published one through a hard link
+        write_atomic(manifest_path, json.dumps(stats.assets, indent=1, sort_keys=True))
+    elif ASSET_MANIFEST not in files:
+        manifest_path.unlink(missing_ok=True)
+
+    logging.info(
+        f"Static assets: {stats.copied} copied ({stats.copied_bytes} bytes), "
+        f"{stats.skipped} unchanged ({stats.skipped_bytes} bytes), "
+        f"{stats.removed} removed ({stats.removed_bytes} bytes)"
+        + (f", {stats.hashed} hashed" if fingerprint else "")
+    )
+    return stats
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of parsed pages.
+
+    uv run python3 src/astcache.py info
+    uv run python3 src/astcache.py clear
+    uv run python3 src/astcache.py evict --max-size 16
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import pickle
+from pathlib import Path
+
+from fragments import FragmentNode
+from htmlnode import LeafNode, ParentNode
+
+# Bump whenever a change to the markdown parser alters the trees it builds,
+# so that trees cached by an older parser are never reused.
+PARSER_VERSION = 3
+
+# Tag of encoded FragmentNodes; never an HTML tag
+FRAGMENT_TAG = "#fragment"
+
+DEFAULT_DIR = Path(".ssg-cache") / "ast"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def cache_key(source_digest):
+    """
+    Return the cache key of a page: its source digest plus the parser version.
+    """
+    return hashlib.sha256(f"{PARSER_VERSION}:{source_digest}".encode()).hexdigest()
+
+
+def encode_node(node):
+    """
+    Turn a node tree into nested tuples: (tag, value, props) for leaves and
+    (tag, (children...), props) for parents, with None for empty props.
+    FragmentNodes become (FRAGMENT_TAG, (block type, text, block), None).
+    """
+    if isinstance(node, FragmentNode):
+        block = encode_node(node.children[0])
+        return (FRAGMENT_TAG, (node.block_type, node.text, block), None)
+    props = dict(node.props) or None
+    if isinstance(node, ParentNode):
+        return (node.tag, tuple(encode_node(child) for child in node.children), props)
+    return (node.tag, node.value, props)
+
+
+def decode_node(data):
+    tag, value, props = data
+    if tag == FRAGMENT_TAG:
+        block_type, text, block = value
+        return FragmentNode(block_type, text, decode_node(block))
+    if isinstance(value, tuple):
+        return ParentNode(tag, [decode_node(child) for child in value], props)
+    return LeafNode(tag, value, props)
+
+
+class ASTCache:
+    """
+    Parsed pages, one file per page under directory.
+
+    Entries hold the title and the node tree of a page before any basepath
+    is applied, so a template or basepath change can reuse them. Reading an
+    entry touches its mtime; evict() drops the least recently used entries
+    until the cache fits in max_bytes. Entries are written atomically, so
+    several build processes can share the cache.
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path_for(self, source_digest):
+        key = cache_key(source_digest)
+        return self.directory / key[:2] / f"{key}.pickle"
+
+    def get(self, source_digest):
+        """
+        Return (title, node tree) for the page, or None if it is not cached.
+        """
+        path = self.path_for(source_digest)
+        try:
+            with path.open("rb") as f:
+                title, tree = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, ValueError, EOFError) as e:
+            logging.warning(f"Ignoring unreadable AST cache entry {path}: {e}")
+            return None
+        return title, decode_node(tree)
+
+    def put(self, source_digest, title, node):
+        path = self.path_for(source_digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            with tmp_path.open("wb") as f:
+                pickle.dump((title, encode_node(node)), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def entries(self):
+        """
+        Return [(path, size, mtime_ns)] for every entry, oldest first.
+        """
+        entries = []
+        for path in self.directory.glob("*/*.pickle"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime_ns))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in
+        max_bytes. Returns the number of entries and bytes removed.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = removed_bytes = 0
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+            removed_bytes += size
+        if removed:
+            logging.info(
+                f"Evicted {removed} AST cache entries ({removed_bytes} bytes), "
+                f"{total} bytes left"
+            )
+        return removed, removed_bytes
+
+    def clear(self):
+        entries = self.entries()
+        for path, _, _ in entries:
+            path.unlink(missing_ok=True)
+        for directory in self.directory.glob("*"):
+            if directory.is_dir() and not any(directory.iterdir()):
+                directory.rmdir()
+        return len(entries), sum(size for _, size, _ in entries)
+
+
+def cache_info(args):
+    cache = ASTCache(args.dir)
+    entries = cache.entries()
+    total = sum(size for _, size, _ in entries)
+    print(f"{cache.directory}: {len(entries)} entries, {total / 1024:.1f} KiB")
+    print(f"parser version {PARSER_VERSION}")
+
+
+def cache_clear(args):
+    count, size = ASTCache(args.dir).clear()
+    print(f"Removed {count} entries ({size / 1024:.1f} KiB)")
+
+
+def cache_evict(args):
+    count, size = ASTCache(args.dir, args.max_size * 1024 * 1024).evict()
+    print(f"Removed {count} entries ({size / 1024:.1f} KiB)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--dir", type=Path, default=DEFAULT_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    info = commands.add_parser("info", help="show the cache size")
+    info.set_defaults(func=cache_info)
+
+    clear = commands.add_parser("clear", help="remove every entry")
+    clear.set_defaults(func=cache_clear)
+
+    evict = commands.add_parser("evict", help="shrink the cache to a size")
+    evict.add_argument(
+        "--max-size",
+        type=int,
+        default=DEFAULT_MAX_BYTES // 1024 // 1024,
+        metavar="MiB",
+    )
+    evict.set_defaults(func=cache_evict)
+
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the generator.
+
+    uv run python3 src/bench.py run --output bench.json
+    uv run python3 src/bench.py compare baseline.json bench.json
+    uv run python3 src/bench.py inline
+    uv run python3 src/bench.py memory
+    uv run python3 src/bench.py startup
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from blocks import BlockType, block_to_block_type, collapse_paragraph
+from blocks import markdown_to_blocks, markdown_to_html_node
+from corpus import DEFAULT_MIX, generate_corpus, parse_mix
+from htmlnode import HTMLNode
+from main import extract_title
+from render import RenderContext
+from textnode import (
+    TextNode,
+    TextType,
+    split_nodes_delimiter,
+    split_nodes_links_and_images,
+    text_to_textnodes,
+)
+from urls import url_for
+
+# Imports a build that has nothing to render should never pay for
+DEFERRED_IMPORTS = (
+    "jinja2",
+    "icecream",
+    "multiprocessing",
+    "concurrent.futures.process",
+    "subprocess",
+    "tracemalloc",
+    "gzip",
+)
+
+STAGES = (
+    "markdown_to_blocks",
+    "block_to_block_type",
+    "text_to_textnodes",
+    "to_html",
+    "template",
+    "write",
+)
+
+
+def legacy_text_to_textnodes(text):
+    """
+    The four-pass tokenizer text_to_textnodes replaced, kept for comparison.
+    """
+    nodes = split_nodes_links_and_images([TextNode(text, TextType.TEXT)])
+    for delimiter, text_type in (
+        ("**", TextType.BOLD),
+        ("_", TextType.ITALIC),
+        ("`", TextType.CODE),
+    ):
+        next_nodes = []
+        for node in nodes:
+            if node.text_type == TextType.TEXT:
+                next_nodes += split_nodes_delimiter([node], delimiter, text_type)
+            else:
+                next_nodes.append(node)
+        nodes = next_nodes
+    return nodes
+
+
+class LegacyHTMLNode:
+    """
+    HTMLNode as it was before __slots__: a per-instance __dict__ and a
+    fresh children list and props dict for every node.
+    """
+
+    def __init__(self, tag=None, value=None, children=None, props=None):
+        self.tag = tag
+        self.value = value
+        self.children = children if children is not None else []
+        self.props = props if props is not None else {}
+
+
+def copy_tree(node, factory):
+    """
+    Copy a node tree with factory(tag, value, children, props). Tag and
+    value strings are shared with the original, so measuring the copy
+    measures only the node representation.
+    """
+    children = [copy_tree(child, factory) for child in node.children] or None
+    return factory(node.tag, node.value, children, dict(node.props) or None)
+
+
+def count_nodes(node):
+    return 1 + sum(count_nodes(child) for child in node.children)
+
+
+def measure(build):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def bench_memory(args):
+    pages = [
+        markdown_to_html_node(page)
+        for _, page in generate_corpus(pages=args.pages, seed=args.seed)
+    ]
+    nodes = sum(count_nodes(page) for page in pages)
+    print(f"{len(pages)} pages, {nodes} nodes")
+    for name, factory in (("dict", LegacyHTMLNode), ("slots", HTMLNode)):
+        _, size = measure(lambda: [copy_tree(page, factory) for page in pages])
+        print(f"{name:6} {size / 1024 / 1024:8.2f} MiB  {size / nodes:6.1f} bytes/node")
+
+
+def load_content(content_dir):
+    return [path.read_text(encoding="utf-8") for path in content_dir.rglob("*.md")]
+
+
+def inline_texts(pages):
+    """
+    Return the inline strings the block parser would hand to the tokenizer.
+    """
+    texts = []
+    for page in pages:
+        for block in markdown_to_blocks(page):
+            if block_to_block_type(block) != BlockType.CODE:
+                texts.append(collapse_paragraph(block))
+    return texts
+
+
+def best_time(func, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_inline(args):
+    corpora = {
+        "content": load_content(args.content),
+        "synthetic": [
+            page
+            for _, page in generate_corpus(
+                pages=args.pages, inline_density=args.inline_density, seed=args.seed
+            )
+        ],
+    }
+    for name, pages in corpora.items():
+        texts = inline_texts(pages)
+        size = sum(len(text) for text in texts)
+        legacy = best_time(legacy_text_to_textnodes, texts, args.repeat)
+        single = best_time(text_to_textnodes, texts, args.repeat)
+        print(
+            f"{name:10} {len(texts):7} strings {size / 1024:9.1f} KiB  "
+            f"four-pass {legacy * 1000:8.2f} ms  single-pass {single * 1000:8.2f} ms  "
+            f"speedup {legacy / single:5.2f}x"
+        )
+
+
+def time_stages(pages, template_path, repeat):
+    """
+    Run the build pipeline stage by stage over pages (markdown strings) and
+    return the best time of each stage over repeat runs, in seconds.
+    """
+    best = dict.fromkeys(STAGES, float("inf"))
+    context = RenderContext(template_path)
+    titles = [extract_title(page) for page in pages]
+    trees = [markdown_to_html_node(page) for page in pages]
+
+    def timed(stage, func):
+        start = time.perf_counter()
+        result = func()
+        best[stage] = min(best[stage], time.perf_counter() - start)
+        return result
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        out_paths = [Path(out_dir) / f"page{i}.html" for i in range(len(pages))]
+        for _ in range(repeat):
+            blocks = timed(
+                "markdown_to_blocks", lambda: [markdown_to_blocks(p) for p in pages]
+            )
+            all_blocks = [block for page in blocks for block in page]
+            types = timed(
+                "block_to_block_type",
+                lambda: [block_to_block_type(block) for block in all_blocks],
+            )
+            texts = [
+                collapse_paragraph(block)
+                for block, block_type in zip(all_blocks, types)
+                if block_type != BlockType.CODE
+            ]
+            timed("text_to_textnodes", lambda: [text_to_textnodes(t) for t in texts])
+            bodies = timed("to_html", lambda: [tree.to_html() for tree in trees])
+            rendered = timed(
+                "template",
+                lambda: [
+                    "".join(context.generate(Title=title, Content=body, url=url_for))
+                    for title, body in zip(titles, bodies)
+                ],
+            )
+
+            def write():
+                for path, html in zip(out_paths, rendered):
+                    path.write_text(html, encoding="utf-8")
+
+            timed("write", write)
+    return best
+
+
+def import_times(module="main"):
+    """
+    Import module in a fresh interpreter with -X importtime and return
+    {module name: (self microseconds, cumulative microseconds)} for every
+    module it imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=Path(__file__).resolve().parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def bench_startup(args):
+    best = None
+    for _ in range(args.repeat):
+        times = import_times(args.module)
+        if best is None or times[args.module][1] < best[args.module][1]:
+            best = times
+    slowest = sorted(best.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (own, cumulative) in slowest[: args.top]:
+        print(f"{name:40} {own / 1000:8.2f} ms {cumulative / 1000:8.2f} ms")
+    loaded = [name for name in DEFERRED_IMPORTS if name in best]
+    if loaded:
+        print(f"warning: {args.module} imports {', '.join(loaded)} at startup")
+        sys.exit(1)
+
+
+def bench_run(args):
+    mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+    corpus = generate_corpus(
+        pages=args.pages,
+        blocks=args.blocks,
+        inline_density=args.inline_density,
+        seed=args.seed,
+        block_words=args.block_words,
+        mix=mix,
+    )
+    pages = [page for _, page in corpus]
+    stages = time_stages(pages, args.template, args.repeat)
+    results = {
+        "config": {
+            "pages": args.pages,
+            "blocks": args.blocks,
+            "block_words": args.block_words,
+            "inline_density": args.inline_density,
+            "mix": mix,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "python": platform.python_version(),
+        "corpus_bytes": sum(len(page.encode("utf-8")) for page in pages),
+        "stages": stages,
+    }
+    for stage, seconds in stages.items():
+        print(f"{stage:20} {seconds * 1000:10.2f} ms")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if report_regressions(baseline, results, args.threshold):
+            sys.exit(1)
+
+
+def find_regressions(baseline, current, threshold):
+    """
+    Return [(stage, baseline seconds, current seconds)] for every stage that
+    got more than threshold (a fraction) slower than the baseline.
+    """
+    regressions = []
+    for stage, seconds in current["stages"].items():
+        before = baseline["stages"].get(stage)
+        if before and seconds > before * (1 + threshold):
+            regressions.append((stage, before, seconds))
+    return regressions
+
+
+def report_regressions(baseline, current, threshold):
+    if baseline.get("config") != current.get("config"):
+        print("warning: baseline was recorded with a different configuration")
+    for stage, seconds in current["stages"].items():
+        before = baseline["stages"].get(stage)
+        change = f"{(seconds / before - 1) * 100:+7.1f}%" if before else "    new"
+        print(f"{stage:20} {seconds * 1000:10.2f} ms  {change}")
+    regressions = find_regressions(baseline, current, threshold)
+    for stage, before, seconds in regressions:
+        print(
+            f"REGRESSION {stage}: {before * 1000:.2f} ms -> {seconds * 1000:.2f} ms "
+            f"(threshold {threshold:.0%})"
+        )
+    return regressions
+
+
+def bench_compare(args):
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    current = json.loads(args.current.read_text(encoding="utf-8"))
+    if report_regressions(baseline, current, args.threshold):
+        sys.exit(1)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="time each build stage")
+    run.add_argument("--pages", type=int, default=200)
+    run.add_argument("--blocks", type=int, default=20, help="blocks per page")
+    run.add_argument("--block-words", type=int, default=30)
+    run.add_argument("--inline-density", type=float, default=0.1)
+    run.add_argument(
+        "--mix",
+        help="block kind weights, e.g. paragraph=5,unordered_list=1,code=1",
+    )
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--template", type=Path, default=Path("template.html"))
+    run.add_argument("--output", type=Path, help="write the results as JSON")
+    run.add_argument("--baseline", type=Path, help="compare against this JSON")
+    run.add_argument("--threshold", type=float, default=0.1)
+    run.set_defaults(func=bench_run)
+
+    compare = commands.add_parser("compare", help="flag regressions")
+    compare.add_argument("baseline", type=Path)
+    compare.add_argument("current", type=Path)
+    compare.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="slowdown that counts as a regression (default: 0.1 = 10%%)",
+    )
+    compare.set_defaults(func=bench_compare)
+
+    inline = commands.add_parser("inline", help="compare inline tokenizers")
+    inline.add_argument("--content", type=Path, default=Path("content"))
+    inline.add_argument("--pages", type=int, default=500)
+    inline.add_argument("--inline-density", type=float, default=0.15)
+    inline.add_argument("--seed", type=int, default=0)
+    inline.add_argument("--repeat", type=int, default=5)
+    inline.set_defaults(func=bench_inline)
+
+    memory = commands.add_parser("memory", help="measure node tree memory")
+    memory.add_argument("--pages", type=int, default=200)
+    memory.add_argument("--seed", type=int, default=0)
+    memory.set_defaults(func=bench_memory)
+
+    startup = commands.add_parser("startup", help="measure import time")
+    startup.add_argument("--module", default="main")
+    startup.add_argument("--repeat", type=int, default=5)
+    startup.add_argument("--top", type=int, default=15)
+    startup.set_defaults(func=bench_startup)
+
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
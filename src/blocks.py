@@ -1,9 +1,11 @@
 from enum import Enum
 
-from icecream import ic
-
+import profiler
+from fragments import FragmentNode
 from htmlnode import LeafNode, ParentNode
+from search import index_block
 from textnode import text_node_to_html_node, text_to_textnodes
+from urls import rewrite_urls, site_urls
 
 
 class BlockType(Enum):
@@ -16,13 +18,38 @@ class BlockType(Enum):
 
 
 def markdown_to_blocks(markdown):
-    raw_blocks = markdown.split("\n\n")
-    blocks = []
-    for raw_block in raw_blocks:
-        striped_block = raw_block.strip()
-        if striped_block:
-            blocks.append(striped_block)
-    return blocks
+    return list(iter_raw_blocks(markdown.split("\n")))
+
+
+def iter_raw_blocks(lines):
+    """
+    Yield the blocks of an iterable of lines, such as an open file.
+    Blocks are separated by empty lines; only the current block is held
+    in memory.
+    """
+    current = []
+    for line in lines:
+        line = line.rstrip("\n")
+        if line:
+            current.append(line)
+            continue
+        if current:
+            block = "\n".join(current).strip()
+            current = []
+            if block:
+                yield block
+    if current:
+        block = "\n".join(current).strip()
+        if block:
+            yield block
+
+
+def iter_blocks(lines):
+    """
+    Yield (BlockType, block) pairs for an iterable of lines.
+    """
+    for block in iter_raw_blocks(lines):
+        yield block_to_block_type(block), block
 
 
 def block_to_block_type(markdown_block):
@@ -40,65 +67,93 @@ def block_to_block_type(markdown_block):
         return BlockType.PARAGRAPH
 
 
-def markdown_to_html_node(markdown):
-    blocks = markdown_to_blocks(markdown)
-    html_blocks = []
-
-    for block in blocks:
-        block_type = block_to_block_type(block)
-
-        match block_type:
-            case BlockType.PARAGRAPH:
-                block_strip_newlines = collapse_paragraph(block)
-                html_blocks.append(
-                    ParentNode("p", text_to_children(block_strip_newlines))
-                )
-            case BlockType.HEADING:
-                block_strip_heading_sign, level = (
-                    block.lstrip("#").strip(),
-                    block.count("#"),
-                )
-                html_blocks.append(
-                    ParentNode(f"h{level}", text_to_children(block_strip_heading_sign))
-                )
-            case BlockType.CODE:
-                html_blocks.append(
-                    ParentNode("pre", [LeafNode("code", strip_code_block(block))])
-                )
-            case BlockType.QUOTE:
-                quotes = block.split("\n")
-                block_strip_quote_sign = [
-                    quote.lstrip(">").strip() for quote in quotes if quote.strip()
-                ]
-                block_strip_quote_sign = " ".join(
-                    quote for quote in block_strip_quote_sign if quote.strip()
-                )
-                html_blocks.append(
-                    ParentNode("blockquote", text_to_children(block_strip_quote_sign))
-                )
-            case BlockType.UNORDERED_LIST:
-                items = block.split("\n")
-                items = [item.lstrip("-").strip() for item in items if item.strip()]
-                list_items = [
-                    ParentNode("li", text_to_children(item)) for item in items
-                ]
-                html_blocks.append(ParentNode("ul", list_items))
-            case BlockType.ORDERED_LIST:
-                items = block.split("\n")
-                items = [
-                    item.lstrip("0123456789.").strip() for item in items if item.strip()
-                ]
-                list_items = [
-                    ParentNode("li", text_to_children(item)) for item in items
-                ]
-                html_blocks.append(ParentNode("ol", list_items))
-            case _:
-                raise ValueError(f"Unknown block type: {block_type}")
+def markdown_to_html_node(
+    markdown,
+    lazy=False,
+    basepath="/",
+    refs=None,
+    assets=None,
+    terms=None,
+    fragments=False,
+):
+    """
+    Convert markdown, a string or an iterable of lines, to a div node.
+    Site-absolute link and image urls are prefixed with basepath, and those
+    of fingerprinted assets replaced as given by assets; when refs is a
+    set, the original urls are added to it. When terms is a dict, the
+    search tokens of every block are added to it, see index_block. With
+    fragments=True every block is wrapped in a FragmentNode, so its HTML
+    can be taken from the fragment cache.
+
+    Blocks are converted as they are read. With lazy=True the children of
+    the returned node are a generator that is consumed while the node is
+    serialized, so a document read from a file never has to be held in
+    memory as a whole; such a node can only be serialized once.
+    """
+    if isinstance(markdown, str):
+        markdown = markdown.split("\n")
+    html_blocks = (
+        _finish_block(block, basepath, refs, assets, terms, fragments)
+        for block in iter_blocks(markdown)
+    )
+    if not lazy:
+        html_blocks = list(html_blocks)
     return ParentNode("div", html_blocks)
 
 
+def _finish_block(block, basepath, refs, assets, terms, fragments):
+    block_type, text = block
+    node = block_to_html_node(block_type, text)
+    if refs is not None:
+        refs.update(site_urls(node))
+    index_block(node, terms)
+    node = rewrite_urls(node, basepath, assets)
+    if fragments:
+        return FragmentNode(block_type.value, text, node)
+    return node
+
+
+def block_to_html_node(block_type, block):
+    match block_type:
+        case BlockType.PARAGRAPH:
+            block_strip_newlines = collapse_paragraph(block)
+            return ParentNode("p", text_to_children(block_strip_newlines))
+        case BlockType.HEADING:
+            block_strip_heading_sign, level = (
+                block.lstrip("#").strip(),
+                block.count("#"),
+            )
+            return ParentNode(f"h{level}", text_to_children(block_strip_heading_sign))
+        case BlockType.CODE:
+            return ParentNode("pre", [LeafNode("code", strip_code_block(block))])
+        case BlockType.QUOTE:
+            quotes = block.split("\n")
+            block_strip_quote_sign = [
+                quote.lstrip(">").strip() for quote in quotes if quote.strip()
+            ]
+            block_strip_quote_sign = " ".join(
+                quote for quote in block_strip_quote_sign if quote.strip()
+            )
+            return ParentNode("blockquote", text_to_children(block_strip_quote_sign))
+        case BlockType.UNORDERED_LIST:
+            items = block.split("\n")
+            items = [item.lstrip("-").strip() for item in items if item.strip()]
+            list_items = [ParentNode("li", text_to_children(item)) for item in items]
+            return ParentNode("ul", list_items)
+        case BlockType.ORDERED_LIST:
+            items = block.split("\n")
+            items = [
+                item.lstrip("0123456789.").strip() for item in items if item.strip()
+            ]
+            list_items = [ParentNode("li", text_to_children(item)) for item in items]
+            return ParentNode("ol", list_items)
+        case _:
+            raise ValueError(f"Unknown block type: {block_type}")
+
+
 def text_to_children(text):
-    textnodes = text_to_textnodes(text)
+    with profiler.span("inline"):
+        textnodes = text_to_textnodes(text)
     html_nodes = [text_node_to_html_node(node) for node in textnodes]
     return html_nodes
 
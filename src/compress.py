@@ -0,0 +1,230 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+from fsutil import write_atomic
+from manifest import file_digest
+from parallel import chunk_size
+
+# Outputs worth compressing; images and fonts are compressed already
+TEXT_SUFFIXES = (".html", ".css", ".js", ".mjs", ".json", ".svg", ".txt", ".xml")
+
+VARIANT_SUFFIXES = (".gz", ".br")
+
+
+class CompressStats:
+    def __init__(self):
+        self.compressed = 0
+        self.unchanged = 0
+        self.too_small = 0
+        self.removed = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = {}
+
+    def __repr__(self):
+        return (
+            f"CompressStats(compressed={self.compressed}, "
+            f"unchanged={self.unchanged}, too_small={self.too_small}, "
+            f"removed={self.removed})"
+        )
+
+
+def available_encodings():
+    """
+    Return the suffixes of the variants that can be written here: .gz
+    always, .br when the brotli module is installed.
+    """
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return (".gz",)
+    return (".gz", ".br")
+
+
+def compress_bytes(data, suffix):
+    if suffix == ".gz":
+        # Deferred: only --compress needs it
+        import gzip
+
+        # mtime=0 keeps the output identical for identical input
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if suffix == ".br":
+        import brotli
+
+        return brotli.compress(data, mode=brotli.MODE_TEXT)
+    raise ValueError(f"Unknown encoding: {suffix}")
+
+
+def compress_file(path, encodings):
+    """
+    Write a compressed sibling of path for every suffix in encodings.
+    Returns ({suffix: compressed size}, sha256 digest of the file).
+    """
+    data = path.read_bytes()
+    sizes = {}
+    for suffix in encodings:
+        variant = path.with_name(path.name + suffix)
+        write_atomic(variant, compress_bytes(data, suffix))
+        sizes[suffix] = variant.stat().st_size
+    return sizes, hashlib.sha256(data).hexdigest()
+
+
+def load_state(state_path):
+    if state_path is None or not state_path.exists():
+        return {}
+    try:
+        return json.loads(state_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable compression state {state_path}: {e}")
+        return {}
+
+
+def save_state(state_path, state):
+    if state_path is None:
+        return
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(state_path, json.dumps(state, indent=1, sort_keys=True))
+
+
+def is_unchanged(path, stat, entry, encodings):
+    """
+    Return True if the variants of path were made from its current bytes.
+    Size and mtime are checked first; the file is only hashed when they
+    differ, so a page rewritten with the same bytes is not recompressed.
+    """
+    if entry is None or entry["encodings"] != list(encodings):
+        return False
+    if not all(path.with_name(path.name + s).exists() for s in encodings):
+        return False
+    if [stat.st_size, stat.st_mtime_ns] == entry["stat"]:
+        return True
+    return entry["digest"] == file_digest(path)
+
+
+def remove_variants(path, encodings):
+    """
+    Remove the variants of path with the given suffixes. Returns how many
+    were removed.
+    """
+    removed = 0
+    for suffix in encodings:
+        variant = path.with_name(path.name + suffix)
+        try:
+            variant.unlink()
+        except FileNotFoundError:
+            continue
+        logging.debug("Removed stale variant: %s", variant)
+        removed += 1
+    return removed
+
+
+def remove_compressed(directory, state_path):
+    """
+    Remove every variant listed in state_path, and the state itself, so a
+    build without compression does not serve variants of older pages.
+    Returns how many were removed.
+    """
+    state = load_state(state_path)
+    removed = sum(
+        remove_variants(directory / rel, entry["encodings"])
+        for rel, entry in state.items()
+    )
+    if state_path is not None:
+        state_path.unlink(missing_ok=True)
+    if removed:
+        logging.info(f"Compression is off: removed {removed} compressed variants")
+    return removed
+
+
+def compress_outputs(directory, min_size=1024, jobs=1, state_path=None):
+    """
+    Write .gz (and .br when brotli is installed) variants next to every text
+    file of at least min_size bytes under directory, in a process pool when
+    jobs > 1.
+
+    What each variant was made from is kept in state_path, so files whose
+    bytes did not change are not compressed again. Variants listed there
+    whose file is gone or now below min_size are removed.
+    """
+    encodings = available_encodings()
+    state = load_state(state_path)
+    new_state = {}
+    stats = CompressStats()
+    to_compress = []
+
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            if name.endswith(VARIANT_SUFFIXES) or not name.endswith(TEXT_SUFFIXES):
+                continue
+            path = Path(root) / name
+            rel = path.relative_to(directory).as_posix()
+            stat = path.stat()
+            if stat.st_size < min_size:
+                stats.too_small += 1
+                continue
+            entry = state.get(rel)
+            if is_unchanged(path, stat, entry, encodings):
+                stats.unchanged += 1
+                # Remember the new mtime so the next build skips the hash
+                entry["stat"] = [stat.st_size, stat.st_mtime_ns]
+                new_state[rel] = entry
+                continue
+            to_compress.append((rel, path, stat))
+
+    # Only variants this function wrote are removed: a .gz or .br file that
+    # is not in the state, such as a tarball under static/, is left alone
+    compressing = {rel for rel, _, _ in to_compress}
+    for rel, entry in state.items():
+        if rel in new_state:
+            continue
+        old = entry["encodings"]
+        if rel in compressing:
+            old = [suffix for suffix in old if suffix not in encodings]
+        stats.removed += remove_variants(directory / rel, old)
+
+    paths = [path for _, path, _ in to_compress]
+    if jobs > 1 and len(paths) > 1:
+        # Deferred like in parallel.render_pages: only needed for this stage
+        from concurrent.futures import ProcessPoolExecutor
+        from functools import partial
+
+        jobs = min(jobs, len(paths))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            compressed = list(
+                pool.map(
+                    partial(compress_file, encodings=encodings),
+                    paths,
+                    chunksize=chunk_size(len(paths), jobs),
+                )
+            )
+    else:
+        compressed = [compress_file(path, encodings) for path in paths]
+
+    for (rel, path, stat), (variant_sizes, digest) in zip(to_compress, compressed):
+        logging.debug("Compressed %s", path)
+        stats.compressed += 1
+        stats.raw_bytes += stat.st_size
+        for suffix, size in variant_sizes.items():
+            stats.compressed_bytes[suffix] = (
+                stats.compressed_bytes.get(suffix, 0) + size
+            )
+        new_state[rel] = {
+            "stat": [stat.st_size, stat.st_mtime_ns],
+            "digest": digest,
+            "encodings": list(encodings),
+        }
+    save_state(state_path, new_state)
+
+    ratios = ", ".join(
+        f"{suffix} {size / stats.raw_bytes:.0%}"
+        for suffix, size in stats.compressed_bytes.items()
+    )
+    logging.info(
+        f"Compression: {stats.compressed} compressed"
+        + (f" ({stats.raw_bytes} bytes, {ratios})" if stats.compressed else "")
+        + f", {stats.unchanged} unchanged, {stats.too_small} below {min_size} "
+        f"bytes, {stats.removed} stale variants removed"
+    )
+    return stats
@@ -0,0 +1,117 @@
+import random
+
+WORDS = (
+    "the ring of power elves dwarves men hobbit shire mordor gondor rohan "
+    "wizard journey fellowship mountain river forest shadow light ancient "
+    "king return song tale road darkness star council sword tower"
+).split()
+
+
+def sentence(rng, words, inline_density):
+    """
+    Return a sentence of words, where roughly inline_density of the words
+    carry inline markup (bold, italic, code, link or image).
+    """
+    out = []
+    for _ in range(words):
+        word = rng.choice(WORDS)
+        if rng.random() < inline_density:
+            kind = rng.randrange(5)
+            if kind == 0:
+                word = f"**{word}**"
+            elif kind == 1:
+                word = f"_{word}_"
+            elif kind == 2:
+                word = f"`{word}`"
+            elif kind == 3:
+                word = f"[{word}](/blog/{rng.choice(WORDS)})"
+            else:
+                word = f"![{word}](/images/{rng.choice(WORDS)}.png)"
+        out.append(word)
+    return " ".join(out).capitalize() + "."
+
+
+# Relative weight of each block kind in a generated page
+DEFAULT_MIX = {
+    "paragraph": 5,
+    "heading": 1,
+    "unordered_list": 1,
+    "ordered_list": 1,
+    "quote": 1,
+    "code": 1,
+}
+
+
+def parse_mix(text):
+    """
+    Parse a block mix such as "paragraph=5,code=1". Kinds that are not
+    named get weight 0.
+    """
+    mix = dict.fromkeys(DEFAULT_MIX, 0)
+    for item in text.split(","):
+        kind, _, weight = item.partition("=")
+        kind = kind.strip()
+        if kind not in mix:
+            raise ValueError(f"Unknown block kind: {kind}")
+        mix[kind] = float(weight)
+    if not any(mix.values()):
+        raise ValueError(f"Block mix has no weight: {text}")
+    return mix
+
+
+def generate_block(rng, kind, words, inline_density):
+    """
+    Return one markdown block of the given kind with roughly words words.
+    """
+    if kind == "heading":
+        return f"{'#' * rng.randint(2, 4)} {sentence(rng, 5, inline_density)}"
+    if kind == "unordered_list":
+        items = max(1, words // 8)
+        return "\n".join(f"- {sentence(rng, 8, inline_density)}" for _ in range(items))
+    if kind == "ordered_list":
+        items = max(1, words // 8)
+        return "\n".join(
+            f"{i}. {sentence(rng, 8, inline_density)}" for i in range(1, items + 1)
+        )
+    if kind == "quote":
+        return f"> {sentence(rng, words, inline_density)}\n>\n> -- Someone"
+    if kind == "code":
+        lines = [f"    {rng.choice(WORDS)}()" for _ in range(max(1, words // 4))]
+        return "```\n" + "\n".join(lines) + "\n```"
+    lines = [sentence(rng, 12, inline_density) for _ in range(max(1, words // 12))]
+    return "\n".join(lines)
+
+
+def generate_page(rng, blocks=20, inline_density=0.1, block_words=30, mix=None):
+    """
+    Return one markdown page with a title and the given number of blocks.
+    Block kinds are drawn according to the weights in mix.
+    """
+    mix = mix or DEFAULT_MIX
+    kinds = [kind for kind, weight in mix.items() if weight]
+    weights = [mix[kind] for kind in kinds]
+    parts = [f"# {sentence(rng, 4, 0)}"]
+    for kind in rng.choices(kinds, weights, k=blocks):
+        words = rng.randint(max(1, block_words // 2), block_words * 3 // 2)
+        parts.append(generate_block(rng, kind, words, inline_density))
+    return "\n\n".join(parts) + "\n"
+
+
+def generate_corpus(
+    pages=100, blocks=20, inline_density=0.1, seed=0, block_words=30, mix=None
+):
+    """
+    Return a deterministic list of (relative path, markdown) pairs.
+
+    pages and blocks set the corpus and page size, block_words the average
+    size of a block, inline_density the share of words with inline markup
+    and mix the weight of each block kind (see DEFAULT_MIX).
+    """
+    rng = random.Random(seed)
+    return [
+        (
+            f"blog/post{i}/index.md",
+            generate_page(rng, blocks, inline_density, block_words, mix),
+        )
+        for i in range(pages)
+    ]
@@ -0,0 +1,250 @@
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import time
+
+from fsutil import write_atomic
+
+IGNORE_FILE = ".ssgignore"
+
+# Hidden directories (.git...) and node_modules are never content; a
+# .ssgignore can bring them back with a !pattern
+DEFAULT_PATTERNS = (".*/", "node_modules/")
+
+# Directory listings younger than this are not cached: the directory could
+# still change within the resolution of its mtime
+RACY_NS = 2 * 10**9
+
+DIR_CACHE_FORMAT = 1
+
+
+class IgnoreRules:
+    """
+    gitignore-style patterns from the .ssgignore files of a directory and
+    its parents.
+
+    Each line is a glob matched against the name of a file or directory,
+    or with a / inside it, against its path relative to the directory of
+    the .ssgignore. A trailing / matches directories only, a leading !
+    re-includes what an earlier pattern ignored, and lines starting with #
+    are comments. The last matching pattern wins. An ignored directory is
+    not walked at all.
+    """
+
+    def __init__(self, patterns=(), signature=""):
+        self.patterns = patterns
+        # Identifies the patterns, so cached listings can be tied to them
+        self.signature = signature
+
+    @classmethod
+    def default(cls):
+        return cls().extend("", DEFAULT_PATTERNS)
+
+    def extend(self, base, lines):
+        """
+        Return the rules with the patterns of lines, read from the
+        .ssgignore in base (a path relative to the content root), added.
+        """
+        added = []
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            line = line.removeprefix("!")
+            dir_only = line.endswith("/")
+            line = line.strip("/")
+            if line:
+                added.append((base, line, negate, dir_only, "/" in line))
+        if not added:
+            return self
+        signature = hashlib.sha256(
+            (self.signature + json.dumps(added)).encode()
+        ).hexdigest()
+        return IgnoreRules(self.patterns + tuple(added), signature)
+
+    def ignored(self, rel, is_dir):
+        """
+        Return True if the file or directory at rel (relative to the
+        content root) is ignored.
+        """
+        result = False
+        name = rel.rpartition("/")[2]
+        for base, pattern, negate, dir_only, anchored in self.patterns:
+            if dir_only and not is_dir:
+                continue
+            if anchored:
+                if base:
+                    if not rel.startswith(base + "/"):
+                        continue
+                    path = rel[len(base) + 1 :]
+                else:
+                    path = rel
+                matched = fnmatch.fnmatchcase(path, pattern)
+            else:
+                if base and not rel.startswith(base + "/"):
+                    continue
+                matched = fnmatch.fnmatchcase(name, pattern)
+            if matched:
+                result = not negate
+        return result
+
+
+class DirCache:
+    """
+    What the last walk found in every content directory: its markdown files
+    and the subdirectories to walk, with the mtime of the directory and of
+    its .ssgignore, and the signature of the rules it was listed under.
+
+    Adding, removing or renaming an entry changes the mtime of its
+    directory, so as long as that and the rules are unchanged the listing
+    is reused instead of reading the directory again.
+    """
+
+    def __init__(self, path=None, entries=None):
+        self.path = path
+        self.entries = entries if entries is not None else {}
+        self.seen = {}
+        self.reused = 0
+
+    @classmethod
+    def load(cls, path):
+        if path is None or not path.exists():
+            return cls(path)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable directory cache {path}: {e}")
+            return cls(path)
+        if data.get("format") != DIR_CACHE_FORMAT:
+            return cls(path)
+        return cls(path, data["dirs"])
+
+    def lookup(self, rel, state):
+        entry = self.entries.get(rel)
+        if entry is None or entry["state"] != state:
+            return None
+        self.seen[rel] = entry
+        self.reused += 1
+        return entry
+
+    def store(self, rel, state, patterns, files, dirs, scan_start):
+        entry = {"state": state, "patterns": patterns, "files": files, "dirs": dirs}
+        # A directory modified just now could change again within the same
+        # mtime tick; list it again next time
+        if state[0] < scan_start - RACY_NS:
+            self.seen[rel] = entry
+
+    def save(self):
+        """
+        Save the listings of the directories walked since load(), dropping
+        those of directories that are gone or were not walked.
+        """
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"format": DIR_CACHE_FORMAT, "dirs": self.seen}
+        write_atomic(self.path, json.dumps(data, sort_keys=True))
+
+
+def read_ignore_file(path):
+    """
+    Return (state, lines) of the .ssgignore at path, ((0, 0), []) if
+    there is none.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            stat = os.fstat(f.fileno())
+            return [stat.st_mtime_ns, stat.st_size], f.read().splitlines()
+    except FileNotFoundError:
+        return [0, 0], []
+
+
+def ignore_file_state(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return [0, 0]
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def is_ignored(root, path, is_dir=False):
+    """
+    Return True if path, under root, is ignored by the default rules or the
+    .ssgignore files of root and the directories above path, as
+    iter_markdown_files would ignore it.
+    """
+    parts = path.relative_to(root).parts
+    rules = IgnoreRules.default()
+    rel = ""
+    for depth, name in enumerate(parts, 1):
+        ignore_path = os.path.join(root, rel, IGNORE_FILE)
+        rules = rules.extend(rel, read_ignore_file(ignore_path)[1])
+        rel = f"{rel}/{name}" if rel else name
+        if rules.ignored(rel, is_dir=is_dir or depth < len(parts)):
+            return True
+    return False
+
+
+def iter_markdown_files(root, dir_cache=None):
+    """
+    Yield (path, stat) for every markdown file under root that no
+    .ssgignore rule excludes, as the walk finds them.
+
+    Directories are read with os.scandir: the file type comes with the
+    directory entry and the stat of each file is taken once, for the caller
+    to reuse. With a dir_cache, directories whose listing did not change
+    since the last walk are not read again; only their files are statted.
+    """
+    scan_start = time.time_ns()
+    stack = [("", IgnoreRules.default())]
+    while stack:
+        rel, rules = stack.pop()
+        directory = os.path.join(root, rel) if rel else os.fspath(root)
+        try:
+            dir_stat = os.stat(directory)
+        except FileNotFoundError:
+            continue
+        ignore_path = os.path.join(directory, IGNORE_FILE)
+
+        entry = None
+        if dir_cache is not None:
+            state = [dir_stat.st_mtime_ns, ignore_file_state(ignore_path)]
+            entry = dir_cache.lookup(rel, state + [rules.signature])
+        if entry is not None:
+            child_rules = rules.extend(rel, entry["patterns"])
+            for name in entry["files"]:
+                path = os.path.join(directory, name)
+                try:
+                    yield root / rel / name, os.stat(path)
+                except FileNotFoundError:
+                    continue
+            for name in reversed(entry["dirs"]):
+                stack.append((f"{rel}/{name}" if rel else name, child_rules))
+            continue
+
+        ignore_state, patterns = read_ignore_file(ignore_path)
+        child_rules = rules.extend(rel, patterns)
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        files = []
+        dirs = []
+        for dir_entry in entries:
+            child = f"{rel}/{dir_entry.name}" if rel else dir_entry.name
+            try:
+                if dir_entry.is_dir(follow_symlinks=False):
+                    if not child_rules.ignored(child, is_dir=True):
+                        dirs.append(dir_entry.name)
+                elif dir_entry.name.endswith(".md") and dir_entry.is_file():
+                    if not child_rules.ignored(child, is_dir=False):
+                        files.append(dir_entry.name)
+                        yield root / child, dir_entry.stat()
+            except FileNotFoundError:
+                continue
+        if dir_cache is not None:
+            state = [dir_stat.st_mtime_ns, ignore_state, rules.signature]
+            dir_cache.store(rel, state, patterns, files, dirs, scan_start)
+        for name in reversed(dirs):
+            stack.append((f"{rel}/{name}" if rel else name, child_rules))
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+
+from fsutil import write_atomic
+from htmlnode import HTMLNode
+
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+
+# How many blocks seen once are remembered before the record is reset
+MAX_SEEN = 100_000
+
+# The cache of this process, see activate(). Worker processes of a parallel
+# build each open their own on the first page they render.
+_active = None
+
+
+class FragmentNode(HTMLNode):
+    """
+    A block of a page (the node block_to_html_node built for it), tagged
+    with the block type and markdown text it was built from.
+
+    Serializing it looks the rendered HTML up in the active FragmentCache
+    by (block type, block text), so a block repeated across pages, such as
+    a nav list or a footer, is serialized once per build. The block node is
+    kept as the only child: links are found and rewritten, and search terms
+    collected, as for any other node.
+    """
+
+    __slots__ = ("block_type", "text")
+
+    def __init__(self, block_type, text, node):
+        super().__init__(node.tag, None, [node], None)
+        self.block_type = block_type
+        self.text = text
+
+    def iter_html(self):
+        cache = _active
+        if cache is None:
+            yield from self.children[0].iter_html()
+            return
+        html = cache.get(self.block_type, self.text)
+        if html is not None:
+            yield html
+        elif cache.seen_before(self.block_type, self.text):
+            html = self.children[0].to_html()
+            cache.put(self.block_type, self.text, html)
+            yield html
+        else:
+            # Most blocks appear once in a site: stream them as usual
+            yield from self.children[0].iter_html()
+
+    def __repr__(self):
+        return f"FragmentNode({self.block_type}, {self.text!r}, {self.children[0]})"
+
+
+class FragmentCache:
+    """
+    Rendered HTML of blocks, keyed by (block type, block text), in a least
+    recently used cache of at most max_bytes characters of HTML.
+
+    namespace identifies everything else the HTML depends on, the basepath
+    and the fingerprinted asset urls; a cache only ever holds fragments of
+    one namespace. Only blocks seen more than once are stored, so the many
+    blocks that appear on a single page cost no more than a lookup. The
+    first sighting of a block counts as neither a hit nor a miss: a miss
+    is a repeated block that had to be rendered again.
+
+    With a directory, stored fragments are also written there, so the
+    worker processes of a parallel build share what each of them rendered:
+    a fragment missing from memory is looked up on disk once it is seen a
+    second time.
+    """
+
+    def __init__(self, namespace, max_bytes=DEFAULT_MAX_BYTES, directory=None):
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.entries = OrderedDict()
+        # Hashes of the keys of blocks seen once
+        self.seen = set()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def config(self):
+        """
+        Return what activate needs to open this cache in another process.
+        """
+        return (self.namespace, self.max_bytes, self.directory)
+
+    def path_for(self, key):
+        digest = hashlib.sha256(json.dumps([self.namespace, *key]).encode())
+        name = digest.hexdigest()
+        return self.directory / name[:2] / f"{name}.html"
+
+    def get(self, block_type, text):
+        key = (block_type, text)
+        html = self.entries.get(key)
+        if html is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return html
+        if self.directory is not None and hash(key) in self.seen:
+            try:
+                html = self.path_for(key).read_text(encoding="utf-8")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning(f"Ignoring unreadable fragment: {e}")
+            else:
+                self.hits += 1
+                self._remember(key, html)
+                return html
+        return None
+
+    def seen_before(self, block_type, text):
+        """
+        Record a sighting of a block missing from the cache. Returns True if
+        it was seen before, when its HTML is worth storing and the lookup
+        counts as a miss.
+        """
+        key = hash((block_type, text))
+        if key in self.seen:
+            self.seen.discard(key)
+            self.misses += 1
+            return True
+        if len(self.seen) >= MAX_SEEN:
+            self.seen.clear()
+        self.seen.add(key)
+        return False
+
+    def put(self, block_type, text, html):
+        key = (block_type, text)
+        self._remember(key, html)
+        if self.directory is not None:
+            path = self.path_for(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            write_atomic(path, html, unique=True)
+
+    def _remember(self, key, html):
+        if len(html) > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self.entries[key] = html
+        self.size += len(html)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def counts(self):
+        return self.hits, self.misses
+
+
+def fragment_namespace(basepath, assets):
+    return hashlib.sha256(json.dumps([basepath, assets]).encode()).hexdigest()
+
+
+def activate(config):
+    """
+    Make the cache described by config (see FragmentCache.config) the one
+    FragmentNodes use in this process, opening it unless it already is;
+    None turns fragment caching off. Returns the active cache.
+    """
+    global _active
+    if config is None:
+        _active = None
+    elif _active is None or _active.config() != config:
+        _active = FragmentCache(*config)
+    return _active
+
+
+def active():
+    return _active
+
+
+def counts():
+    """
+    Return (hits, misses) of the active cache, (0, 0) without one.
+    """
+    return _active.counts() if _active is not None else (0, 0)
+
+
+def counts_since(before):
+    """
+    Return the (hits, misses) of the active cache since counts() was before.
+    """
+    hits, misses = counts()
+    return hits - before[0], misses - before[1]
@@ -0,0 +1,21 @@
+import os
+
+
+def write_atomic(path, data, unique=False):
+    """
+    Replace path with data (str, written as UTF-8, or bytes) through a
+    temporary file next to it, so a reader never sees a partial file. With
+    unique, the temporary file is named after the process, for files that
+    several processes may write at once.
+    """
+    suffix = f".{os.getpid()}.tmp" if unique else ".tmp"
+    tmp_path = path.with_name(path.name + suffix)
+    try:
+        if isinstance(data, str):
+            tmp_path.write_text(data, encoding="utf-8")
+        else:
+            tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
@@ -1,13 +1,67 @@
+import sys
+
+
+class _EmptyList(list):
+    """
+    Immutable empty list, shared by every node without children.
+    """
+
+    __slots__ = ()
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("the shared empty children list cannot be modified")
+
+    append = extend = insert = remove = pop = clear = sort = reverse = _immutable
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+
+
+class _EmptyDict(dict):
+    """
+    Immutable empty dict, shared by every node without props.
+    """
+
+    __slots__ = ()
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("the shared empty props dict cannot be modified")
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+
+EMPTY_CHILDREN = _EmptyList()
+EMPTY_PROPS = _EmptyDict()
+
+
 class HTMLNode:
+    # Trees get large: no per-instance __dict__, shared empty children and
+    # props, and interned tag names keep each node small.
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(self, tag=None, value=None, children=None, props=None):
-        self.tag = tag
+        self.tag = sys.intern(tag) if tag is not None else None
         self.value = value
-        self.children = children if children is not None else []
-        self.props = props if props is not None else {}
+        self.children = children if children is not None else EMPTY_CHILDREN
+        self.props = props if props is not None else EMPTY_PROPS
 
     def to_html(self):
+        return "".join(self.iter_html())
+
+    def iter_html(self):
+        """
+        Yield the HTML of this node in chunks, without building the
+        string of any subtree.
+        """
         raise NotImplementedError()
 
+    def write_html(self, stream):
+        """
+        Write the HTML of this node to a text stream, chunk by chunk.
+        """
+        write = stream.write
+        for chunk in self.iter_html():
+            write(chunk)
+
     def props_to_html(self):
         if self.props == {}:
             return ""
@@ -18,24 +72,44 @@ class HTMLNode:
 
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, value, props=None):
         super().__init__(tag, value, None, props)
 
-    def to_html(self):
+    def iter_html(self):
         if self.value is None:
             raise ValueError("LeafNode value cannot be None")
         if self.tag is None:
-            return self.value
-        return f"<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>"
+            yield self.value
+            return
+        yield f"<{self.tag}{self.props_to_html()}>"
+        yield self.value
+        yield f"</{self.tag}>"
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, children, props=None):
         super().__init__(tag, None, children, props)
         
-    def to_html(self):
+    def iter_html(self):
         if self.tag is None:
             raise ValueError("ParentNode tag cannot be None")
-        acc = ""
-        for child in self.children:
-            acc += child.to_html()
-        return f"<{self.tag}{self.props_to_html()}>{acc}</{self.tag}>"
\ No newline at end of file
+        yield f"<{self.tag}{self.props_to_html()}>"
+        # Walk the tree with an explicit stack so every chunk is yielded
+        # straight to the caller, however deep the tree is.
+        stack = [(self.tag, iter(self.children))]
+        while stack:
+            tag, children = stack[-1]
+            for child in children:
+                if isinstance(child, ParentNode):
+                    if child.tag is None:
+                        raise ValueError("ParentNode tag cannot be None")
+                    yield f"<{child.tag}{child.props_to_html()}>"
+                    stack.append((child.tag, iter(child.children)))
+                    break
+                yield from child.iter_html()
+            else:
+                stack.pop()
+                yield f"</{tag}>"
@@ -1,52 +1,366 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import argparse
 import logging
-import re
-import sys
+import shutil
+import tempfile
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
 
-from jinja2 import Environment, FileSystemLoader
-
+import fragments
+import metrics
+import profiler
 import textnode as tnd
+from astcache import DEFAULT_MAX_BYTES, ASTCache
+from assets import COMPARE_MODES, load_asset_manifest, sync_static_assets
+from compress import compress_outputs, remove_compressed
+from discover import IGNORE_FILE, DirCache, is_ignored, iter_markdown_files
 from blocks import markdown_to_html_node
+from manifest import BuildManifest, build_inputs, file_digest
+from fragments import fragment_namespace
+from fsutil import write_atomic
+from minify import Minifier
+from parallel import pipeline_pages, render_pages, resolve_jobs
+from publish import DEFAULT_KEEP, Generations
+from render import compile_template, get_render_context
+from search import SearchIndex, index_page
+from shard import (
+    SHARD_MANIFEST,
+    parse_shard,
+    select_shard,
+    write_shard_manifest,
+)
+from urls import rewrite_urls, site_urls, url_for
+from watch import watch
 
+CONTENT_DIR = Path("content")
+STATIC_DIR = Path("static")
+TEMPLATE_FILE = Path("template.html")
+OUTPUT_DIR = Path("docs")
+CACHE_DIR = Path(".ssg-cache")
 
-def generate_page(from_path, template_path, dest_path, basepath="/"):
-    logging.info(
-        f"Generating page from {from_path} to {dest_path} using template {template_path}"
+# Sources of at least this many bytes are streamed into their output file
+# instead of being rendered into one string
+STREAM_MIN_BYTES = 256 * 1024
+
+
+class RenderedPage:
+    """
+    What rendering a page found out: whether its tree was taken from the
+    AST cache, the site-absolute urls it links to, when it was minified
+    (size before minifying, bytes saved), when it was indexed for search,
+    (title, {token: weight}) and the (hits, misses) of the fragment cache.
+    """
+
+    def __init__(self, cached, refs, minified=None, search=None, fragments=None):
+        self.cached = cached
+        self.refs = refs
+        self.minified = minified
+        self.search = search
+        self.fragments = fragments
+
+    def __repr__(self):
+        return f"RenderedPage({self.cached}, {sorted(self.refs)}, {self.minified})"
+
+
+def minify_chunks(chunks, minifier):
+    """
+    Return chunks minified by minifier, or chunks as they are without one.
+    """
+    return chunks if minifier is None else minifier.minify(chunks)
+
+
+def minify_stats(minifier):
+    return None if minifier is None else (minifier.chars_in, minifier.saved)
+
+
+def generate_page(
+    from_path,
+    template_path,
+    dest_path,
+    basepath="/",
+    compiled_dir=None,
+    ast_cache=None,
+    source_digest=None,
+    assets=None,
+    minify=False,
+    search=False,
+    fragment_cache=None,
+    source_size=None,
+):
+    """
+    Render the markdown file from_path into dest_path.
+
+    compiled_dir holds the template compiled by compile_template; without
+    it the template is compiled from source. assets maps asset urls to
+    their fingerprinted urls, see url_for. minify strips the whitespace
+    the browser does not render from the output, see Minifier. search
+    collects the search terms of the page, see index_page. fragment_cache
+    is the config of the FragmentCache the blocks of the page are looked
+    up in, see fragments.activate. source_size is the size of from_path in
+    bytes, when known.
+
+    With an ast_cache the parsed page is looked up by source_digest (the
+    digest of from_path is computed when it is not given) and stored after
+    parsing. Sources of STREAM_MIN_BYTES or more skip the cache and are
+    streamed instead. Returns a RenderedPage.
+    """
+    logging.debug(
+        "Generating page from %s to %s using template %s",
+        from_path,
+        dest_path,
+        template_path,
     )
     if not from_path.exists():
         raise FileNotFoundError(f"Source file {from_path} does not exist.")
     if not template_path.exists():
         raise FileNotFoundError(f"Template file {template_path} does not exist.")
 
-    markdown_file = from_path.read_text(encoding="utf-8")
-    html_content = markdown_to_html_node(markdown_file).to_html()
-    title = extract_title(markdown_file)
-
-    # Load templates from the current directory
-    env = Environment(loader=FileSystemLoader("."))
-    # Load your template.html
-    template = env.get_template(template_path.name)
-
-    # Render with your data
-    html_file = template.render(Title=title, Content=html_content)
-    html_file = re.sub(r'href="/', f'href="{basepath}', html_file)
-    html_file = re.sub(r'src="/', f'src="{basepath}', html_file)
+    # The compiled template is shared by all pages rendered in this process
+    context = get_render_context(template_path, compiled_dir)
 
     # create destination directory if it does not exist
     dest_path.parent.mkdir(parents=True, exist_ok=True)
-    dest_path.write_text(html_file, encoding="utf-8")
+    tmp_path = dest_path.with_name(dest_path.name + ".tmp")
+    if ast_cache is not None:
+        if source_size is None:
+            source_size = from_path.stat().st_size
+        # Caching needs the whole tree in memory, which a large page
+        # should never be
+        if source_size >= STREAM_MIN_BYTES:
+            ast_cache = None
+    if ast_cache is not None and source_digest is None:
+        source_digest = file_digest(from_path)
+    fragments.activate(fragment_cache)
+    before = fragments.counts()
+    try:
+        if profiler.active() is None:
+            rendered = render_page(
+                from_path,
+                tmp_path,
+                context,
+                basepath,
+                ast_cache,
+                source_digest,
+                assets,
+                minify,
+                search,
+            )
+        else:
+            with profiler.span("page", cat="page", memory=True, path=str(from_path)):
+                rendered = render_page_staged(
+                    from_path,
+                    tmp_path,
+                    context,
+                    basepath,
+                    ast_cache,
+                    source_digest,
+                    assets,
+                    minify,
+                    search,
+                )
+        tmp_path.replace(dest_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    rendered.fragments = fragments.counts_since(before)
+    return rendered
+
+
+def render_page(
+    from_path,
+    dest_path,
+    context,
+    basepath,
+    ast_cache=None,
+    source_digest=None,
+    assets=None,
+    minify=False,
+    search=False,
+):
+    url = partial(url_for, basepath=basepath, assets=assets)
+    minifier = Minifier() if minify else None
+    if ast_cache is not None:
+        # The whole tree is needed to store it in the cache, so the page
+        # is not streamed from the source file block by block; only pages
+        # below STREAM_MIN_BYTES get here from generate_page
+        title, html_node, cached = parse_page(from_path, ast_cache, source_digest)
+        refs = site_urls(html_node)
+        found = (title, index_page(title, html_node)) if search else None
+        rewrite_urls(html_node, basepath, assets)
+        chunks = context.stream(html_node, Title=title, url=url)
+        with dest_path.open("w", encoding="utf-8") as f:
+            for chunk in minify_chunks(chunks, minifier):
+                f.write(chunk)
+        return RenderedPage(cached, refs, minify_stats(minifier), found)
+
+    refs = set()
+    terms = {} if search else None
+    with (
+        from_path.open(encoding="utf-8") as markdown_file,
+        dest_path.open("w", encoding="utf-8") as f,
+    ):
+        title = extract_title(markdown_file)
+        markdown_file.seek(0)
+        # Blocks are parsed as the body is written, so only one block of
+        # the source is in memory at a time
+        html_node = markdown_to_html_node(
+            markdown_file,
+            lazy=True,
+            basepath=basepath,
+            refs=refs,
+            assets=assets,
+            terms=terms,
+            fragments=fragments.active() is not None,
+        )
+
+        # Stream the template and the page body chunk by chunk; neither
+        # the body nor the whole page is ever built as one string
+        chunks = context.stream(html_node, Title=title, url=url)
+        for chunk in minify_chunks(chunks, minifier):
+            f.write(chunk)
+    # The blocks were indexed as they were parsed
+    found = (title, index_page(title, html_node, terms)) if search else None
+    return RenderedPage(False, refs, minify_stats(minifier), found)
+
+
+def render_page_staged(
+    from_path,
+    dest_path,
+    context,
+    basepath,
+    ast_cache=None,
+    source_digest=None,
+    assets=None,
+    minify=False,
+    search=False,
+):
+    """
+    Same output as render_page, but run one stage after the other so each
+    stage can be timed on its own when profiling. Holds the whole page in
+    memory.
+    """
+    title, html_node, cached = parse_page(from_path, ast_cache, source_digest)
+    found = None
+    if search:
+        with profiler.span("index"):
+            found = (title, index_page(title, html_node))
+    with profiler.span("rewrite"):
+        refs = site_urls(html_node)
+        rewrite_urls(html_node, basepath, assets)
+    with profiler.span("serialize"):
+        content = html_node.to_html()
+    with profiler.span("template"):
+        url = partial(url_for, basepath=basepath, assets=assets)
+        html = "".join(context.generate(Title=title, Content=content, url=url))
+    minifier = None
+    if minify:
+        with profiler.span("minify"):
+            minifier = Minifier()
+            html = "".join(minifier.minify([html]))
+    with profiler.span("write"):
+        dest_path.write_text(html, encoding="utf-8")
+    return RenderedPage(cached, refs, minify_stats(minifier), found)
+
+
+def parse_page(from_path, ast_cache=None, source_digest=None):
+    """
+    Return (title, node tree, cached) for a page. The tree has no basepath
+    applied; it comes from ast_cache when the cache has the page.
+    """
+    source = load_source(from_path, ast_cache, source_digest)
+    return parse_source(source, ast_cache, source_digest)
+
+
+def load_source(from_path, ast_cache=None, source_digest=None):
+    """
+    Return the (title, node tree) of the page from ast_cache when the cache
+    has it, otherwise the markdown of the page.
+    """
+    if ast_cache is not None:
+        with profiler.span("cache"):
+            entry = ast_cache.get(source_digest)
+        if entry is not None:
+            return entry
+    with profiler.span("read"):
+        return from_path.read_text(encoding="utf-8")
+
+
+def parse_source(source, ast_cache=None, source_digest=None):
+    """
+    Turn what load_source returned into (title, node tree, cached), storing
+    newly parsed pages in ast_cache.
+    """
+    if not isinstance(source, str):
+        return *source, True
+    with profiler.span("parse"):
+        title = extract_title(source)
+        # Cached trees keep the blocks' text for builds with a fragment cache
+        wrap = ast_cache is not None or fragments.active() is not None
+        html_node = markdown_to_html_node(source, fragments=wrap)
+    if ast_cache is not None:
+        with profiler.span("cache"):
+            ast_cache.put(source_digest, title, html_node)
+    return title, html_node, False
+
+
+def read_stage(task):
+    """
+    Pipeline read stage: load the source of a generate_page task, or None
+    for a source of at least STREAM_MIN_BYTES, which render_stage streams.
+    """
+    if task["source_size"] >= STREAM_MIN_BYTES:
+        return None
+    return load_source(task["from_path"], task["ast_cache"], task["source_digest"])
+
+
+def render_stage(task, source):
+    """
+    Pipeline render stage: return the HTML of the page and its RenderedPage.
+
+    A large page (source None) is written by generate_page as it renders,
+    and None is returned for its HTML: its write then no longer overlaps
+    rendering, but the page is never held in memory as one string.
+    """
+    if source is None:
+        return None, generate_page(**task)
+    logging.debug("Generating page from %s to %s", task["from_path"], task["dest_path"])
+    fragments.activate(task["fragment_cache"])
+    before = fragments.counts()
+    title, html_node, cached = parse_source(
+        source, task["ast_cache"], task["source_digest"]
+    )
+    refs = site_urls(html_node)
+    found = (title, index_page(title, html_node)) if task["search"] else None
+    rewrite_urls(html_node, task["basepath"], task["assets"])
+    context = get_render_context(task["template_path"], task["compiled_dir"])
+    url = partial(url_for, basepath=task["basepath"], assets=task["assets"])
+    minifier = Minifier() if task["minify"] else None
+    chunks = context.stream(html_node, Title=title, url=url)
+    html = "".join(minify_chunks(chunks, minifier))
+    counts = fragments.counts_since(before)
+    return html, RenderedPage(cached, refs, minify_stats(minifier), found, counts)
+
+
+def write_stage(task, html):
+    """
+    Pipeline write stage: replace the output of the page with html. The
+    parent directory must exist. A page streamed by render_stage (html
+    None) is already written.
+    """
+    if html is None:
+        return
+    write_atomic(task["dest_path"], html)
 
 
 def extract_title(markdown):
     """
     Extract the # header line of the markdown as the title.
+    markdown can be a string or an iterable of lines, such as an open file.
     """
-    lines = markdown.splitlines()
-    if not lines:
-        return ""
+    lines = markdown.splitlines() if isinstance(markdown, str) else markdown
     for line in lines:
         line = line.strip()
         if line.startswith("#"):
@@ -54,6 +368,43 @@ def extract_title(markdown):
     return ""
 
 
+def record_page_metrics(collected, result, output, ast_cache):
+    """
+    Add a page rendered without errors to collected, a Metrics.
+    """
+    rendered = result.value
+    collected.inc("ssg_pages_total", outcome="generated")
+    collected.inc("ssg_bytes_written_total", output.stat().st_size, kind="page")
+    if ast_cache:
+        outcome = "hit" if rendered.cached else "miss"
+        collected.inc("ssg_cache_lookups_total", cache="ast", result=outcome)
+    if rendered.fragments is not None:
+        hits, misses = rendered.fragments
+        collected.inc("ssg_cache_lookups_total", hits, cache="fragment", result="hit")
+        collected.inc(
+            "ssg_cache_lookups_total", misses, cache="fragment", result="miss"
+        )
+    for stage, seconds in result.stages.items():
+        collected.observe("ssg_stage_seconds", seconds, stage=stage)
+
+
+def report_dangling_refs(dangling, source):
+    """
+    Warn once about the links to missing pages or assets, naming the first
+    one; every link is logged at debug level, shown with --verbose.
+    """
+    if not dangling:
+        return
+    for source_key, url in dangling:
+        logging.debug("%s links to missing %s", source / source_key, url)
+    source_key, url = dangling[0]
+    pages = len({source_key for source_key, _ in dangling})
+    logging.warning(
+        f"{len(dangling)} links to missing pages or assets in {pages} pages, "
+        f"such as {url} in {source / source_key} (--verbose lists them all)"
+    )
+
+
 def delete_files_in_directory(directory):
     if not directory.exists():
         raise FileNotFoundError(f"Directory {directory} does not exist.")
@@ -62,54 +413,143 @@ def delete_files_in_directory(directory):
     if directory.name in ["/", ".", "..", ""]:
         raise ValueError("Invalid directory name for deletion.")
 
-    logging.info(f"Deleting files in directory: {directory}")
+    logging.debug("Deleting files in directory: %s", directory)
     for item in directory.iterdir():
         if item.is_file():
-            logging.info(f"Deleting file: {item}")
+            logging.debug("Deleting file: %s", item)
             item.unlink()
         elif item.is_dir():
-            logging.info(f"Recursively deleting directory: {item}")
+            logging.debug("Recursively deleting directory: %s", item)
             delete_files_in_directory(item)
             item.rmdir()
 
 
-def provision_static_assets(source, destination):
+def provision_static_assets(
+    source,
+    destination,
+    clean=True,
+    compare="mtime",
+    link=False,
+    jobs=1,
+    state_path=None,
+    fingerprint=False,
+    hash_cache_path=None,
+):
     logging.info(f"Provisioning static assets from {source} to {destination}")
 
     # Should we move this out?
     # Considering static and dynamic content - that can cause hard to catch bugs
-    delete_files_in_directory(destination)
-
-    logging.info(f"Copying files from {source} to {destination}")
+    # Incremental builds keep the previous output around, so wiping is opt-in.
+    if clean:
+        delete_files_in_directory(destination)
 
-    for item in source.iterdir():
-        if item.is_file():
-            logging.info(f"Copying file: {item} to {destination}")
-            destination_file = destination / item.name
-            destination_file.write_bytes(item.read_bytes())
-        elif item.is_dir():
-            logging.info(f"Recursively copying directory: {item} to {destination}")
-            new_destination = destination / item.name
-            new_destination.mkdir(parents=True, exist_ok=True)
-            provision_static_assets(item, new_destination)
+    return sync_static_assets(
+        source,
+        destination,
+        compare=compare,
+        link=link,
+        jobs=jobs,
+        state_path=state_path,
+        fingerprint=fingerprint,
+        hash_cache_path=hash_cache_path,
+    )
 
 
 def gather_markdown_files(dir_path):
     """
-    Gather all markdown files in the given directory and its subdirectories.
+    Gather all markdown files in the given directory and its subdirectories,
+    except those excluded by .ssgignore files, see iter_markdown_files.
     """
     if not dir_path.exists():
         raise FileNotFoundError(f"Directory {dir_path} does not exist.")
 
-    markdown_files = []
-    for item in dir_path.rglob("*.md"):
-        if item.is_file():
-            markdown_files.append(item)
+    return [path for path, _ in iter_markdown_files(dir_path)]
+
+
+def generate_pages_recursive(
+    source,
+    template_path,
+    destination,
+    basepath="/",
+    force=False,
+    manifest_path=None,
+    jobs=1,
+    template_cache_dir=None,
+    sources=None,
+    ast_cache_dir=None,
+    ast_cache_size=DEFAULT_MAX_BYTES,
+    explain=False,
+    io_threads=4,
+    prefetch=16,
+    assets=None,
+    minify=False,
+    search=False,
+    search_state_path=None,
+    shard=None,
+    shard_balance=False,
+    dir_cache_path=None,
+    fragment_cache_size=0,
+    fragment_cache_dir=None,
+    progress=False,
+):
+    """
+    Render every markdown file under source into destination.
+
+    When manifest_path is given, the dependency graph of the previous build
+    is loaded from it and only pages whose source, templates, generator
+    version or (for pages that use it) basepath changed are rebuilt;
+    outputs whose source was deleted are removed. force rebuilds everything.
+    explain logs why each page is rebuilt. Links to pages or assets missing
+    from destination are reported after the build.
+
+    With jobs > 1 pages are rendered in a process pool. Otherwise, unless
+    io_threads is 0 or the build is profiled, sources are read ahead by a
+    reader thread (at most prefetch pages) and outputs written by io_threads
+    writer threads while pages render; sources of STREAM_MIN_BYTES or more
+    are streamed into their output by the render thread instead. A failing
+    page does not stop the build; all failures are reported together at
+    the end.
 
-    return markdown_files
+    assets maps asset urls to fingerprinted urls; pages are rebuilt when
+    the fingerprint of an asset they or the template link to changes.
+    minify strips unrendered whitespace from the pages as they are written;
+    the bytes it saved are reported after the build.
+    search writes a sharded search index of the site into destination/search,
+    see SearchIndex. The terms of every page are kept in search_state_path,
+    so only the pages that are rebuilt are indexed again.
 
+    shard, (i, N), builds only the pages of shard i out of N, as chosen by
+    assign_shards (by file size with shard_balance), and records them in a
+    shard manifest in destination for merge_shards; outputs of the pages of
+    other shards are removed. Each shard needs its own manifest_path.
+    Links are not checked, they may point to other shards.
 
-def generate_pages_recursive(source, template_path, destination, basepath="/"):
+    template_cache_dir holds the template compiled into Python modules,
+    reused as long as the template files do not change.
+    ast_cache_dir holds parsed pages keyed by source digest, so pages whose
+    source did not change are not parsed again when only the template or the
+    basepath changed; it is trimmed to ast_cache_size bytes after the build.
+    Sources of STREAM_MIN_BYTES or more are streamed and never cached.
+
+    Pages are found by iter_markdown_files, which honors .ssgignore files,
+    and rendered while the walk goes on. dir_cache_path keeps the listing of
+    every directory, so directories that did not change are not read again.
+    Sources are only hashed when their size or mtime changed.
+
+    With fragment_cache_size > 0, blocks are serialized through a
+    FragmentCache of that many bytes, so blocks repeated across pages are
+    rendered once; off by default, as few blocks repeat in most sites.
+    With jobs > 1 the workers share what they render through a temporary
+    directory under fragment_cache_dir, removed after the build.
+
+    progress shows a status line of the pages done on a terminal while the
+    build runs. Pages, bytes written, cache lookups and the time each page
+    spent in every stage are recorded in the active metrics, see metrics.
+
+    sources limits the build to the given markdown files, for example the
+    ones watch mode saw change. Sources in that list that no longer exist
+    have their output removed; all other pages are left alone.
+    """
     if not source.exists():
         raise FileNotFoundError(f"Source directory {source} does not exist.")
     if not template_path.exists():
@@ -117,59 +557,615 @@ def generate_pages_recursive(source, template_path, destination, basepath="/"):
     if not destination.exists():
         raise FileNotFoundError(f"Destination directory {destination} does not exist.")
 
-    markdown_files = gather_markdown_files(source)
+    dir_cache = None
+    if sources is None:
+        if dir_cache_path is not None:
+            dir_cache = DirCache.load(dir_cache_path)
+        found = iter_markdown_files(source, dir_cache)
+        if shard is not None:
+            found = dict(found)
+            mine = set(select_shard(list(found), source, shard, shard_balance))
+            # Outputs of the pages of other shards, say from a full build,
+            # would collide with theirs when the shards are merged
+            for path in found.keys() - mine:
+                output = destination / path.relative_to(source).with_suffix(".html")
+                output.unlink(missing_ok=True)
+            found = [(path, stat) for path, stat in found.items() if path in mine]
+        gone = None
+    else:
+        found = [(path, path.stat()) for path in sources if path.exists()]
+        gone = {
+            path.relative_to(source).as_posix() for path in sources if not path.exists()
+        }
 
-    for markdown_file in markdown_files:
-        dest_path = destination / markdown_file.relative_to(source).with_suffix(".html")
-        try:
-            generate_page(
-                from_path=markdown_file,
-                template_path=template_path,
-                dest_path=dest_path,
-                basepath=basepath,
+    manifest = BuildManifest.load(manifest_path)
+    search_index = SearchIndex.load(search_state_path) if search else None
+    ast_cache = None
+    if ast_cache_dir is not None and ast_cache_size > 0:
+        ast_cache = ASTCache(ast_cache_dir, ast_cache_size)
+    inputs = build_inputs(template_path, basepath, manifest.inputs, assets, minify)
+    compiled_dir = None
+    if template_cache_dir is not None:
+        compiled_dir = compile_template(
+            template_path, inputs["templates"], template_cache_dir
+        )
+    fragment_cache = None
+    fragment_dir = None
+    if fragment_cache_size > 0:
+        if resolve_jobs(jobs) > 1 and fragment_cache_dir is not None:
+            fragment_cache_dir.mkdir(parents=True, exist_ok=True)
+            fragment_dir = Path(tempfile.mkdtemp(dir=fragment_cache_dir))
+        namespace = fragment_namespace(basepath, assets)
+        fragment_cache = (namespace, fragment_cache_size, fragment_dir)
+    live_sources = []
+    digests = {}
+
+    def plan_tasks():
+        """
+        Yield a task for every page that has to be rebuilt, as the pages are
+        found. In a pipelined build this runs in the reader thread.
+        """
+        made_dirs = set()
+        for markdown_file, stat in found:
+            source_key = markdown_file.relative_to(source).as_posix()
+            output_key = Path(source_key).with_suffix(".html").as_posix()
+            live_sources.append(source_key)
+
+            source_digest = manifest.source_digest(source_key, markdown_file, stat)
+            if force:
+                reasons = ["forced"]
+            else:
+                reasons = manifest.stale_reasons(
+                    source_key, source_digest, inputs, destination
+                )
+                if not reasons and search and source_key not in search_index.pages:
+                    reasons = ["not in the search index"]
+                if not reasons:
+                    continue
+            if explain:
+                logging.info(f"Rebuilding {markdown_file}: {', '.join(reasons)}")
+            digests[markdown_file] = (source_key, source_digest, output_key, stat)
+            dest_path = destination / output_key
+            # Pages of a directory share one mkdir
+            if dest_path.parent not in made_dirs:
+                dest_path.parent.mkdir(parents=True, exist_ok=True)
+                made_dirs.add(dest_path.parent)
+            yield {
+                "from_path": markdown_file,
+                "template_path": template_path,
+                "dest_path": dest_path,
+                "basepath": basepath,
+                "compiled_dir": compiled_dir,
+                "ast_cache": ast_cache,
+                "source_digest": source_digest,
+                "assets": assets,
+                "minify": minify,
+                "search": search,
+                "fragment_cache": fragment_cache,
+                "source_size": stat.st_size,
+            }
+
+    tasks = plan_tasks()
+    failed = []
+    cached = 0
+    minified = minified_size = saved = 0
+    fragment_hits = fragment_misses = 0
+    status = metrics.Progress() if progress else None
+    on_result = status.advance if status is not None else None
+    collected = metrics.active()
+    try:
+        if resolve_jobs(jobs) == 1 and io_threads > 0 and profiler.active() is None:
+            results = pipeline_pages(
+                read_stage,
+                render_stage,
+                write_stage,
+                tasks,
+                prefetch=prefetch,
+                writers=io_threads,
+                on_result=on_result,
             )
-            logging.info(f"Generated HTML page for {markdown_file}")
-        except Exception as e:
-            logging.error(f"Error generating page for {markdown_file}: {e}")
-            raise
+        else:
+            results = render_pages(generate_page, tasks, jobs=jobs, on_result=on_result)
+        if status is not None:
+            status.finish()
+        for result in results:
+            markdown_file = result.task["from_path"]
+            source_key, source_digest, output_key, stat = digests[markdown_file]
+            if result.error is not None:
+                manifest.forget(source_key)
+                if search:
+                    search_index.forget(source_key)
+                logging.error(
+                    f"Error generating page for {markdown_file}: {result.error}"
+                )
+                failed.append(markdown_file)
+                metrics.inc("ssg_pages_total", outcome="failed")
+                continue
+            manifest.record(
+                source_key, source_digest, output_key, inputs, result.value.refs, stat
+            )
+            cached += result.value.cached
+            if search:
+                search_index.update(source_key, output_key, *result.value.search)
+            if result.value.minified is not None:
+                minified += 1
+                minified_size += result.value.minified[0]
+                saved += result.value.minified[1]
+            if result.value.fragments is not None:
+                fragment_hits += result.value.fragments[0]
+                fragment_misses += result.value.fragments[1]
+            if collected is not None:
+                record_page_metrics(
+                    collected, result, destination / output_key, ast_cache is not None
+                )
+            logging.debug("Generated HTML page for %s", markdown_file)
 
+        if dir_cache is not None:
+            dir_cache.save()
+        found_count = len(live_sources)
+        if gone is not None:
+            live_sources = set(manifest.pages) - gone
+        pruned = manifest.prune(live_sources, destination)
+        if pruned:
+            logging.info(f"Removed {len(pruned)} stale pages whose source is gone")
+        if search:
+            search_index.prune(manifest.pages)
+            written, removed = search_index.write(destination, basepath)
+            logging.info(
+                f"Search index: {len(search_index.pages)} pages, "
+                f"{written} shards written, {removed} removed"
+            )
+        if shard is None:
+            report_dangling_refs(manifest.dangling_refs(destination, assets), source)
+            # Left by an earlier sharded build into the same directory
+            (destination / SHARD_MANIFEST).unlink(missing_ok=True)
+        else:
+            outputs = {key: entry["output"] for key, entry in manifest.pages.items()}
+            write_shard_manifest(destination, shard, shard_balance, outputs)
+    finally:
+        if status is not None:
+            status.finish()
+        manifest.save(inputs)
+        if ast_cache is not None:
+            ast_cache.evict()
+        if fragment_dir is not None:
+            shutil.rmtree(fragment_dir, ignore_errors=True)
 
-def main():
-    # Configure root logger once, at program entry
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s %(levelname)-8s [%(name)s] %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
+    metrics.inc("ssg_pages_total", found_count - len(digests), outcome="up_to_date")
+    if dir_cache is not None:
+        metrics.inc(
+            "ssg_cache_lookups_total", dir_cache.reused, cache="directory", result="hit"
+        )
+        metrics.inc(
+            "ssg_cache_lookups_total",
+            len(dir_cache.seen) - dir_cache.reused,
+            cache="directory",
+            result="miss",
+        )
+    logging.info(
+        f"Pages: {len(digests) - len(failed)} generated "
+        f"({cached} from the AST cache), "
+        f"{found_count - len(digests)} up to date, {len(failed)} failed"
     )
+    if dir_cache is not None:
+        logging.info(
+            f"Discovery: {len(dir_cache.seen)} directories cached, "
+            f"{dir_cache.reused} unchanged"
+        )
+    if minified:
+        logging.info(
+            f"Minification: {saved} bytes saved on {minified} pages "
+            f"({saved / minified_size:.1%})"
+        )
+    if fragment_hits + fragment_misses:
+        lookups = fragment_hits + fragment_misses
+        logging.info(
+            f"Fragment cache: {fragment_hits} hits, {fragment_misses} misses "
+            f"({fragment_hits / lookups:.1%} hit rate)"
+        )
+    if failed:
+        raise RuntimeError(
+            f"Failed to generate {len(failed)} page(s): "
+            + ", ".join(str(path) for path in failed)
+        )
 
-    if len(sys.argv) > 1:
-        basepath = sys.argv[1]
-    else:
-        basepath = "/"
 
-    logging.info("Starting static asset provisioning...")
-    static_source = Path("static")
-    destination = Path("docs")
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build the site from content/ into docs/."
+    )
+    parser.add_argument(
+        "basepath",
+        nargs="?",
+        default="/",
+        help="URL prefix the site is served under (default: /)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="ignore the build manifest, wipe docs/ and rebuild every page",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="log every page, asset and variant written or removed instead of "
+        "showing a progress line",
+    )
+    parser.add_argument(
+        "--metrics-dir",
+        type=Path,
+        default=CACHE_DIR,
+        metavar="DIR",
+        help="where to write metrics.prom (for the node_exporter textfile "
+        "collector) and metrics.json after every build (default: .ssg-cache)",
+    )
+    parser.add_argument(
+        "--explain",
+        action="store_true",
+        help="log why each page is rebuilt",
+    )
+    parser.add_argument(
+        "--asset-compare",
+        choices=COMPARE_MODES,
+        default="mtime",
+        help="how to detect changed static assets: size and mtime, or size "
+        "and content hash (default: mtime)",
+    )
+    parser.add_argument(
+        "--link-assets",
+        action="store_true",
+        help="hard link static assets into docs/ instead of copying them",
+    )
+    parser.add_argument(
+        "--fingerprint",
+        action="store_true",
+        help="copy static assets to names with their content hash "
+        "(index.<hash>.css), list them in docs/asset-manifest.json and point "
+        "links at them",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="render pages in N worker processes (0: one per CPU, default: 1)",
+    )
+    parser.add_argument(
+        "--io-threads",
+        type=int,
+        default=4,
+        metavar="N",
+        help="without --jobs, write pages in N threads while the next pages "
+        "are read and rendered (0: no pipelining, default: 4)",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=16,
+        metavar="N",
+        help="how many pages the pipeline reads ahead and holds waiting to be "
+        "written (default: 16)",
+    )
+    parser.add_argument(
+        "--minify",
+        action="store_true",
+        help="strip the whitespace browsers do not render from the pages; "
+        "<pre>, <textarea>, <script> and <style> are left as they are",
+    )
+    parser.add_argument(
+        "--search",
+        action="store_true",
+        help="write a search index of the site into docs/search/",
+    )
+    parser.add_argument(
+        "--atomic-publish",
+        action="store_true",
+        help="build into a staging directory next to docs/ and publish it by "
+        "exchanging the two directories, keeping older builds in "
+        ".docs.generations/ for src/publish.py rollback",
+    )
+    parser.add_argument(
+        "--keep-generations",
+        type=int,
+        default=DEFAULT_KEEP,
+        metavar="N",
+        help="with --atomic-publish, how many published builds to keep; older "
+        f"ones are removed in the background (default: {DEFAULT_KEEP})",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="write .gz (and .br when brotli is installed) variants next to "
+        "every text file in docs/; a build without it removes them again",
+    )
+    parser.add_argument(
+        "--compress-min-size",
+        type=int,
+        default=1024,
+        metavar="BYTES",
+        help="do not compress files smaller than this (default: 1024)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="after building, watch content/, static/ and the template and "
+        "rebuild what changes",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=0.5,
+        metavar="SECONDS",
+        help="how often watch mode polls for changes (default: 0.5)",
+    )
+    parser.add_argument(
+        "--ast-cache-size",
+        type=int,
+        default=DEFAULT_MAX_BYTES // 1024 // 1024,
+        metavar="MiB",
+        help="size cap of the parsed page cache in .ssg-cache/ast; least "
+        "recently used pages are evicted past it (0: no cache, default: 64)",
+    )
+    parser.add_argument(
+        "--fragment-cache-size",
+        type=int,
+        default=0,
+        metavar="MiB",
+        help="cache rendered blocks shared by pages, such as a nav list, in "
+        "memory up to this size (0: no cache, the default; try "
+        f"{fragments.DEFAULT_MAX_BYTES // 1024 // 1024})",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=CACHE_DIR / "trace.json",
+        type=Path,
+        metavar="TRACE",
+        help="time every page and stage, track peak memory per page and write "
+        "a Chrome/Perfetto trace (default: .ssg-cache/trace.json)",
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=10,
+        metavar="N",
+        help="how many of the slowest pages to report when profiling",
+    )
+    parser.add_argument(
+        "--shard",
+        type=shard_type,
+        metavar="i/N",
+        help="build only the pages of shard i of N, for splitting a build "
+        "across machines; merge the outputs with src/shard.py merge",
+    )
+    parser.add_argument(
+        "--shard-balance",
+        action="store_true",
+        help="split pages between shards by file size instead of by a hash "
+        "of their path",
+    )
+    args = parser.parse_args(argv)
+    if args.shard is not None and (args.watch or args.search):
+        parser.error("--shard cannot be combined with --watch or --search")
+    return args
+
 
+def shard_type(value):
     try:
-        provision_static_assets(static_source, destination)
-        logging.info("Static assets provisioned successfully.")
-    except Exception as e:
-        logging.error(f"Error during static asset provisioning: {e}")
-        raise
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from e
+
+
+def build_site(args):
+    with output_directory(args, clean=args.force) as destination:
+        logging.info("Starting static asset provisioning...")
+        try:
+            with profiler.span("static assets", cat="build"), metrics.phase("assets"):
+                # A staged build starts from an empty directory instead
+                clean = args.force and not args.atomic_publish
+                provision_assets(args, destination, clean=clean)
+            logging.info("Static assets provisioned successfully.")
+        except Exception as e:
+            logging.error(f"Error during static asset provisioning: {e}")
+            raise
 
-    logging.info("Generating HTML pages from markdown files...")
+        logging.info("Generating HTML pages from markdown files...")
+        with profiler.span("pages", cat="build"), metrics.phase("pages"):
+            build_pages(args, destination, force=args.force)
 
-    content_source = Path("content")
-    template_file = Path("template.html")
+        if args.compress:
+            with profiler.span("compress", cat="build"), metrics.phase("compress"):
+                compress_site(args, destination)
+        else:
+            remove_compressed(destination, CACHE_DIR / "compress.json")
 
+
+@contextmanager
+def output_directory(args, clean=False):
+    """
+    Yield the directory to build into: docs/ itself, or with
+    --atomic-publish a staging directory (empty with clean) that replaces
+    docs/ when the build succeeds, see Generations.
+    """
+    if not args.atomic_publish:
+        yield OUTPUT_DIR
+        return
+    generations = Generations(OUTPUT_DIR, args.keep_generations)
+    staging = generations.stage(clean=clean)
+    yield staging
+    generations.publish(staging)
+    generations.clean()
+
+
+def provision_assets(args, destination, clean=False):
+    stats = provision_static_assets(
+        STATIC_DIR,
+        destination,
+        clean=clean,
+        compare=args.asset_compare,
+        link=args.link_assets,
+        jobs=resolve_jobs(args.jobs),
+        state_path=CACHE_DIR / "assets.json",
+        fingerprint=args.fingerprint,
+        hash_cache_path=CACHE_DIR / "asset-hashes.json",
+    )
+    metrics.inc("ssg_files_total", stats.copied, kind="asset", outcome="copied")
+    metrics.inc("ssg_files_total", stats.skipped, kind="asset", outcome="unchanged")
+    metrics.inc("ssg_files_total", stats.removed, kind="asset", outcome="removed")
+    metrics.inc("ssg_bytes_written_total", stats.copied_bytes, kind="asset")
+
+
+def build_pages(args, destination, force=False, sources=None):
     generate_pages_recursive(
-        source=content_source,
-        template_path=template_file,
+        source=CONTENT_DIR,
+        template_path=TEMPLATE_FILE,
         destination=destination,
-        basepath=basepath,
+        basepath=args.basepath,
+        force=force,
+        jobs=args.jobs,
+        template_cache_dir=CACHE_DIR / "templates",
+        manifest_path=CACHE_DIR / manifest_name(args.shard),
+        sources=sources,
+        ast_cache_dir=CACHE_DIR / "ast",
+        ast_cache_size=args.ast_cache_size * 1024 * 1024,
+        explain=args.explain,
+        io_threads=args.io_threads,
+        prefetch=args.prefetch,
+        assets=load_asset_manifest(destination) if args.fingerprint else None,
+        minify=args.minify,
+        search=args.search,
+        search_state_path=CACHE_DIR / "search.json",
+        shard=args.shard,
+        shard_balance=args.shard_balance,
+        dir_cache_path=CACHE_DIR / "dirs.json",
+        fragment_cache_size=args.fragment_cache_size * 1024 * 1024,
+        fragment_cache_dir=CACHE_DIR / "fragments",
+        progress=not args.verbose,
+    )
+
+
+def manifest_name(shard):
+    if shard is None:
+        return "manifest.json"
+    return f"manifest.{shard[0]}-of-{shard[1]}.json"
+
+
+def rebuild_changed(args, changed, removed):
+    """
+    Bring docs/ up to date after the files in changed and removed were
+    modified: static files are resynced, content files rebuild their own
+    page, and a template change (or with --fingerprint, an asset change)
+    rebuilds the pages that depend on it.
+    """
+    touched = changed | removed
+    assets_changed = any(STATIC_DIR in path.parents for path in touched)
+    metrics.start()
+    try:
+        rebuild_outputs(args, touched, assets_changed)
+    finally:
+        export_metrics(args)
+
+
+def rebuild_outputs(args, touched, assets_changed):
+    """
+    The rebuild of rebuild_changed, for the files in touched.
+    """
+    with output_directory(args) as destination:
+        # Assets first: with --fingerprint, pages link to their new names
+        if assets_changed:
+            provision_assets(args, destination)
+
+        # An edited .ssgignore can bring pages in or take them out
+        rules_changed = any(path.name == IGNORE_FILE for path in touched)
+        if (
+            TEMPLATE_FILE in touched
+            or rules_changed
+            or (assets_changed and args.fingerprint)
+        ):
+            logging.info(
+                "Template, .ssgignore or fingerprinted assets changed, "
+                "checking all pages"
+            )
+            build_pages(args, destination)
+        else:
+            # Pages a full build leaves out stay out
+            pages = sorted(
+                path
+                for path in touched
+                if CONTENT_DIR in path.parents
+                and path.suffix == ".md"
+                and not is_ignored(CONTENT_DIR, path)
+            )
+            if pages:
+                build_pages(args, destination, sources=pages)
+
+        if args.compress:
+            compress_site(args, destination)
+
+
+def compress_site(args, destination):
+    stats = compress_outputs(
+        destination,
+        min_size=args.compress_min_size,
+        jobs=resolve_jobs(args.jobs),
+        state_path=CACHE_DIR / "compress.json",
+    )
+    metrics.inc("ssg_files_total", stats.compressed, kind="variant", outcome="written")
+    metrics.inc("ssg_files_total", stats.unchanged, kind="variant", outcome="unchanged")
+    metrics.inc(
+        "ssg_bytes_written_total",
+        sum(stats.compressed_bytes.values()),
+        kind="variant",
+    )
+
+
+def export_metrics(args):
+    """
+    Stop collecting metrics and write them to the metrics directory.
+    """
+    collected = metrics.stop()
+    if collected is None:
+        return
+    prom_path, json_path = collected.write(args.metrics_dir)
+    logging.info(f"Wrote metrics to {prom_path} and {json_path}")
+
+
+def main():
+    args = parse_args()
+    # Configure root logger once, at program entry
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s %(levelname)-8s [%(name)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
     )
 
+    if args.profile:
+        profiler.start(track_memory=True)
+    metrics.start()
+    try:
+        build_site(args)
+    finally:
+        export_metrics(args)
+    if args.profile:
+        tracer = profiler.stop()
+        profiler.write_trace(tracer, args.profile)
+        profiler.log_report(tracer, args.profile_top)
+        logging.info(f"Wrote trace to {args.profile}")
+
+    if args.watch:
+        try:
+            watch(
+                [CONTENT_DIR, STATIC_DIR, TEMPLATE_FILE],
+                partial(rebuild_changed, args),
+                interval=args.watch_interval,
+                content=CONTENT_DIR,
+            )
+        except KeyboardInterrupt:
+            logging.info("Stopped watching")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import logging
+
+from fsutil import write_atomic
+from render import template_dependencies
+from urls import asset_url
+
+# Bump whenever a change to the generator alters the HTML it produces,
+# so that every page built by an older generator is considered stale.
+GENERATOR_VERSION = "0.1.0"
+
+MANIFEST_FORMAT = 2
+
+
+def file_digest(path):
+    """
+    Return the sha256 hex digest of the file at path.
+    """
+    with path.open("rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def build_inputs(template_path, basepath, previous=None, assets=None, minify=False):
+    """
+    Collect the inputs shared by every page of a build: the generator
+    version, the digest of every template file the page template is built
+    from, the basepath, whether the template itself uses the basepath, the
+    urls the template passes to url(), the fingerprinted asset urls and
+    whether pages are minified.
+
+    previous are the inputs of the last build. When none of its template
+    files changed, its analysis of the templates is reused instead of
+    parsing them again.
+    """
+    inputs = {
+        "generator": GENERATOR_VERSION,
+        "basepath": basepath,
+        "assets": assets,
+        "minify": minify,
+    }
+    if (
+        previous
+        and "template_urls" in previous
+        and template_path.name in previous["templates"]
+    ):
+        digests = {}
+        for name in previous["templates"]:
+            path = template_path.parent / name
+            digests[name] = file_digest(path) if path.is_file() else None
+        if digests == previous["templates"]:
+            inputs["templates"] = digests
+            inputs["template_uses_basepath"] = previous["template_uses_basepath"]
+            inputs["template_urls"] = previous["template_urls"]
+            return inputs
+
+    templates, variables, urls = template_dependencies(template_path)
+    inputs["templates"] = {name: file_digest(path) for name, path in templates.items()}
+    inputs["template_uses_basepath"] = "url" in variables
+    inputs["template_urls"] = sorted(urls)
+    return inputs
+
+
+def page_dependencies(inputs, refs):
+    """
+    Return the build inputs a page with links to refs depends on besides
+    its own source, as {dependency: value}. The basepath is only a
+    dependency of pages whose output it changes: those with site-absolute
+    urls, or all pages when the template calls url(). Likewise, a page only
+    depends on the fingerprints of the assets it or the template link to.
+    Minified pages depend on being minified.
+    """
+    deps = {"generator": inputs["generator"]}
+    if inputs["minify"]:
+        deps["minify"] = True
+    for name, digest in inputs["templates"].items():
+        deps[f"template:{name}"] = digest
+    if refs or inputs["template_uses_basepath"]:
+        deps["basepath"] = inputs["basepath"]
+    if inputs["assets"]:
+        for url in sorted({*refs, *inputs["template_urls"]}):
+            fingerprinted = asset_url(url, inputs["assets"])
+            if fingerprinted is not None:
+                deps[f"asset:{url}"] = fingerprinted
+    return deps
+
+
+def describe_change(dependency, old, new):
+    if dependency.startswith("template:"):
+        name = dependency.removeprefix("template:")
+        if old is None:
+            return f"now uses template {name}"
+        if new is None:
+            return f"no longer uses template {name}"
+        return f"template {name} changed"
+    return f"{dependency} changed ({old} -> {new})"
+
+
+class BuildManifest:
+    """
+    Persistent record of what the previous build produced.
+
+    Pages are keyed by their source path relative to the content directory
+    and remember the digest (and size and mtime) of the source, the output
+    path relative to the destination directory, the other inputs the output
+    depends on (see page_dependencies) and the site-absolute urls the page
+    links to. Together they form the dependency graph of the site: a page
+    is rebuilt only when one of its own dependencies changed.
+    """
+
+    def __init__(self, path, inputs=None, pages=None):
+        self.path = path
+        self.inputs = inputs if inputs is not None else {}
+        self.pages = pages if pages is not None else {}
+
+    @classmethod
+    def load(cls, path):
+        if path is None or not path.exists():
+            return cls(path)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable build manifest {path}: {e}")
+            return cls(path)
+        if data.get("format") != MANIFEST_FORMAT:
+            logging.info(f"Build manifest {path} has an old format, ignoring it")
+            return cls(path)
+        return cls(path, data.get("inputs"), data.get("pages"))
+
+    def stale_reasons(self, source_key, source_digest, inputs, destination):
+        """
+        Return why the page built from source_key has to be rebuilt, as a
+        list of human readable reasons; an empty list means it is up to date.
+        """
+        entry = self.pages.get(source_key)
+        if entry is None:
+            return ["new page"]
+        if entry["source"] != source_digest:
+            return ["source changed"]
+        old = entry["deps"]
+        # The source is unchanged, so are the urls it links to
+        new = page_dependencies(inputs, entry["refs"])
+        reasons = [
+            describe_change(dep, old.get(dep), new.get(dep))
+            for dep in sorted(old.keys() | new.keys())
+            if old.get(dep) != new.get(dep)
+        ]
+        if not (destination / entry["output"]).exists():
+            reasons.append("output missing")
+        return reasons
+
+    def source_digest(self, source_key, path, stat):
+        """
+        Return the digest of the source at path. The file is only read when
+        its size or mtime (from stat) differ from those recorded for it.
+        """
+        entry = self.pages.get(source_key)
+        state = [stat.st_size, stat.st_mtime_ns]
+        if entry is not None and entry.get("stat") == state:
+            return entry["source"]
+        digest = file_digest(path)
+        if entry is not None and entry["source"] == digest:
+            # Same bytes with a new mtime: skip the hash next time
+            entry["stat"] = state
+        return digest
+
+    def record(self, source_key, source_digest, output_key, inputs, refs=(), stat=None):
+        self.pages[source_key] = {
+            "source": source_digest,
+            "output": output_key,
+            "deps": page_dependencies(inputs, refs),
+            "refs": sorted(refs),
+        }
+        if stat is not None:
+            self.pages[source_key]["stat"] = [stat.st_size, stat.st_mtime_ns]
+
+    def dangling_refs(self, destination, assets=None):
+        """
+        Return [(source key, url)] for every link to a page or asset that
+        is not in destination. Links to fingerprinted assets are looked up
+        under their fingerprinted name.
+        """
+        found = {}
+        dangling = []
+        for source_key, entry in sorted(self.pages.items()):
+            for url in entry["refs"]:
+                if url not in found:
+                    target = assets and asset_url(url, assets) or url
+                    found[url] = output_exists(destination, target)
+                if not found[url]:
+                    dangling.append((source_key, url))
+        return dangling
+
+    def forget(self, source_key):
+        self.pages.pop(source_key, None)
+
+    def prune(self, live_sources, destination):
+        """
+        Delete outputs whose source no longer exists.
+        Returns the list of removed output paths.
+        """
+        removed = []
+        for source_key in sorted(set(self.pages) - set(live_sources)):
+            entry = self.pages.pop(source_key)
+            output = destination / entry["output"]
+            if output.exists():
+                logging.debug(
+                    "Removing stale page %s (source %s is gone)", output, source_key
+                )
+                output.unlink()
+                removed.append(output)
+                remove_empty_parents(output.parent, destination)
+        return removed
+
+    def save(self, inputs):
+        if self.path is None:
+            return
+        self.inputs = inputs
+        data = {"format": MANIFEST_FORMAT, "inputs": self.inputs, "pages": self.pages}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.path, json.dumps(data, indent=1, sort_keys=True))
+
+
+def remove_empty_parents(directory, stop):
+    """
+    Remove directory and its parents while they are empty, stopping at stop.
+    """
+    while directory != stop and stop in directory.parents:
+        try:
+            directory.rmdir()
+        except OSError:
+            return
+        directory = directory.parent
+
+
+def output_exists(destination, url):
+    """
+    Return True if the site-absolute url resolves to a file in destination,
+    either directly or as the index.html of a directory.
+    """
+    path = url.split("#", 1)[0].split("?", 1)[0].lstrip("/")
+    target = destination / path
+    return target.is_file() or (target / "index.html").is_file()
@@ -0,0 +1,257 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from fsutil import write_atomic
+
+# The metrics of this process, or None when they are not collected. inc()
+# and observe() check it first, so recording costs next to nothing when off.
+_metrics = None
+_NO_TIMER = nullcontext()
+
+# Upper bounds, in seconds, of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# name: (type, help) of every metric a build records
+METRICS = {
+    "ssg_pages_total": ("counter", "Pages by outcome"),
+    "ssg_files_total": ("counter", "Static assets and compressed variants by outcome"),
+    "ssg_bytes_written_total": ("counter", "Bytes written to the output by kind"),
+    "ssg_cache_lookups_total": ("counter", "Cache lookups by cache and result"),
+    "ssg_stage_seconds": ("histogram", "Time spent on a page in each stage"),
+    "ssg_phase_seconds": ("histogram", "Wall time of each phase of the build"),
+}
+
+
+class Histogram:
+    """
+    Observation counts per bucket of BUCKETS (not cumulative), plus their
+    sum and count.
+    """
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = 0
+        while index < len(BUCKETS) and value > BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        Return [(upper bound, observations <= it)...], ending with "+Inf".
+        """
+        total = 0
+        result = []
+        for bound, count in zip((*BUCKETS, "+Inf"), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Metrics:
+    """
+    Counters and histograms of a build, keyed by metric name and labels.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def value(self, name, **labels):
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def to_json(self):
+        """
+        Return {name: [{"labels", "value"}...]} for counters and
+        {name: [{"labels", "count", "sum", "buckets"}...]} for histograms.
+        """
+        data = {}
+        for (name, labels), value in sorted(self.counters.items()):
+            data.setdefault(name, []).append({"labels": dict(labels), "value": value})
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            data.setdefault(name, []).append(
+                {
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": round(histogram.sum, 6),
+                    "buckets": [
+                        [str(bound), count] for bound, count in histogram.cumulative()
+                    ],
+                }
+            )
+        return data
+
+    def to_prometheus(self):
+        """
+        Return the metrics in the Prometheus text exposition format, as read
+        by the textfile collector of node_exporter.
+        """
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            counters = sorted(
+                (labels, value)
+                for (metric, labels), value in self.counters.items()
+                if metric == name
+            )
+            histograms = sorted(
+                (labels, histogram)
+                for (metric, labels), histogram in self.histograms.items()
+                if metric == name
+            )
+            if not counters and not histograms:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in counters:
+                lines.append(f"{name}{format_labels(labels)} {value}")
+            for labels, histogram in histograms:
+                for bound, count in histogram.cumulative():
+                    bucket_labels = format_labels((*labels, ("le", str(bound))))
+                    lines.append(f"{name}_bucket{bucket_labels} {count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory):
+        """
+        Write metrics.prom and metrics.json into directory. Returns their paths.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for name, text in (
+            ("metrics.prom", self.to_prometheus()),
+            ("metrics.json", json.dumps(self.to_json(), indent=1, sort_keys=True)),
+        ):
+            path = directory / name
+            # The textfile collector may read the file at any time
+            write_atomic(path, text)
+            paths.append(path)
+        return paths
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def start():
+    """
+    Start collecting metrics in this process.
+    """
+    global _metrics
+    _metrics = Metrics()
+    return _metrics
+
+
+def stop():
+    """
+    Stop collecting metrics and return what was collected.
+    """
+    global _metrics
+    collected, _metrics = _metrics, None
+    return collected
+
+
+def active():
+    return _metrics
+
+
+def inc(name, value=1, **labels):
+    if _metrics is not None:
+        _metrics.inc(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    if _metrics is not None:
+        _metrics.observe(name, value, **labels)
+
+
+def phase(name):
+    """
+    Time a phase of the build into ssg_phase_seconds.
+    """
+    if _metrics is None:
+        return _NO_TIMER
+    return _timed_phase(name)
+
+
+@contextmanager
+def _timed_phase(name):
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("ssg_phase_seconds", time.perf_counter() - start_time, phase=name)
+
+
+class Progress:
+    """
+    One status line of the pages done so far, redrawn in place on a
+    terminal at most every interval seconds. Nothing is drawn when stream
+    is not a terminal. advance() can be called from several threads.
+    """
+
+    def __init__(self, stream=None, interval=0.2):
+        self.stream = stream if stream is not None else sys.stderr
+        self.enabled = self.stream.isatty()
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.last = 0.0
+        self.done = 0
+        self.failed = 0
+        self.drawn = False
+
+    def advance(self, result):
+        """
+        Count a PageResult and redraw the line if it is due.
+        """
+        with self.lock:
+            self.done += 1
+            self.failed += result.error is not None
+            now = time.perf_counter()
+            if not self.enabled or now - self.last < self.interval:
+                return
+            self.last = now
+            rate = self.done / (now - self.start)
+            self.stream.write(
+                f"\r\033[KPages: {self.done} done, {self.failed} failed, {rate:.0f}/s"
+            )
+            self.stream.flush()
+            self.drawn = True
+
+    def finish(self):
+        """
+        Clear the line, so log lines written after it start on a clean line.
+        """
+        with self.lock:
+            if self.drawn:
+                self.stream.write("\r\033[K")
+                self.stream.flush()
+                self.drawn = False
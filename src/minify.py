@@ -0,0 +1,193 @@
+import re
+
+# Elements whose content is kept byte for byte: whitespace is significant
+# in them, or they are not HTML at all
+RAW_TAGS = frozenset(("pre", "textarea", "script", "style"))
+
+# Elements around which whitespace is never rendered, so it can be dropped
+# instead of collapsed to a single space
+BLOCK_TAGS = frozenset(
+    (
+        "!doctype",
+        "address",
+        "article",
+        "aside",
+        "blockquote",
+        "body",
+        "dd",
+        "div",
+        "dl",
+        "dt",
+        "figcaption",
+        "figure",
+        "footer",
+        "form",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "head",
+        "header",
+        "hr",
+        "html",
+        "li",
+        "link",
+        "main",
+        "meta",
+        "nav",
+        "ol",
+        "p",
+        "pre",
+        "section",
+        "table",
+        "tbody",
+        "td",
+        "tfoot",
+        "th",
+        "thead",
+        "title",
+        "tr",
+        "ul",
+    )
+)
+
+# Only HTML whitespace: a non-breaking space is content
+TOKEN = re.compile(
+    r"<!--.*?-->"
+    r"|<[a-zA-Z/!](?:[^>\"']|\"[^\"]*\"|'[^']*')*>"
+    r"|[ \t\n\r\f]+"
+    r"|[^< \t\n\r\f]+"
+    r"|<",
+    re.S,
+)
+TAG_NAME = re.compile(r"</?([a-zA-Z!][^\s/>]*)")
+TAG_START = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ/!")
+END_TAGS = {name: re.compile(f"</{name}", re.I) for name in RAW_TAGS}
+
+
+class Minifier:
+    """
+    Removes the whitespace a browser would not render from HTML that
+    arrives in chunks, without ever holding more than a chunk (plus an
+    unfinished tag) in memory.
+
+    Runs of whitespace collapse to a single space, and whitespace next to
+    block-level tags is dropped. The content of <pre>, <textarea>, <script>
+    and <style>, tags themselves and comments are left exactly as they are.
+    Only ASCII whitespace is ever removed, so the number of characters
+    removed is the number of bytes saved.
+    """
+
+    def __init__(self):
+        self.chars_in = 0
+        self.chars_out = 0
+        self._carry = ""
+        self._raw = None
+        self._space = False
+        # At the start of the document, whitespace is not rendered either
+        self._after_block = True
+
+    @property
+    def saved(self):
+        return self.chars_in - self.chars_out
+
+    def minify(self, chunks):
+        """
+        Yield the minified HTML of chunks, an iterable of strings.
+        """
+        for chunk in chunks:
+            self.chars_in += len(chunk)
+            out = self._feed(self._carry + chunk, final=False)
+            if out:
+                self.chars_out += len(out)
+                yield out
+        out = self._feed(self._carry, final=True)
+        if out:
+            self.chars_out += len(out)
+            yield out
+
+    def _feed(self, text, final):
+        self._carry = ""
+        out = []
+        pos = 0
+        end = len(text)
+        while pos < end:
+            if self._raw is not None:
+                pos = self._feed_raw(text, pos, out, final)
+                if self._raw is not None:
+                    break
+                continue
+            match = TOKEN.match(text, pos)
+            token = match.group()
+            if token == "<" and not final:
+                following = text[pos + 1 : pos + 2]
+                if not following or following in TAG_START:
+                    # Possibly a tag cut in two by the end of the chunk
+                    self._carry = text[pos:]
+                    break
+            if token.startswith("<!--"):
+                if not token.endswith("-->") and not final:
+                    # A comment cut in two by the end of the chunk
+                    self._carry = text[pos:]
+                    break
+                # Comments are kept and leave the whitespace around them as is
+                pos = match.end()
+                out.append(token)
+                continue
+            pos = match.end()
+            first = token[0]
+            if first in " \t\n\r\f":
+                self._space = True
+            elif first == "<" and len(token) > 1:
+                self._tag(token, out)
+            else:
+                if self._space and not self._after_block:
+                    out.append(" ")
+                self._space = False
+                self._after_block = False
+                out.append(token)
+        return "".join(out)
+
+    def _tag(self, token, out):
+        name = TAG_NAME.match(token).group(1).lower()
+        if name in BLOCK_TAGS:
+            self._after_block = True
+        else:
+            if self._space and not self._after_block:
+                out.append(" ")
+            self._after_block = False
+        self._space = False
+        out.append(token)
+        if name in RAW_TAGS and not token.startswith("</"):
+            self._raw = name
+
+    def _feed_raw(self, text, pos, out, final):
+        """
+        Copy text verbatim up to the end tag of the raw element, and return
+        where to go on from.
+        """
+        match = END_TAGS[self._raw].search(text, pos)
+        if match is None:
+            if final:
+                out.append(text[pos:])
+                return len(text)
+            # Keep what could be the start of the end tag for the next chunk
+            keep = max(pos, len(text) - len(self._raw) - 1)
+            out.append(text[pos:keep])
+            self._carry = text[keep:]
+            return len(text)
+        if match.start() > pos:
+            out.append(text[pos : match.start()])
+            self._space = False
+            self._after_block = False
+        self._raw = None
+        return match.start()
+
+
+def minify_html(html):
+    """
+    Return html minified like Minifier does.
+    """
+    return "".join(Minifier().minify([html]))
@@ -0,0 +1,233 @@
+import logging
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import profiler
+
+# Aim for a few chunks per worker so a slow chunk near the end of the run
+# does not leave the other workers idle, without paying one round trip per
+# page for small pages.
+CHUNKS_PER_WORKER = 4
+
+
+class PageResult:
+    def __init__(self, task, elapsed, error=None, events=None, value=None, stages=None):
+        self.task = task
+        self.elapsed = elapsed
+        # {stage: seconds} spent on the task, for the build metrics
+        self.stages = stages if stages is not None else {"render": elapsed}
+        self.error = error
+        # What render returned, None if it failed
+        self.value = value
+        # Profiling spans recorded in a worker process, sent back to the parent
+        self.events = events
+
+    def __repr__(self):
+        return f"PageResult({self.task}, {self.elapsed:.4f}, {self.error})"
+
+
+def resolve_jobs(jobs):
+    """
+    Turn the --jobs value into a worker count; 0 means one per CPU.
+    """
+    if jobs < 0:
+        raise ValueError(f"Invalid number of jobs: {jobs}")
+    if jobs == 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def chunk_size(task_count, jobs):
+    return max(1, task_count // (jobs * CHUNKS_PER_WORKER))
+
+
+def run_task(render, task):
+    """
+    Call render(**task), capturing the error instead of raising it so one
+    broken page does not stop the rest of the build.
+    """
+    start = time.perf_counter()
+    error = value = None
+    try:
+        value = render(**task)
+    except Exception as e:
+        error = describe_error(e)
+    tracer = profiler.active()
+    events = tracer.take_events() if tracer is not None and tracer.worker else None
+    return PageResult(task, time.perf_counter() - start, error, events, value)
+
+
+def describe_error(e):
+    logging.debug(traceback.format_exc())
+    return f"{type(e).__name__}: {e}"
+
+
+def render_pages(render, tasks, jobs=1, on_result=None):
+    """
+    Run render(**task) for every task, in a process pool when jobs > 1.
+
+    render must be a module level function so it can be sent to the workers.
+    tasks can be any iterable; serial builds render each task as soon as it
+    is produced. on_result, if given, is called with every PageResult as
+    it comes in. Returns one PageResult per task, in task order.
+    """
+    jobs = resolve_jobs(jobs)
+    runner = partial(run_task, render)
+    start = time.perf_counter()
+
+    if jobs > 1:
+        # The pool needs every task up front to size its chunks
+        tasks = list(tasks)
+    results = []
+    if jobs == 1 or len(tasks) <= 1:
+        for task in tasks:
+            results.append(runner(task))
+            if on_result is not None:
+                on_result(results[-1])
+    else:
+        # Deferred: importing the process pool pulls in multiprocessing,
+        # which serial builds never use
+        from concurrent.futures import ProcessPoolExecutor
+
+        jobs = min(jobs, len(tasks))
+        tracer = profiler.active()
+        pool_options = {}
+        if tracer is not None:
+            pool_options = {
+                "initializer": profiler.start_worker,
+                "initargs": (tracer.track_memory,),
+            }
+        with ProcessPoolExecutor(max_workers=jobs, **pool_options) as pool:
+            chunksize = chunk_size(len(tasks), jobs)
+            for result in pool.map(runner, tasks, chunksize=chunksize):
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+        if tracer is not None:
+            for result in results:
+                tracer.events.extend(result.events or ())
+
+    report_scaling(results, time.perf_counter() - start, jobs)
+    return results
+
+
+def report_scaling(results, wall, jobs):
+    """
+    Log how much of the available parallelism the run actually used.
+    """
+    if not results:
+        return
+    busy = sum(result.elapsed for result in results)
+    parallelism = busy / wall if wall > 0 else 0.0
+    logging.info(
+        f"Rendered {len(results)} pages in {wall:.3f}s using {jobs} job(s): "
+        f"{busy:.3f}s of page work, {parallelism:.2f}x parallelism, "
+        f"{parallelism / jobs:.0%} efficiency"
+    )
+
+
+def pipeline_pages(read, render, write, tasks, prefetch=16, writers=4, on_result=None):
+    """
+    Run write(task, output) for output, value = render(task, read(task)) for
+    every task, overlapping disk I/O with rendering.
+
+    A reader thread prefetches inputs into a queue of at most prefetch
+    tasks, render runs in the calling thread, and a pool of writers threads
+    writes the outputs. Rendering waits while prefetch outputs are waiting
+    to be written, so no more than 2 * prefetch pages are held in memory,
+    however slow the disk. Errors are captured per task as in
+    render_pages. tasks can be any iterable, for example a generator still
+    discovering pages: it is consumed by the reader thread, and an error it
+    raises is raised here once the tasks before it are done. on_result, if
+    given, is called with every PageResult once it is done, from the
+    writer threads for pages that were written. Returns one PageResult per
+    task, in task order, with the value render returned.
+    """
+    if prefetch < 1 or writers < 1:
+        raise ValueError(
+            f"Invalid pipeline size: {prefetch} prefetch, {writers} writers"
+        )
+    start = time.perf_counter()
+    inputs = queue.Queue(maxsize=prefetch)
+    busy = {"read": 0.0, "render": 0.0, "write": 0.0}
+    lock = threading.Lock()
+    results = {}
+    reader_error = []
+
+    def timed(stage, func, *args):
+        stage_start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            with lock:
+                busy[stage] += time.perf_counter() - stage_start
+
+    def reader():
+        try:
+            for index, task in enumerate(tasks):
+                read_start = time.perf_counter()
+                data = error = None
+                try:
+                    data = timed("read", read, task)
+                except Exception as e:
+                    error = describe_error(e)
+                elapsed = time.perf_counter() - read_start
+                inputs.put((index, task, data, error, {"read": elapsed}))
+        except BaseException as e:
+            reader_error.append(e)
+        finally:
+            inputs.put(None)
+
+    def write_output(index, task, output, value, stages):
+        write_start = time.perf_counter()
+        error = None
+        try:
+            timed("write", write, task, output)
+        except Exception as e:
+            error = describe_error(e)
+        stages["write"] = time.perf_counter() - write_start
+        elapsed = sum(stages.values())
+        result = PageResult(task, elapsed, error, value=value, stages=stages)
+        results[index] = result
+        if on_result is not None:
+            on_result(result)
+
+    threading.Thread(target=reader, daemon=True).start()
+    pending = threading.BoundedSemaphore(prefetch)
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        while (item := inputs.get()) is not None:
+            index, task, data, error, stages = item
+            # Backpressure: wait for a writer before making another output
+            pending.acquire()
+            render_start = time.perf_counter()
+            if error is None:
+                try:
+                    output, value = timed("render", render, task, data)
+                except Exception as e:
+                    error = describe_error(e)
+            stages["render"] = time.perf_counter() - render_start
+            if error is not None:
+                pending.release()
+                elapsed = sum(stages.values())
+                results[index] = PageResult(task, elapsed, error, stages=stages)
+                if on_result is not None:
+                    on_result(results[index])
+                continue
+            future = pool.submit(write_output, index, task, output, value, stages)
+            future.add_done_callback(lambda _: pending.release())
+
+    if reader_error:
+        raise reader_error[0]
+    wall = time.perf_counter() - start
+    if results:
+        logging.info(
+            f"Pipelined {len(results)} pages in {wall:.3f}s: "
+            + ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in busy.items())
+            + f", {sum(busy.values()) / wall:.2f}x overlap"
+        )
+    return [results[index] for index in range(len(results))]
@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# The tracer of this process, or None when profiling is off. span() checks
+# it first so that instrumented code costs next to nothing in normal builds.
+_tracer = None
+_NO_SPAN = nullcontext()
+
+
+class Tracer:
+    """
+    Collects spans as Chrome trace "complete" events.
+    """
+
+    def __init__(self, track_memory=False, worker=False):
+        self.events = []
+        self.track_memory = track_memory
+        self.worker = worker
+        self.page = None
+
+    @contextmanager
+    def span(self, name, cat="stage", memory=False, **args):
+        """
+        Record a span. Spans with cat="page" set the page that the stage
+        spans recorded inside them are attributed to.
+        """
+        memory = memory and self.track_memory
+        if cat == "page":
+            self.page = args.get("path")
+        elif self.page is not None:
+            args["page"] = self.page
+        if memory:
+            # Deferred, like in start(): only --profile tracks memory
+            import tracemalloc
+
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            if memory:
+                args["peak_bytes"] = tracemalloc.get_traced_memory()[1] - base
+            if cat == "page":
+                self.page = None
+            self.events.append(
+                {
+                    "name": name,
+                    "cat": cat,
+                    "ph": "X",
+                    "ts": start / 1000,
+                    "dur": (end - start) / 1000,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": args,
+                }
+            )
+
+    def take_events(self):
+        events, self.events = self.events, []
+        return events
+
+
+def start(track_memory=False, worker=False):
+    """
+    Turn profiling on for this process.
+    """
+    global _tracer
+    _tracer = Tracer(track_memory, worker)
+    if track_memory:
+        # Deferred: a build that is not profiled should not pay for it
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+    return _tracer
+
+
+def start_worker(track_memory):
+    """
+    Process pool initializer: profile the worker with a tracer of its own.
+    """
+    start(track_memory, worker=True)
+
+
+def stop():
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None and tracer.track_memory:
+        import tracemalloc
+
+        tracemalloc.stop()
+    return tracer
+
+
+def active():
+    return _tracer
+
+
+def span(name, cat="stage", memory=False, **args):
+    """
+    Record a span in the active tracer; does nothing when profiling is off.
+    memory=True also records the peak traced memory during the span.
+    """
+    if _tracer is None:
+        return _NO_SPAN
+    return _tracer.span(name, cat, memory, **args)
+
+
+def write_trace(tracer, path):
+    """
+    Write the collected spans as a Chrome / Perfetto trace JSON file.
+    """
+    pids = sorted({event["pid"] for event in tracer.events})
+    metadata = [
+        {
+            "name": "process_name",
+            "ph": "M",
+            "pid": pid,
+            "args": {"name": "main" if pid == os.getpid() else f"worker {pid}"},
+        }
+        for pid in pids
+    ]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps({"traceEvents": metadata + tracer.events}), encoding="utf-8"
+    )
+
+
+def slowest_pages(tracer, top=10):
+    """
+    Return the top slowest page spans, each with its per-stage durations
+    in milliseconds.
+    """
+    stages = {}
+    for event in tracer.events:
+        page = event["args"].get("page")
+        if event["cat"] == "stage" and page is not None:
+            page_stages = stages.setdefault(page, {})
+            page_stages[event["name"]] = (
+                page_stages.get(event["name"], 0) + event["dur"] / 1000
+            )
+
+    pages = sorted(
+        (event for event in tracer.events if event["cat"] == "page"),
+        key=lambda event: event["dur"],
+        reverse=True,
+    )
+    return [
+        {
+            "path": page["args"]["path"],
+            "ms": page["dur"] / 1000,
+            "peak_bytes": page["args"].get("peak_bytes"),
+            "stages": stages.get(page["args"]["path"], {}),
+        }
+        for page in pages[:top]
+    ]
+
+
+def log_report(tracer, top=10):
+    totals = {}
+    for event in tracer.events:
+        if event["cat"] == "stage":
+            totals[event["name"]] = totals.get(event["name"], 0) + event["dur"] / 1000
+    logging.info(
+        "Time per stage: "
+        + ", ".join(f"{name} {ms:.1f} ms" for name, ms in sorted(totals.items()))
+    )
+    for rank, page in enumerate(slowest_pages(tracer, top), start=1):
+        stages = ", ".join(f"{name} {ms:.2f}" for name, ms in page["stages"].items())
+        peak = page["peak_bytes"]
+        memory = f", peak {peak / 1024:.0f} KiB" if peak is not None else ""
+        logging.info(f"#{rank} {page['path']}: {page['ms']:.2f} ms{memory} ({stages})")
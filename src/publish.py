@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Publish builds of docs/ atomically and roll them back.
+
+    uv run python3 src/main.py --atomic-publish
+    uv run python3 src/publish.py list
+    uv run python3 src/publish.py rollback [GENERATION]
+"""
+
+import argparse
+import errno
+import logging
+import os
+import shutil
+import sys
+import threading
+from pathlib import Path
+
+from fsutil import write_atomic
+
+DEFAULT_KEEP = 3
+
+STAGING_SUFFIX = ".staging"
+
+# Holds the name of the generation at output
+PUBLISHED_FILE = "published"
+
+# From <linux/fs.h> and <fcntl.h>
+RENAME_EXCHANGE = 2
+AT_FDCWD = -100
+
+
+class Generations:
+    """
+    The builds of output: the published one is output itself, a real
+    directory, and older ones are kept in numbered directories next to it
+    (docs, .docs.generations/000006...).
+
+    A build writes into a staging directory that starts as a hard-linked
+    copy of output, so an incremental build only replaces what changed and
+    never touches the files being served. publish() then exchanges staging
+    and output with one rename where the platform can (see exchange), which
+    readers see happen all at once; elsewhere output is missing for the
+    moment between two renames. The last keep generations stay on disk for
+    rollback(); older ones are removed by clean() in a background thread.
+
+    A build that fails is not published. Its staging directory is kept,
+    and the next build carries on from it, as the build manifest expects.
+    """
+
+    def __init__(self, output, keep=DEFAULT_KEEP):
+        self.output = output
+        self.directory = output.parent / f".{output.name}.generations"
+        self.keep = max(keep, 1)
+
+    def names(self):
+        """
+        Return the names of the generations, the published one included,
+        oldest first.
+        """
+        if not self.directory.exists():
+            return []
+        names = [path.name for path in self.directory.iterdir() if path.name.isdigit()]
+        current = self.current()
+        if current is not None:
+            names.append(current)
+        return sorted(names)
+
+    def current(self):
+        """
+        Return the name of the published generation, None when output was
+        not published by publish() or rollback().
+        """
+        try:
+            return (self.directory / PUBLISHED_FILE).read_text().strip()
+        except FileNotFoundError:
+            return None
+
+    def staging(self):
+        """
+        Return the staging directory left by a failed build, if any.
+        """
+        if not self.directory.exists():
+            return None
+        for path in sorted(self.directory.glob(f"*{STAGING_SUFFIX}")):
+            return path
+        return None
+
+    def stage(self, clean=False):
+        """
+        Return a staging directory to build into: the one a failed build
+        left, or a new one holding hard links to the files of output. With
+        clean, the staging directory starts empty instead.
+        """
+        staging = self.staging()
+        if staging is not None and clean:
+            shutil.rmtree(staging)
+            staging = None
+        if staging is not None:
+            logging.info(f"Resuming the unpublished build in {staging}")
+            return staging
+
+        names = self.names()
+        number = int(names[-1]) + 1 if names else 1
+        adopt = self.output.is_dir() and not self.output.is_symlink()
+        if self.current() is None and adopt and names:
+            # Leave the number before ours for publish() to keep output under
+            number += 1
+        staging = self.directory / f"{number:06d}{STAGING_SUFFIX}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if clean or not self.output.is_dir():
+            staging.mkdir()
+        else:
+            # Replaced outputs are written to a new file and renamed over
+            # the link, so the published build keeps its files
+            shutil.copytree(self.output, staging, symlinks=True, copy_function=os.link)
+        logging.info(f"Building into {staging}")
+        return staging
+
+    def publish(self, staging):
+        """
+        Make staging the published generation, keeping what output held as
+        the generation it was. Returns the name of the new generation.
+        """
+        name = staging.name.removesuffix(STAGING_SUFFIX)
+        # Output built in place, by a plain build, is the generation before
+        old_name = self.current() or f"{int(name) - 1:06d}"
+        self.swap(staging, name, old_name)
+        logging.info(f"Published generation {name} as {self.output}")
+        return name
+
+    def rollback(self, name=None):
+        """
+        Publish generation name again, by default the one before the
+        published generation. Returns its name.
+        """
+        names = self.names()
+        current = self.current()
+        if name is None:
+            older = [other for other in names if current is None or other < current]
+            if not older:
+                raise ValueError("No older generation to roll back to")
+            name = older[-1]
+        elif name not in names:
+            raise ValueError(f"No generation {name} in {self.directory}")
+        if name != current:
+            old_name = current or f"{int(names[-1]) + 1:06d}"
+            self.swap(self.directory / name, name, old_name)
+        logging.info(f"Rolled {self.output} back to generation {name}")
+        return name
+
+    def swap(self, path, name, old_name):
+        """
+        Move the build in path to output as generation name, and what
+        output held to the generation old_name.
+        """
+        old = self.directory / old_name
+        if self.output.is_symlink():
+            # Published by older versions, which linked output to a generation
+            self.output.unlink()
+        if not self.output.exists():
+            path.rename(self.output)
+        elif exchange(path, self.output):
+            path.rename(old)
+        else:
+            os.replace(self.output, old)
+            os.replace(path, self.output)
+        write_atomic(self.directory / PUBLISHED_FILE, name)
+
+    def stale(self):
+        """
+        Return the generations past the newest keep, except the published one.
+        """
+        current = self.current()
+        return [name for name in self.names()[: -self.keep] if name != current]
+
+    def clean(self):
+        """
+        Remove the stale generations in a background thread, which is
+        returned. The process does not exit before it is done.
+        """
+        paths = [self.directory / name for name in self.stale()]
+
+        def remove():
+            for path in paths:
+                shutil.rmtree(path, ignore_errors=True)
+            if paths:
+                logging.info(f"Removed {len(paths)} old generations of {self.output}")
+
+        thread = threading.Thread(target=remove, name="clean-generations")
+        thread.start()
+        return thread
+
+
+def exchange(first, second):
+    """
+    Swap the directories first and second with renameat2(RENAME_EXCHANGE).
+    Returns False, having changed nothing, where that is not available:
+    other systems than Linux, or old kernels and file systems.
+    """
+    # Deferred: only publishing needs it
+    import ctypes
+
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (AttributeError, OSError, TypeError):
+        return False
+    result = renameat2(
+        AT_FDCWD, os.fsencode(first), AT_FDCWD, os.fsencode(second), RENAME_EXCHANGE
+    )
+    if result == 0:
+        return True
+    error = ctypes.get_errno()
+    if error in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+        return False
+    raise OSError(error, os.strerror(error), os.fspath(first), None, os.fspath(second))
+
+
+def list_generations(args):
+    generations = Generations(args.output)
+    current = generations.current()
+    for name in generations.names():
+        print(f"{'*' if name == current else ' '} {name}")
+    staging = generations.staging()
+    if staging is not None:
+        print(f"  {staging.name} (unpublished)")
+
+
+def rollback(args):
+    try:
+        Generations(args.output).rollback(args.generation)
+    except ValueError as e:
+        sys.exit(str(e))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("-o", "--output", type=Path, default=Path("docs"))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="show the kept generations")
+    list_parser.set_defaults(func=list_generations)
+
+    rollback_parser = commands.add_parser(
+        "rollback", help="publish an older generation again"
+    )
+    rollback_parser.add_argument("generation", nargs="?")
+    rollback_parser.set_defaults(func=rollback)
+
+    return parser.parse_args(argv)
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)-8s [%(name)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    args = parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# jinja2 is imported where it is used: it is the heaviest import of the
+# generator, and an incremental build with nothing to render never needs it.
+
+# Stands in for {{ Content }} so the page body can be streamed into the
+# template output instead of being passed to Jinja as one big string.
+CONTENT_MARKER = "\x00ssg-content\x00"
+
+# One context per template per process. Worker processes of a parallel build
+# each fill their own entry on the first page they render.
+_contexts = {}
+
+
+class RenderContext:
+    """
+    Template state shared by every page of a build: the Jinja environment
+    and the compiled template.
+
+    With compiled_dir, the template is imported from the Python modules
+    compile_template wrote there instead of being compiled from source.
+    """
+
+    def __init__(self, template_path, compiled_dir=None):
+        from jinja2 import Environment, FileSystemLoader, ModuleLoader
+
+        if compiled_dir is not None:
+            loader = ModuleLoader(compiled_dir.resolve())
+        else:
+            loader = FileSystemLoader(template_path.parent)
+        self.template_path = template_path
+        self.env = Environment(loader=loader)
+        self.template = self.env.get_template(template_path.name)
+
+    def generate(self, **variables):
+        """
+        Yield the rendered page in chunks, as Jinja produces them.
+        """
+        return self.template.generate(**variables)
+
+    def stream(self, content, **variables):
+        """
+        Yield the rendered page in chunks, with the chunks of content (an
+        HTMLNode) spliced in wherever the template outputs {{ Content }}.
+        """
+        for chunk in self.template.generate(Content=CONTENT_MARKER, **variables):
+            if CONTENT_MARKER not in chunk:
+                yield chunk
+                continue
+            for i, part in enumerate(chunk.split(CONTENT_MARKER)):
+                if i:
+                    yield from content.iter_html()
+                if part:
+                    yield part
+
+
+def get_render_context(template_path, compiled_dir=None):
+    """
+    Return the render context for template_path, creating it on first use.
+    The context is rebuilt when the template file changes on disk.
+    """
+    stat = template_path.stat()
+    key = (template_path.resolve(), compiled_dir)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _contexts.get(key)
+    if cached is None or cached[0] != version:
+        cached = (version, RenderContext(template_path, compiled_dir))
+        _contexts[key] = cached
+    return cached[1]
+
+
+def template_dependencies(template_path):
+    """
+    Return ({name: path} of the template and every template it extends,
+    includes or imports, the set of variables they use, and the set of
+    urls they pass to url() as constants).
+    Templates included under a name computed at render time are not found.
+    """
+    from jinja2 import Environment, FileSystemLoader, meta, nodes
+
+    env = Environment(loader=FileSystemLoader(template_path.parent))
+    templates = {}
+    variables = set()
+    urls = set()
+    pending = [template_path.name]
+    while pending:
+        name = pending.pop()
+        if name in templates:
+            continue
+        source, filename, _ = env.loader.get_source(env, name)
+        ast = env.parse(source)
+        templates[name] = Path(filename)
+        variables |= meta.find_undeclared_variables(ast)
+        for call in ast.find_all(nodes.Call):
+            if (
+                isinstance(call.node, nodes.Name)
+                and call.node.name == "url"
+                and call.args
+                and isinstance(call.args[0], nodes.Const)
+            ):
+                urls.add(call.args[0].value)
+        pending.extend(
+            ref for ref in meta.find_referenced_templates(ast) if ref is not None
+        )
+    return templates, variables, urls
+
+
+def jinja2_version():
+    """
+    Return the version of the installed jinja2, read from its source when
+    it is not imported yet, so that looking it up does not import it.
+    """
+    if "jinja2" in sys.modules:
+        return sys.modules["jinja2"].__version__
+    spec = importlib.util.find_spec("jinja2")
+    if spec is None or spec.origin is None:
+        return None
+    with open(spec.origin, encoding="utf-8") as f:
+        match = re.search(r"^__version__ = [\"']([^\"']+)", f.read(), re.MULTILINE)
+    return match.group(1) if match else None
+
+
+def compile_template(template_path, digests, cache_dir):
+    """
+    Compile template_path and the templates it uses ({name: digest}, as
+    found by template_dependencies) into importable Python modules, and
+    return the directory holding them for RenderContext.
+
+    Each set of template versions, jinja2 version and Python version (the
+    modules hold its bytecode) gets its own directory under cache_dir, so
+    compiled modules are never stale; the directories of older versions
+    are removed. Nothing is compiled, and jinja2 is not imported, when the
+    directory already exists.
+    """
+    python = [sys.implementation.name, *sys.version_info[:3]]
+    key = json.dumps([sorted(digests.items()), jinja2_version(), python]).encode()
+    target = cache_dir / hashlib.sha256(key).hexdigest()[:16]
+    if target.is_dir():
+        return target
+
+    from jinja2 import Environment, FileSystemLoader
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    env = Environment(loader=FileSystemLoader(template_path.parent))
+    tmp_dir = Path(tempfile.mkdtemp(dir=cache_dir, prefix=".tmp-"))
+    try:
+        env.compile_templates(
+            tmp_dir, zip=None, filter_func=digests.__contains__, ignore_errors=False
+        )
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    try:
+        os.rename(tmp_dir, target)
+    except OSError:
+        # Another process compiled the same templates first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not target.is_dir():
+            raise
+
+    for stale in cache_dir.iterdir():
+        if stale != target and not stale.name.startswith(".tmp-"):
+            if stale.is_dir():
+                shutil.rmtree(stale, ignore_errors=True)
+            else:
+                stale.unlink(missing_ok=True)
+    return target
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import logging
+import re
+from itertools import chain, count
+
+from fsutil import write_atomic
+from urls import url_for
+
+SEARCH_FORMAT = 1
+
+# Tokens are partitioned into shards by their first PREFIX_LENGTH characters,
+# so a query only loads the shards of the prefixes of its words
+PREFIX_LENGTH = 2
+
+# How much an occurrence of a token counts, by where it occurs
+TITLE_WEIGHT = 10
+BLOCK_WEIGHTS = {
+    "h1": 8,
+    "h2": 6,
+    "h3": 4,
+    "h4": 3,
+    "h5": 3,
+    "h6": 3,
+    "ul": 2,
+    "ol": 2,
+    "p": 1,
+    "blockquote": 1,
+    "pre": 1,
+}
+
+TOKEN = re.compile(r"\w+")
+
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or "
+    "that the this to was were will with".split()
+)
+
+
+def tokenize(text):
+    """
+    Return the searchable tokens of text: lowercased words of at least two
+    characters, without stop words.
+    """
+    return [
+        token
+        for token in TOKEN.findall(text.lower())
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+
+def add_terms(text, weight, terms):
+    for token in tokenize(text):
+        terms[token] = terms.get(token, 0) + weight
+
+
+def node_text(node):
+    """
+    Return the text of the leaves of node, skipping images.
+    """
+    parts = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.children:
+            stack.extend(reversed(current.children))
+        elif current.value and current.tag != "img":
+            parts.append(current.value)
+    return " ".join(parts)
+
+
+def index_block(node, terms):
+    """
+    Add the tokens of a block node, as built by block_to_html_node, to
+    terms ({token: weight}), weighted by the kind of block. Returns node.
+    """
+    if terms is not None:
+        add_terms(node_text(node), BLOCK_WEIGHTS.get(node.tag, 1), terms)
+    return node
+
+
+def index_page(title, html_node, terms=None):
+    """
+    Return the terms of a page: the tokens of its title and of every block
+    of html_node (the div built by markdown_to_html_node). Blocks already
+    indexed while the page was parsed are passed in terms instead.
+    """
+    if terms is None:
+        terms = {}
+        for block in html_node.children:
+            index_block(block, terms)
+    add_terms(title, TITLE_WEIGHT, terms)
+    return terms
+
+
+def page_url(output_key):
+    """
+    Return the site-absolute url of the output at output_key.
+    """
+    if output_key == "index.html":
+        return "/"
+    if output_key.endswith("/index.html"):
+        return "/" + output_key.removesuffix("index.html")
+    return "/" + output_key
+
+
+class SearchIndex:
+    """
+    Inverted index of the site, kept up to date page by page.
+
+    The terms of every page are remembered in state_path with the page
+    title, url and a stable document id, so only pages that are rebuilt are
+    indexed again. write() turns them into the files a browser searches:
+
+        search/index.json   {"prefix_length", "pages": [[url, title]...],
+                             "shards": [prefix...]}
+        search/<prefix>.json  {token: [[document id, weight]...]}
+
+    with postings sorted by decreasing weight. Only shards whose content
+    changed are rewritten.
+    """
+
+    def __init__(self, state_path=None, pages=None, shards=None):
+        self.state_path = state_path
+        self.pages = pages if pages is not None else {}
+        self.shards = shards if shards is not None else {}
+
+    @classmethod
+    def load(cls, state_path):
+        if state_path is None or not state_path.exists():
+            return cls(state_path)
+        try:
+            data = json.loads(state_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable search index {state_path}: {e}")
+            return cls(state_path)
+        if data.get("format") != SEARCH_FORMAT:
+            return cls(state_path)
+        return cls(state_path, data["pages"], data["shards"])
+
+    def update(self, source_key, output_key, title, terms):
+        entry = self.pages.get(source_key)
+        # New pages get their id in write(), in a deterministic order
+        doc_id = entry["id"] if entry is not None else None
+        self.pages[source_key] = {
+            "id": doc_id,
+            "url": page_url(output_key),
+            "title": title,
+            "terms": terms,
+        }
+
+    def forget(self, source_key):
+        self.pages.pop(source_key, None)
+
+    def prune(self, live_sources):
+        for source_key in set(self.pages) - set(live_sources):
+            del self.pages[source_key]
+
+    def assign_ids(self):
+        """
+        Give every new page a document id, reusing the ids of removed pages
+        first.
+        """
+        used = {entry["id"] for entry in self.pages.values()} - {None}
+        top = max(used, default=-1) + 1
+        free = chain((i for i in range(top) if i not in used), count(top))
+        for source_key in sorted(self.pages):
+            if self.pages[source_key]["id"] is None:
+                self.pages[source_key]["id"] = next(free)
+
+    def postings(self):
+        """
+        Return {prefix: {token: [[document id, weight]...]}}.
+        """
+        shards = {}
+        for entry in self.pages.values():
+            doc_id = entry["id"]
+            for token, weight in entry["terms"].items():
+                shard = shards.setdefault(token[:PREFIX_LENGTH], {})
+                shard.setdefault(token, []).append([doc_id, weight])
+        for shard in shards.values():
+            for postings in shard.values():
+                postings.sort(key=lambda posting: (-posting[1], posting[0]))
+        return shards
+
+    def write(self, destination, basepath="/"):
+        """
+        Write the search files into destination/search and save the state.
+        Returns the number of shards written and removed.
+        """
+        self.assign_ids()
+        directory = destination / "search"
+        directory.mkdir(parents=True, exist_ok=True)
+        shards = {}
+        written = 0
+        for prefix, postings in sorted(self.postings().items()):
+            data = json.dumps(postings, sort_keys=True, separators=(",", ":"))
+            digest = hashlib.sha256(data.encode()).hexdigest()
+            shards[prefix] = digest
+            path = directory / f"{prefix}.json"
+            if self.shards.get(prefix) != digest or not path.exists():
+                write_atomic(path, data)
+                written += 1
+
+        removed = 0
+        for prefix in self.shards.keys() - shards.keys():
+            (directory / f"{prefix}.json").unlink(missing_ok=True)
+            removed += 1
+        self.shards = shards
+
+        pages = [None] * (max((e["id"] for e in self.pages.values()), default=-1) + 1)
+        for entry in self.pages.values():
+            pages[entry["id"]] = [url_for(entry["url"], basepath), entry["title"]]
+        index = {
+            "prefix_length": PREFIX_LENGTH,
+            "pages": pages,
+            "shards": sorted(shards),
+        }
+        index_path = directory / "index.json"
+        data = json.dumps(index, separators=(",", ":"))
+        if not index_path.exists() or index_path.read_text(encoding="utf-8") != data:
+            write_atomic(index_path, data)
+        self.save()
+        return written, removed
+
+    def save(self):
+        if self.state_path is None:
+            return
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"format": SEARCH_FORMAT, "pages": self.pages, "shards": self.shards}
+        write_atomic(self.state_path, json.dumps(data, sort_keys=True))
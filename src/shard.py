@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Split a build across machines and merge the results.
+
+    uv run python3 src/main.py --shard 1/4          (on each of 4 runners)
+    uv run python3 src/shard.py plan 4
+    uv run python3 src/shard.py merge shard1/ shard2/ shard3/ shard4/ -o docs
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import sys
+from pathlib import Path
+
+from assets import copy_file, gather_files
+from compress import VARIANT_SUFFIXES
+from fsutil import write_atomic
+from manifest import file_digest
+
+SHARD_MANIFEST = "shard-manifest.json"
+
+SHARD_FORMAT = 1
+
+
+def parse_shard(value):
+    """
+    Parse "i/N" (1 <= i <= N) into (i, N); raises ValueError otherwise.
+    """
+    index, sep, count = value.partition("/")
+    if not sep or not index.isdigit() or not count.isdigit():
+        raise ValueError(f"Invalid shard {value!r}, expected i/N")
+    index, count = int(index), int(count)
+    if not 1 <= index <= count:
+        raise ValueError(f"Invalid shard {value!r}, i must be between 1 and N")
+    return index, count
+
+
+def stable_hash(source_key):
+    return int.from_bytes(hashlib.sha256(source_key.encode()).digest()[:8], "big")
+
+
+def assign_shards(sizes, count, balance=False):
+    """
+    Return {source key: shard index (1 to count)} for sizes, a dict of
+    {source key: file size}.
+
+    Pages go to the shard given by a hash of their path, so a page stays in
+    its shard however the rest of the site changes. With balance, pages are
+    instead handed out largest first to the shard with the fewest bytes so
+    far, which evens out the shards at the cost of moving pages between
+    them as the site changes. Either way, every runner computes the same
+    assignment from the same content tree.
+    """
+    if not balance:
+        return {key: stable_hash(key) % count + 1 for key in sizes}
+    totals = [0] * count
+    shards = {}
+    for key in sorted(sizes, key=lambda key: (-sizes[key], key)):
+        index = min(range(count), key=lambda i: (totals[i], i))
+        totals[index] += sizes[key]
+        shards[key] = index + 1
+    return shards
+
+
+def select_shard(markdown_files, source, shard, balance=False):
+    """
+    Return the markdown files under source that belong to shard, (i, N).
+    """
+    index, count = shard
+    paths = {path.relative_to(source).as_posix(): path for path in markdown_files}
+    sizes = {key: path.stat().st_size if balance else 0 for key, path in paths.items()}
+    shards = assign_shards(sizes, count, balance)
+    return [path for key, path in paths.items() if shards[key] == index]
+
+
+def write_shard_manifest(destination, shard, balance, pages):
+    """
+    Record in destination which shard it holds and the outputs of its pages
+    ({source key: output key}), for merge_shards.
+    """
+    data = {
+        "format": SHARD_FORMAT,
+        "shard": list(shard),
+        "balance": balance,
+        "pages": pages,
+    }
+    write_atomic(
+        destination / SHARD_MANIFEST, json.dumps(data, indent=1, sort_keys=True)
+    )
+
+
+def load_shard_manifest(directory):
+    path = directory / SHARD_MANIFEST
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        raise ValueError(f"{directory} is not a shard output: {e}") from e
+    if data.get("format") != SHARD_FORMAT:
+        raise ValueError(f"{path} has an unsupported format")
+    return data
+
+
+def page_of(rel):
+    """
+    Return the output a file belongs to: itself, or for a compressed
+    variant the file it was compressed from.
+    """
+    for suffix in VARIANT_SUFFIXES:
+        if rel.endswith(suffix):
+            return rel.removesuffix(suffix)
+    return rel
+
+
+def check_shards(directories, output):
+    """
+    Check that directories hold every shard of one build exactly once and
+    that no two of them disagree about a file. output is where they are
+    to be merged. Returns ({rel: directory} of the files to merge, number
+    of pages, [problems]).
+    """
+    problems = []
+    if output.resolve() in {directory.resolve() for directory in directories}:
+        problems.append(f"Cannot merge {output} into itself")
+    manifests = {directory: load_shard_manifest(directory) for directory in directories}
+
+    counts = {data["shard"][1] for data in manifests.values()}
+    if len(counts) > 1:
+        problems.append(f"Shards of builds split {sorted(counts)} ways")
+    if len({data["balance"] for data in manifests.values()}) > 1:
+        problems.append("Shards split with and without --shard-balance")
+    count = max(counts)
+    seen = {}
+    for directory, data in manifests.items():
+        seen.setdefault(data["shard"][0], []).append(directory)
+    for index in range(1, count + 1):
+        holders = seen.get(index, [])
+        if not holders:
+            problems.append(f"Shard {index}/{count} is missing")
+        elif len(holders) > 1:
+            problems.append(
+                f"Shard {index}/{count} given more than once: "
+                + ", ".join(str(directory) for directory in holders)
+            )
+
+    # Page outputs belong to the shard that built them
+    owners = {}
+    for directory, data in manifests.items():
+        for output_key in data["pages"].values():
+            if output_key in owners:
+                problems.append(
+                    f"{output_key} is built by {owners[output_key]} and {directory}"
+                )
+            owners[output_key] = directory
+
+    # Every other file (static assets...) must be the same in every shard
+    files = {}
+    for directory in directories:
+        for rel, stat in gather_files(directory).items():
+            if page_of(rel) == SHARD_MANIFEST:
+                continue
+            owner = owners.get(page_of(rel))
+            if owner is not None:
+                if owner != directory:
+                    problems.append(
+                        f"{rel} is in {directory} but its page is built by {owner}"
+                    )
+                else:
+                    files[rel] = directory
+                continue
+            other = files.get(rel)
+            if other is None:
+                files[rel] = directory
+            elif not same_file(other / rel, directory / rel, stat):
+                problems.append(f"{rel} differs between {other} and {directory}")
+    return files, len(owners), problems
+
+
+def same_file(path, other, other_stat):
+    if path.stat().st_size != other_stat.st_size:
+        return False
+    return file_digest(path) == file_digest(other)
+
+
+def merge_shards(directories, output):
+    """
+    Combine the outputs of the shard builds in directories into output.
+    Nothing is written if the shards are incomplete or collide; files in
+    output that no shard has are removed. Raises ValueError on problems.
+    """
+    files, pages, problems = check_shards(directories, output)
+    if problems:
+        for problem in problems:
+            logging.error(problem)
+        raise ValueError(f"Cannot merge {len(directories)} shards: {problems[0]}")
+
+    output.mkdir(parents=True, exist_ok=True)
+    for parent in sorted({(output / rel).parent for rel in files}):
+        parent.mkdir(parents=True, exist_ok=True)
+    for rel, directory in sorted(files.items()):
+        copy_file(directory / rel, output / rel)
+    removed = 0
+    for rel in gather_files(output).keys() - files.keys():
+        (output / rel).unlink()
+        removed += 1
+    logging.info(
+        f"Merged {len(directories)} shards into {output}: {len(files)} files "
+        f"({pages} pages), {removed} stale files removed"
+    )
+    return len(files), removed
+
+
+def plan(args):
+    from main import CONTENT_DIR, gather_markdown_files
+
+    sizes = {
+        path.relative_to(CONTENT_DIR).as_posix(): path.stat().st_size
+        for path in gather_markdown_files(CONTENT_DIR)
+    }
+    shards = assign_shards(sizes, args.count, args.balance)
+    for index in range(1, args.count + 1):
+        keys = [key for key, shard in shards.items() if shard == index]
+        total = sum(sizes[key] for key in keys)
+        print(f"{index}/{args.count}: {len(keys)} pages, {total / 1024:.1f} KiB")
+
+
+def merge(args):
+    try:
+        merge_shards(args.directories, args.output)
+    except ValueError as e:
+        sys.exit(str(e))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan_parser = commands.add_parser("plan", help="show how pages are split")
+    plan_parser.add_argument("count", type=int, metavar="N")
+    plan_parser.add_argument("--balance", action="store_true")
+    plan_parser.set_defaults(func=plan)
+
+    merge_parser = commands.add_parser("merge", help="combine shard outputs")
+    merge_parser.add_argument("directories", type=Path, nargs="+", metavar="SHARD")
+    merge_parser.add_argument("-o", "--output", type=Path, default=Path("docs"))
+    merge_parser.set_defaults(func=merge)
+
+    return parser.parse_args(argv)
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)-8s [%(name)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    args = parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
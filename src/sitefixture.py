@@ -0,0 +1,50 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from main import generate_pages_recursive
+
+TEMPLATE = Path(__file__).resolve().parent.parent / "template.html"
+
+
+class SiteTestCase(unittest.TestCase):
+    """
+    Base of the tests that build a small site: setUp writes page(i) to
+    content/post{i}/index.md for each of the first pages pages, in a
+    temporary directory at self.root.
+    """
+
+    pages = 3
+
+    def page(self, i):
+        return f"# Post {i}\n\nSome words\n"
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.content = self.root / "content"
+        for i in range(self.pages):
+            path = self.content / f"post{i}" / "index.md"
+            path.parent.mkdir(parents=True)
+            path.write_text(self.page(i))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def generate(self, destination, **kwargs):
+        """
+        Build the site into destination, made if missing. Returns the log.
+        """
+        destination.mkdir(exist_ok=True)
+        with self.assertLogs(level="INFO") as logs:
+            generate_pages_recursive(self.content, TEMPLATE, destination, **kwargs)
+        return "\n".join(logs.output)
+
+    def read_pages(self, destination):
+        """
+        Return {path relative to destination: HTML} of the built pages.
+        """
+        return {
+            path.relative_to(destination): path.read_text()
+            for path in destination.rglob("*.html")
+        }
@@ -0,0 +1,146 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from assets import (
+    ASSET_MANIFEST,
+    copy_file,
+    fingerprint_name,
+    load_asset_manifest,
+    sync_static_assets,
+)
+from manifest import file_digest
+
+
+class TestSyncStaticAssets(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.static = root / "static"
+        self.docs = root / "docs"
+        self.state = root / "cache" / "assets.json"
+        (self.static / "images").mkdir(parents=True)
+        self.docs.mkdir()
+        (self.static / "index.css").write_text("body {}")
+        (self.static / "images" / "a.png").write_bytes(b"\x89PNG" * 100)
+        (self.docs / "index.html").write_text("<html></html>")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def sync(self, **kwargs):
+        with self.assertLogs(level="INFO"):
+            return sync_static_assets(
+                self.static, self.docs, state_path=self.state, **kwargs
+            )
+
+    def test_first_sync_copies_everything(self):
+        stats = self.sync()
+        self.assertEqual((stats.copied, stats.skipped, stats.removed), (2, 0, 0))
+        self.assertEqual(stats.copied_bytes, 407)
+        self.assertEqual(
+            (self.docs / "images" / "a.png").read_bytes(), b"\x89PNG" * 100
+        )
+
+    def test_unchanged_files_are_skipped(self):
+        self.sync()
+        stats = self.sync()
+        self.assertEqual((stats.copied, stats.skipped), (0, 2))
+
+    def test_changed_file_is_copied(self):
+        self.sync()
+        css = self.static / "index.css"
+        css.write_text("body { margin: 0 }")
+        stats = self.sync()
+        self.assertEqual((stats.copied, stats.skipped), (1, 1))
+        self.assertEqual((self.docs / "index.css").read_text(), "body { margin: 0 }")
+
+    def test_hash_compare_ignores_touched_files(self):
+        self.sync()
+        os.utime(self.static / "index.css", ns=(0, 0))
+        self.assertEqual(self.sync(compare="hash").copied, 0)
+        self.assertEqual(self.sync().copied, 1)
+
+    def test_stale_assets_are_removed_but_pages_are_kept(self):
+        self.sync()
+        (self.static / "images" / "a.png").unlink()
+        stats = self.sync()
+        self.assertEqual((stats.removed, stats.removed_bytes), (1, 400))
+        self.assertFalse((self.docs / "images").exists())
+        self.assertTrue((self.docs / "index.html").exists())
+
+    def test_parallel_sync(self):
+        for i in range(10):
+            (self.static / "images" / f"{i}.png").write_bytes(bytes([i]) * 1000)
+        stats = self.sync(jobs=4)
+        self.assertEqual(stats.copied, 12)
+        self.assertEqual((self.docs / "images" / "7.png").read_bytes(), b"\x07" * 1000)
+
+    def test_link_mode(self):
+        self.sync(link=True)
+        self.assertTrue(
+            os.path.samefile(self.static / "index.css", self.docs / "index.css")
+        )
+        self.assertEqual(self.sync(link=True).skipped, 2)
+
+    def test_fingerprint_name(self):
+        self.assertEqual(
+            fingerprint_name("images/a.png", "0123456789abcdef"),
+            "images/a.0123456789.png",
+        )
+        self.assertEqual(
+            fingerprint_name("LICENSE", "0123456789abcdef"), "LICENSE.0123456789"
+        )
+
+    def fingerprint(self):
+        return self.sync(
+            fingerprint=True, hash_cache_path=self.state.with_name("hashes.json")
+        )
+
+    def test_fingerprinted_sync(self):
+        stats = self.fingerprint()
+        css = fingerprint_name("index.css", file_digest(self.static / "index.css"))
+        png = fingerprint_name(
+            "images/a.png", file_digest(self.static / "images" / "a.png")
+        )
+        self.assertEqual(
+            stats.assets, {"/index.css": f"/{css}", "/images/a.png": f"/{png}"}
+        )
+        self.assertEqual(load_asset_manifest(self.docs), stats.assets)
+        self.assertEqual((self.docs / css).read_text(), "body {}")
+        self.assertFalse((self.docs / "index.css").exists())
+        self.assertEqual(stats.hashed, 2)
+
+    def test_unchanged_assets_are_not_rehashed(self):
+        self.fingerprint()
+        stats = self.fingerprint()
+        self.assertEqual((stats.hashed, stats.copied, stats.skipped), (0, 0, 2))
+
+        (self.static / "index.css").write_text("body { margin: 0 }")
+        old = load_asset_manifest(self.docs)["/index.css"]
+        stats = self.fingerprint()
+        self.assertEqual((stats.hashed, stats.copied, stats.removed), (1, 1, 1))
+        self.assertNotEqual(stats.assets["/index.css"], old)
+        self.assertFalse((self.docs / old.lstrip("/")).exists())
+
+    def test_turning_fingerprinting_on_and_off(self):
+        self.sync()
+        stats = self.fingerprint()
+        self.assertEqual(stats.removed, 2)
+        self.assertFalse((self.docs / "index.css").exists())
+        stats = self.sync()
+        self.assertEqual(stats.removed, 2)
+        self.assertTrue((self.docs / "index.css").exists())
+        self.assertFalse((self.docs / ASSET_MANIFEST).exists())
+        self.assertIsNone(load_asset_manifest(self.docs))
+
+    def test_copy_file_keeps_mtime(self):
+        source = self.static / "index.css"
+        os.utime(source, ns=(10**18, 10**18))
+        copy_file(source, self.docs / "copy.css")
+        self.assertEqual((self.docs / "copy.css").stat().st_mtime_ns, 10**18)
+
+
+if __name__ == "__main__":
+    unittest.main()
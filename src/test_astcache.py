@@ -0,0 +1,150 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import astcache
+from astcache import ASTCache, decode_node, encode_node
+from blocks import markdown_to_html_node
+from htmlnode import EMPTY_PROPS
+from main import generate_pages_recursive
+
+TEMPLATE = Path(__file__).resolve().parent.parent / "template.html"
+
+MARKDOWN = """# Title
+
+Some **bold** and [a link](/blog/post) with ![img](/images/x.png)
+
+- one
+- two
+
+```
+code
+```
+"""
+
+
+class TestASTCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_encode_round_trip(self):
+        node = markdown_to_html_node(MARKDOWN)
+        decoded = decode_node(encode_node(node))
+        self.assertEqual(decoded.to_html(), node.to_html())
+        self.assertIs(decoded.children[2].props, EMPTY_PROPS)
+
+    def test_get_and_put(self):
+        cache = ASTCache(self.root / "ast")
+        self.assertIsNone(cache.get("abc"))
+        cache.put("abc", "Title", markdown_to_html_node(MARKDOWN))
+        title, node = cache.get("abc")
+        self.assertEqual(title, "Title")
+        self.assertEqual(node.to_html(), markdown_to_html_node(MARKDOWN).to_html())
+        self.assertIsNone(cache.get("abd"))
+
+    def test_parser_version_is_part_of_the_key(self):
+        cache = ASTCache(self.root / "ast")
+        cache.put("abc", "Title", markdown_to_html_node(MARKDOWN))
+        with mock.patch.object(astcache, "PARSER_VERSION", astcache.PARSER_VERSION + 1):
+            self.assertIsNone(cache.get("abc"))
+
+    def test_unreadable_entry_is_a_miss(self):
+        cache = ASTCache(self.root / "ast")
+        path = cache.path_for("abc")
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"garbage")
+        with self.assertLogs(level="WARNING"):
+            self.assertIsNone(cache.get("abc"))
+
+    def test_evict_least_recently_used(self):
+        cache = ASTCache(self.root / "ast")
+        node = markdown_to_html_node(MARKDOWN)
+        for i, digest in enumerate(("a", "b", "c")):
+            cache.put(digest, "Title", node)
+            os.utime(cache.path_for(digest), ns=(i * 10**9, i * 10**9))
+        # Reading "a" makes it the most recently used entry
+        cache.get("a")
+        size = cache.path_for("a").stat().st_size
+        cache.max_bytes = 2 * size
+        with self.assertLogs(level="INFO"):
+            self.assertEqual(cache.evict(), (1, size))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+
+    def test_clear(self):
+        cache = ASTCache(self.root / "ast")
+        cache.put("a", "Title", markdown_to_html_node(MARKDOWN))
+        self.assertEqual(cache.clear()[0], 1)
+        self.assertEqual(cache.entries(), [])
+        self.assertEqual(list((self.root / "ast").iterdir()), [])
+
+
+class TestCachedBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.content = self.root / "content"
+        for i in range(3):
+            page = self.content / f"post{i}" / "index.md"
+            page.parent.mkdir(parents=True)
+            page.write_text(MARKDOWN.replace("Title", f"Post {i}"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, name, basepath, ast_cache_dir, **kwargs):
+        destination = self.root / name
+        destination.mkdir()
+        with self.assertLogs(level="INFO") as logs:
+            generate_pages_recursive(
+                self.content,
+                TEMPLATE,
+                destination,
+                basepath=basepath,
+                ast_cache_dir=ast_cache_dir,
+                **kwargs,
+            )
+        outputs = {
+            path.relative_to(destination): path.read_bytes()
+            for path in destination.rglob("*.html")
+        }
+        return outputs, "\n".join(logs.output)
+
+    def test_basepath_change_reuses_parsed_pages(self):
+        cache_dir = self.root / "ast"
+        self.build("first", "/", cache_dir)
+        with mock.patch("main.markdown_to_html_node") as parse:
+            cached, log = self.build("second", "/site/", cache_dir)
+        parse.assert_not_called()
+        self.assertIn("3 generated (3 from the AST cache)", log)
+
+        uncached, _ = self.build("uncached", "/site/", None)
+        self.assertEqual(cached, uncached)
+        self.assertIn(b'href="/site/blog/post"', cached[Path("post0/index.html")])
+
+    def test_large_pages_skip_the_cache(self):
+        big = self.content / "post0" / "index.md"
+        big.write_text(MARKDOWN + "Many words of a long post.\n\n" * 20)
+        cache_dir = self.root / "ast"
+        uncached, _ = self.build("uncached", "/", None)
+        with mock.patch("main.STREAM_MIN_BYTES", 400):
+            for io_threads in (0, 4):
+                with self.subTest(io_threads=io_threads):
+                    name = f"threads{io_threads}"
+                    self.build(f"{name}-first", "/", cache_dir, io_threads=io_threads)
+                    outputs, log = self.build(
+                        f"{name}-second", "/", cache_dir, io_threads=io_threads
+                    )
+                    self.assertIn("3 generated (2 from the AST cache)", log)
+                    self.assertEqual(outputs, uncached)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from pathlib import Path
+
+from bench import (
+    DEFERRED_IMPORTS,
+    STAGES,
+    find_regressions,
+    import_times,
+    time_stages,
+)
+from blocks import BlockType, block_to_block_type, markdown_to_blocks
+from corpus import DEFAULT_MIX, generate_corpus, parse_mix
+
+TEMPLATE = Path(__file__).resolve().parent.parent / "template.html"
+
+
+class TestCorpus(unittest.TestCase):
+    def test_corpus_is_deterministic(self):
+        self.assertEqual(generate_corpus(5, seed=3), generate_corpus(5, seed=3))
+        self.assertNotEqual(generate_corpus(5, seed=3), generate_corpus(5, seed=4))
+
+    def test_corpus_shape(self):
+        corpus = generate_corpus(pages=4, blocks=7)
+        self.assertEqual([path for path, _ in corpus][0], "blog/post0/index.md")
+        for _, page in corpus:
+            self.assertTrue(page.startswith("# "))
+            self.assertEqual(len(markdown_to_blocks(page)), 8)
+
+    def test_mix(self):
+        mix = parse_mix("code=1")
+        self.assertEqual(set(mix), set(DEFAULT_MIX))
+        ((_, page),) = generate_corpus(pages=1, blocks=5, mix=mix)
+        types = [block_to_block_type(b) for b in markdown_to_blocks(page)]
+        self.assertEqual(types, [BlockType.HEADING] + [BlockType.CODE] * 5)
+
+    def test_parse_mix_errors(self):
+        with self.assertRaises(ValueError):
+            parse_mix("tables=1")
+        with self.assertRaises(ValueError):
+            parse_mix("code=0")
+
+
+class TestBenchHarness(unittest.TestCase):
+    def test_time_stages(self):
+        pages = [page for _, page in generate_corpus(pages=3, blocks=4)]
+        stages = time_stages(pages, TEMPLATE, repeat=1)
+        self.assertEqual(tuple(stages), STAGES)
+        self.assertTrue(all(seconds >= 0 for seconds in stages.values()))
+
+    def test_find_regressions(self):
+        baseline = {"stages": {"to_html": 1.0, "write": 1.0}}
+        current = {"stages": {"to_html": 1.05, "write": 1.5, "new": 9.0}}
+        self.assertEqual(
+            find_regressions(baseline, current, 0.1), [("write", 1.0, 1.5)]
+        )
+        self.assertEqual(len(find_regressions(baseline, current, 0.01)), 2)
+
+
+class TestStartup(unittest.TestCase):
+    def test_heavy_imports_are_deferred(self):
+        times = import_times("main")
+        self.assertIn("blocks", times)
+        self.assertGreaterEqual(times["main"][1], times["blocks"][1])
+        for name in DEFERRED_IMPORTS:
+            self.assertNotIn(name, times)
+
+
+if __name__ == "__main__":
+    unittest.main()
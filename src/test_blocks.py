@@ -1,8 +1,10 @@
+import io
 import unittest
 
 from blocks import (
     BlockType,
     block_to_block_type,
+    iter_blocks,
     markdown_to_blocks,
     markdown_to_html_node,
 )
@@ -29,6 +31,45 @@ This is the same paragraph on a new line
             ],
         )
 
+    def test_matches_paragraph_split(self):
+        for md in [
+            "a\n\n\nb",
+            "a\n \n\nb\n",
+            "  \n\n# h\n  \n  text  \n\n\n\n",
+            "",
+            "\n\n",
+        ]:
+            expected = [b.strip() for b in md.split("\n\n") if b.strip()]
+            self.assertEqual(markdown_to_blocks(md), expected)
+
+
+class TestIterBlocks(unittest.TestCase):
+    def test_iter_blocks_from_file(self):
+        source = io.StringIO("# Title\n\nSome text\nmore\n\n- a\n- b\n")
+        self.assertEqual(
+            list(iter_blocks(source)),
+            [
+                (BlockType.HEADING, "# Title"),
+                (BlockType.PARAGRAPH, "Some text\nmore"),
+                (BlockType.UNORDERED_LIST, "- a\n- b"),
+            ],
+        )
+
+    def test_iter_blocks_is_lazy(self):
+        def lines():
+            yield "first\n"
+            yield "\n"
+            raise AssertionError("read past the first block")
+
+        blocks = iter_blocks(lines())
+        self.assertEqual(next(blocks), (BlockType.PARAGRAPH, "first"))
+
+    def test_lazy_html_node(self):
+        md = "# Title\n\nSome **bold** text\n"
+        node = markdown_to_html_node(io.StringIO(md), lazy=True)
+        self.assertNotIsInstance(node.children, list)
+        self.assertEqual(node.to_html(), markdown_to_html_node(md).to_html())
+
 
 class TestBlockToBlockType(unittest.TestCase):
     def test_block_to_block_type(self):
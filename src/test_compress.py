@@ -0,0 +1,107 @@
+import gzip
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from compress import available_encodings, compress_outputs, remove_compressed
+
+
+class TestCompressOutputs(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.docs = self.root / "docs"
+        self.state = self.root / "cache" / "compress.json"
+        (self.docs / "blog").mkdir(parents=True)
+        self.page = self.docs / "blog" / "index.html"
+        self.page.write_text("<p>hello</p>\n" * 200)
+        (self.docs / "index.css").write_text("body { margin: 0; }\n" * 100)
+        (self.docs / "small.html").write_text("<p>hi</p>")
+        (self.docs / "logo.png").write_bytes(b"\x89PNG" * 1000)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def compress(self, jobs=1):
+        with self.assertLogs(level="INFO"):
+            return compress_outputs(
+                self.docs, min_size=1024, jobs=jobs, state_path=self.state
+            )
+
+    def variants(self):
+        return sorted(
+            path.relative_to(self.docs).as_posix()
+            for path in self.docs.rglob("*")
+            if path.suffix in (".gz", ".br")
+        )
+
+    def test_compresses_text_files_above_threshold(self):
+        stats = self.compress()
+        self.assertEqual((stats.compressed, stats.too_small), (2, 1))
+        expected = [
+            f"{name}{suffix}"
+            for name in ("blog/index.html", "index.css")
+            for suffix in available_encodings()
+        ]
+        self.assertEqual(self.variants(), sorted(expected))
+        gz = self.page.with_name("index.html.gz").read_bytes()
+        self.assertEqual(gzip.decompress(gz), self.page.read_bytes())
+
+    def test_parallel_matches_serial(self):
+        self.compress(jobs=2)
+        parallel = self.page.with_name("index.html.gz").read_bytes()
+        os.remove(self.state)
+        self.compress(jobs=1)
+        self.assertEqual(self.page.with_name("index.html.gz").read_bytes(), parallel)
+
+    def test_unchanged_bytes_are_not_recompressed(self):
+        self.compress()
+        # Rewriting the same bytes changes the mtime but not the content
+        self.page.write_text(self.page.read_text())
+        stats = self.compress()
+        self.assertEqual((stats.compressed, stats.unchanged), (0, 2))
+
+        self.page.write_text("<p>changed</p>\n" * 200)
+        stats = self.compress()
+        self.assertEqual((stats.compressed, stats.unchanged), (1, 1))
+        gz = self.page.with_name("index.html.gz").read_bytes()
+        self.assertEqual(gzip.decompress(gz), self.page.read_bytes())
+
+    def test_missing_variant_is_rewritten(self):
+        self.compress()
+        self.page.with_name("index.html.gz").unlink()
+        self.assertEqual(self.compress().compressed, 1)
+
+    def test_stale_variants_are_removed(self):
+        self.compress()
+        self.page.unlink()
+        (self.docs / "index.css").write_text("body{}")
+        stats = self.compress()
+        self.assertEqual(stats.removed, 2 * len(available_encodings()))
+        self.assertEqual(self.variants(), [])
+
+    def test_variants_not_in_the_state_are_kept(self):
+        archive = self.docs / "archive.tar.gz"
+        archive.write_bytes(b"not ours")
+        (self.docs / "orphan.html.gz").write_bytes(b"not ours either")
+        self.compress()
+        self.page.unlink()
+        stats = self.compress()
+        self.assertEqual(stats.removed, len(available_encodings()))
+        self.assertTrue(archive.exists())
+        self.assertIn("orphan.html.gz", self.variants())
+
+    def test_remove_compressed_clears_the_state(self):
+        archive = self.docs / "archive.tar.gz"
+        archive.write_bytes(b"not ours")
+        self.compress()
+        with self.assertLogs(level="INFO"):
+            removed = remove_compressed(self.docs, self.state)
+        self.assertEqual(removed, 2 * len(available_encodings()))
+        self.assertEqual(self.variants(), ["archive.tar.gz"])
+        self.assertFalse(self.state.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from discover import DirCache, IgnoreRules, is_ignored, iter_markdown_files
+from main import generate_pages_recursive
+from manifest import file_digest
+
+TEMPLATE = Path(__file__).resolve().parent.parent / "template.html"
+
+# An hour ago: old enough for directory listings to be cached
+PAST = time.time_ns() - 3600 * 10**9
+
+
+class TestIgnoreRules(unittest.TestCase):
+    def test_patterns(self):
+        rules = IgnoreRules.default().extend(
+            "", ["# comment", "", "drafts/", "*.tmp.md", "/notes/todo.md"]
+        )
+        rules = rules.extend("blog", ["old-*", "!old-but-gold.md"])
+        self.assertTrue(rules.ignored(".git", is_dir=True))
+        self.assertTrue(rules.ignored("a/node_modules", is_dir=True))
+        self.assertTrue(rules.ignored("blog/drafts", is_dir=True))
+        self.assertFalse(rules.ignored("drafts.md", is_dir=False))
+        self.assertTrue(rules.ignored("a/x.tmp.md", is_dir=False))
+        self.assertTrue(rules.ignored("notes/todo.md", is_dir=False))
+        self.assertFalse(rules.ignored("a/notes/todo.md", is_dir=False))
+        self.assertTrue(rules.ignored("blog/old-post.md", is_dir=False))
+        self.assertFalse(rules.ignored("blog/old-but-gold.md", is_dir=False))
+        self.assertFalse(rules.ignored("old-post.md", is_dir=False))
+
+    def test_signature_follows_patterns(self):
+        rules = IgnoreRules.default()
+        self.assertIs(rules.extend("a", ["# nothing"]), rules)
+        self.assertNotEqual(rules.extend("a", ["x"]).signature, rules.signature)
+        self.assertEqual(
+            rules.extend("a", ["x"]).signature, rules.extend("a", ["x"]).signature
+        )
+
+
+class TestIterMarkdownFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name) / "content"
+        for rel in (
+            "index.md",
+            "blog/a.md",
+            "blog/b.md",
+            "blog/notes.txt",
+            "blog/drafts/c.md",
+            "node_modules/pkg/readme.md",
+            ".git/d.md",
+        ):
+            path = self.root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("# x\n")
+        (self.root / ".ssgignore").write_text("drafts/\n")
+        self.age()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def age(self):
+        for directory in [self.root, *self.root.rglob("*")]:
+            if directory.is_dir():
+                os.utime(directory, ns=(PAST, PAST))
+
+    def walk(self, dir_cache=None):
+        return [
+            path.relative_to(self.root).as_posix()
+            for path, _ in iter_markdown_files(self.root, dir_cache)
+        ]
+
+    def test_walk_honors_ignore_rules(self):
+        self.assertEqual(self.walk(), ["index.md", "blog/a.md", "blog/b.md"])
+        path, stat = next(iter_markdown_files(self.root))
+        self.assertEqual(stat.st_size, path.stat().st_size)
+
+    def test_is_ignored_matches_the_walk(self):
+        walked = set(self.walk())
+        for path in self.root.rglob("*.md"):
+            rel = path.relative_to(self.root).as_posix()
+            with self.subTest(rel=rel):
+                self.assertEqual(is_ignored(self.root, path), rel not in walked)
+        self.assertTrue(is_ignored(self.root, self.root / "blog" / "drafts", True))
+
+    def test_unchanged_directories_are_not_read(self):
+        cache_path = Path(self.tmp.name) / "dirs.json"
+        dir_cache = DirCache.load(cache_path)
+        first = self.walk(dir_cache)
+        dir_cache.save()
+
+        dir_cache = DirCache.load(cache_path)
+        with mock.patch("discover.os.scandir") as scandir:
+            self.assertEqual(self.walk(dir_cache), first)
+        scandir.assert_not_called()
+        self.assertEqual(dir_cache.reused, 2)
+
+        # A new file changes the mtime of its directory only
+        (self.root / "blog" / "e.md").write_text("# e\n")
+        dir_cache = DirCache.load(cache_path)
+        self.assertEqual(self.walk(dir_cache), [*first, "blog/e.md"])
+        self.assertEqual(dir_cache.reused, 1)
+        dir_cache.save()
+
+        # Changing the rules lists the directories below them again
+        (self.root / ".ssgignore").write_text("drafts/\nb.md\n")
+        self.age()
+        dir_cache = DirCache.load(cache_path)
+        self.assertEqual(self.walk(dir_cache), ["index.md", "blog/a.md", "blog/e.md"])
+        self.assertEqual(dir_cache.reused, 0)
+
+
+class TestDiscoveryBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.content = self.root / "content"
+        for i in range(3):
+            page = self.content / f"post{i}" / "index.md"
+            page.parent.mkdir(parents=True)
+            page.write_text(f"# Post {i}\n")
+        self.destination = self.root / "docs"
+        self.destination.mkdir()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self):
+        with self.assertLogs(level="INFO") as logs:
+            generate_pages_recursive(
+                self.content,
+                TEMPLATE,
+                self.destination,
+                manifest_path=self.root / "manifest.json",
+                dir_cache_path=self.root / "dirs.json",
+            )
+        return "\n".join(logs.output)
+
+    def hashed_sources(self):
+        with mock.patch("manifest.file_digest", wraps=file_digest) as digest:
+            log = self.build()
+        hashed = [call.args[0] for call in digest.call_args_list]
+        return [path for path in hashed if self.content in path.parents], log
+
+    def test_unchanged_sources_are_not_hashed(self):
+        self.build()
+        hashed, log = self.hashed_sources()
+        self.assertEqual(hashed, [])
+        self.assertIn("0 generated", log)
+
+        # Same bytes, new mtime: hashed once, then trusted again
+        page = self.content / "post1" / "index.md"
+        page.write_text(page.read_text())
+        os.utime(page, ns=(PAST, PAST))
+        hashed, log = self.hashed_sources()
+        self.assertEqual(hashed, [page])
+        self.assertIn("0 generated", log)
+        self.assertEqual(self.hashed_sources()[0], [])
+
+    def test_ignored_pages_are_not_built(self):
+        (self.content / ".ssgignore").write_text("post1/\n")
+        self.build()
+        self.assertFalse((self.destination / "post1" / "index.html").exists())
+        self.assertTrue((self.destination / "post2" / "index.html").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
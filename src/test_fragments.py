@@ -0,0 +1,134 @@
+import re
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import fragments
+from astcache import decode_node, encode_node
+from blocks import markdown_to_html_node
+from fragments import FragmentCache, FragmentNode, fragment_namespace
+from sitefixture import SiteTestCase
+
+FOOTER = "- [Home](/)\n- [Blog](/blog)"
+
+MARKDOWN = f"# Title\n\nSome **bold** text\n\n{FOOTER}\n"
+
+
+class TestFragmentCache(unittest.TestCase):
+    def tearDown(self):
+        fragments.activate(None)
+
+    def test_lru_eviction(self):
+        cache = FragmentCache("ns", max_bytes=10)
+        cache.put("paragraph", "a", "<p>a</p>")
+        self.assertEqual(cache.get("paragraph", "a"), "<p>a</p>")
+        cache.put("paragraph", "b", "<p>b</p>")
+        self.assertIsNone(cache.get("paragraph", "a"))
+        self.assertEqual(cache.get("paragraph", "b"), "<p>b</p>")
+        self.assertEqual(cache.size, 8)
+        cache.put("paragraph", "c", "<p>" + "c" * 20 + "</p>")
+        self.assertIsNone(cache.get("paragraph", "c"))
+        # Only a block seen before and rendered again counts as a miss
+        self.assertEqual(cache.counts(), (2, 0))
+        self.assertFalse(cache.seen_before("paragraph", "c"))
+        self.assertTrue(cache.seen_before("paragraph", "c"))
+        self.assertEqual(cache.counts(), (2, 1))
+
+    def test_disk_tier_is_shared(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            first = FragmentCache("ns", directory=Path(tmp))
+            first.put("paragraph", "a", "<p>a</p>")
+            second = FragmentCache("ns", directory=Path(tmp))
+            # The disk is only read for a block this process saw before
+            self.assertIsNone(second.get("paragraph", "a"))
+            self.assertFalse(second.seen_before("paragraph", "a"))
+            self.assertEqual(second.get("paragraph", "a"), "<p>a</p>")
+            other = FragmentCache("other", directory=Path(tmp))
+            other.seen_before("paragraph", "a")
+            self.assertIsNone(other.get("paragraph", "a"))
+
+    def test_blocks_seen_once_are_not_stored(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            fragments.activate(("ns", 1024, Path(tmp)))
+            markdown_to_html_node(MARKDOWN, fragments=True).to_html()
+            self.assertEqual(list(Path(tmp).iterdir()), [])
+            markdown_to_html_node(FOOTER, fragments=True).to_html()
+            self.assertEqual(len(list(Path(tmp).rglob("*.html"))), 1)
+
+    def test_fragments_render_the_same_html(self):
+        plain = markdown_to_html_node(MARKDOWN).to_html()
+        node = markdown_to_html_node(MARKDOWN, fragments=True)
+        self.assertIsInstance(node.children[0], FragmentNode)
+        self.assertEqual(node.to_html(), plain)
+
+        cache = fragments.activate((fragment_namespace("/", None), 1024, None))
+        self.assertEqual(node.to_html(), plain)
+        self.assertEqual(cache.counts(), (0, 0))
+        # The footer is stored the second time it is seen, and reused after
+        again = markdown_to_html_node(FOOTER, fragments=True)
+        footer = f"<div>{plain.split('</p>')[-1]}"
+        self.assertEqual(again.to_html(), footer)
+        self.assertEqual(cache.counts(), (0, 1))
+        self.assertEqual(again.to_html(), footer)
+        self.assertEqual(cache.counts(), (1, 1))
+
+    def test_ast_cache_keeps_fragments(self):
+        node = markdown_to_html_node(MARKDOWN, fragments=True)
+        decoded = decode_node(encode_node(node))
+        self.assertIsInstance(decoded.children[2], FragmentNode)
+        self.assertEqual(decoded.children[2].text, FOOTER)
+        self.assertEqual(decoded.children[2].block_type, "unordered_list")
+        self.assertEqual(decoded.to_html(), node.to_html())
+
+
+class TestFragmentBuild(SiteTestCase):
+    pages = 4
+
+    def page(self, i):
+        return f"# Post {i}\n\nWords of post {i}\n\n{FOOTER}\n"
+
+    def tearDown(self):
+        fragments.activate(None)
+        super().tearDown()
+
+    def build(self, name, **kwargs):
+        destination = self.root / name
+        log = self.generate(destination, basepath="/site/", **kwargs)
+        return self.read_pages(destination), log
+
+    def test_cached_blocks_match_a_build_without_cache(self):
+        plain, log = self.build("plain")
+        self.assertNotIn("Fragment cache", log)
+        pages, log = self.build("cached", fragment_cache_size=1024)
+        self.assertEqual(pages, plain)
+        self.assertIn('href="/site/blog"', pages[Path("post0/index.html")])
+        # The footer is stored on the second page and reused on the others
+        self.assertIn("Fragment cache: 2 hits, 1 misses (66.7% hit rate)", log)
+
+    def test_blocks_are_not_wrapped_without_cache(self):
+        with mock.patch("blocks.FragmentNode") as fragment_node:
+            self.build("plain")
+        fragment_node.assert_not_called()
+
+    def test_parallel_build_shares_fragments(self):
+        plain, _ = self.build("plain")
+        fragment_dir = self.root / "fragments"
+        pages, log = self.build(
+            "parallel",
+            jobs=2,
+            fragment_cache_size=1024,
+            fragment_cache_dir=fragment_dir,
+        )
+        self.assertEqual(pages, plain)
+        # Each worker stores the footer once it saw it twice; the first
+        # sighting in every worker is no lookup
+        hits, misses = re.search(
+            r"Fragment cache: (\d+) hits, (\d+) misses", log
+        ).groups()
+        self.assertLessEqual(int(hits) + int(misses), 3)
+        self.assertEqual(list(fragment_dir.iterdir()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from fsutil import write_atomic
+
+
+class TestWriteAtomic(unittest.TestCase):
+    def test_replaces_the_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "state.json"
+            write_atomic(path, "{}")
+            write_atomic(path, b"[]", unique=True)
+            self.assertEqual(path.read_text(), "[]")
+            self.assertEqual([p.name for p in Path(tmp).iterdir()], ["state.json"])
+
+    def test_failed_write_keeps_the_old_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "state.json"
+            write_atomic(path, "old")
+            with mock.patch("fsutil.os.replace", side_effect=OSError("full")):
+                with self.assertRaises(OSError):
+                    write_atomic(path, "new")
+            self.assertEqual(path.read_text(), "old")
+            self.assertEqual([p.name for p in Path(tmp).iterdir()], ["state.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
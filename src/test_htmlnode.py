@@ -1,3 +1,4 @@
+import io
 import unittest
 
 from htmlnode import HTMLNode, LeafNode, ParentNode
@@ -14,6 +15,10 @@ class TestHTMLNode(unittest.TestCase):
     def test_repr(self):
         node = HTMLNode("div", "Hello, World!", [], {"class": "greeting"})
         expected_repr = "HTMLNode(div, Hello, World!, [], {'class': 'greeting'})"
+        self.assertEqual(repr(node), expected_repr)
+
+    def test_repr_with_defaults(self):
+        self.assertEqual(repr(LeafNode("b", "x")), "HTMLNode(b, x, [], {})")
 
     def test_props_to_html(self):
         node = HTMLNode("div", "Hello, World!", [], {"class": "greeting", "id": "main"})
@@ -75,3 +80,57 @@ class TestParentNode(unittest.TestCase):
             parent_node.to_html(),
             "<div><span><b>grandchild</b></span></div>",
         )
+
+
+class TestCompactNodes(unittest.TestCase):
+    def test_nodes_have_no_instance_dict(self):
+        for node in [HTMLNode(), LeafNode("b", "x"), ParentNode("p", [])]:
+            self.assertFalse(hasattr(node, "__dict__"))
+
+    def test_empty_children_and_props_are_shared(self):
+        a, b = LeafNode("b", "x"), LeafNode("i", "y")
+        self.assertIs(a.children, b.children)
+        self.assertIs(a.props, b.props)
+        self.assertEqual(a.children, [])
+        self.assertEqual(a.props, {})
+
+    def test_shared_empties_are_immutable(self):
+        node = LeafNode("b", "x")
+        with self.assertRaises(TypeError):
+            node.children.append(LeafNode("i", "y"))
+        with self.assertRaises(TypeError):
+            node.props["class"] = "x"
+        self.assertEqual(LeafNode("i", "y").props_to_html(), "")
+
+    def test_tags_are_interned(self):
+        level = 2
+        self.assertIs(ParentNode(f"h{level}", []).tag, ParentNode("h2", []).tag)
+
+
+class TestStreamingSerializer(unittest.TestCase):
+    def test_iter_html_yields_chunks(self):
+        node = ParentNode("p", [LeafNode(None, "Hi "), LeafNode("b", "there")])
+        chunks = list(node.iter_html())
+        self.assertEqual(chunks, ["<p>", "Hi ", "<b>", "there", "</b>", "</p>"])
+
+    def test_write_html_to_stream(self):
+        node = ParentNode(
+            "div", [ParentNode("ul", [ParentNode("li", [LeafNode("i", "x")])])]
+        )
+        stream = io.StringIO()
+        node.write_html(stream)
+        self.assertEqual(stream.getvalue(), node.to_html())
+        self.assertEqual(stream.getvalue(), "<div><ul><li><i>x</i></li></ul></div>")
+
+    def test_deep_tree(self):
+        node = LeafNode("b", "x")
+        for _ in range(5000):
+            node = ParentNode("span", [node])
+        html = node.to_html()
+        self.assertEqual(len(html), len("<b>x</b>") + 5000 * len("<span></span>"))
+        self.assertTrue(html.startswith("<span><span>"))
+
+    def test_nested_parent_without_tag(self):
+        node = ParentNode("div", [ParentNode(None, [LeafNode("b", "x")])])
+        with self.assertRaises(ValueError):
+            node.to_html()
@@ -0,0 +1,319 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from main import generate_pages_recursive
+from manifest import BuildManifest, build_inputs, file_digest
+
+TEMPLATE = Path(__file__).resolve().parent.parent / "template.html"
+
+
+class TestBuildManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def inputs(self, basepath="/", template="t", template_uses_basepath=False):
+        return {
+            "generator": "x",
+            "templates": {"template.html": template},
+            "basepath": basepath,
+            "template_uses_basepath": template_uses_basepath,
+            "template_urls": ["/index.css"],
+            "assets": None,
+            "minify": False,
+        }
+
+    def test_round_trip(self):
+        path = self.root / "cache" / "manifest.json"
+        inputs = self.inputs()
+        manifest = BuildManifest.load(path)
+        manifest.record("index.md", "abc", "index.html", inputs, {"/blog"})
+        manifest.save(inputs)
+
+        loaded = BuildManifest.load(path)
+        self.assertEqual(loaded.inputs, inputs)
+        self.assertEqual(
+            loaded.pages,
+            {
+                "index.md": {
+                    "source": "abc",
+                    "output": "index.html",
+                    "deps": {
+                        "generator": "x",
+                        "template:template.html": "t",
+                        "basepath": "/",
+                    },
+                    "refs": ["/blog"],
+                }
+            },
+        )
+
+    def test_missing_output_is_stale(self):
+        inputs = self.inputs()
+        manifest = BuildManifest(None, inputs)
+        manifest.record("index.md", "abc", "index.html", inputs)
+        self.assertEqual(
+            manifest.stale_reasons("index.md", "abc", inputs, self.root),
+            ["output missing"],
+        )
+        (self.root / "index.html").write_text("x")
+        self.assertEqual(
+            manifest.stale_reasons("index.md", "abc", inputs, self.root), []
+        )
+
+    def test_stale_reasons(self):
+        (self.root / "a.html").write_text("x")
+        (self.root / "b.html").write_text("x")
+        inputs = self.inputs()
+        manifest = BuildManifest(None, inputs)
+        manifest.record("a.md", "abc", "a.html", inputs, {"/blog"})
+        manifest.record("b.md", "def", "b.html", inputs)
+
+        def reasons(key, digest, inputs):
+            return manifest.stale_reasons(key, digest, inputs, self.root)
+
+        self.assertEqual(reasons("new.md", "abc", inputs), ["new page"])
+        self.assertEqual(reasons("a.md", "xyz", inputs), ["source changed"])
+        self.assertEqual(
+            reasons("a.md", "abc", self.inputs(template="u")),
+            ["template template.html changed"],
+        )
+        # Only pages with site-absolute urls depend on the basepath, unless
+        # the template uses it too
+        moved = self.inputs(basepath="/site/")
+        self.assertEqual(
+            reasons("a.md", "abc", moved), ["basepath changed (/ -> /site/)"]
+        )
+        self.assertEqual(reasons("b.md", "def", moved), [])
+        moved["template_uses_basepath"] = True
+        self.assertEqual(
+            reasons("b.md", "def", moved), ["basepath changed (None -> /site/)"]
+        )
+
+    def test_asset_fingerprints(self):
+        (self.root / "a.html").write_text("x")
+        (self.root / "b.html").write_text("x")
+        inputs = self.inputs()
+        inputs["assets"] = {"/index.css": "/index.1.css", "/i.png": "/i.1.png"}
+        manifest = BuildManifest(None, inputs)
+        manifest.record("a.md", "abc", "a.html", inputs, {"/i.png#top"})
+        manifest.record("b.md", "def", "b.html", inputs)
+        self.assertEqual(
+            manifest.pages["a.md"]["deps"]["asset:/i.png#top"], "/i.1.png#top"
+        )
+
+        # Every page depends on the stylesheet the template links to
+        inputs = dict(
+            inputs, assets={"/index.css": "/index.2.css", "/i.png": "/i.1.png"}
+        )
+        change = "asset:/index.css changed (/index.1.css -> /index.2.css)"
+        self.assertEqual(
+            manifest.stale_reasons("a.md", "abc", inputs, self.root), [change]
+        )
+        self.assertEqual(
+            manifest.stale_reasons("b.md", "def", inputs, self.root), [change]
+        )
+
+        inputs = dict(
+            inputs, assets={"/index.css": "/index.1.css", "/i.png": "/i.2.png"}
+        )
+        self.assertEqual(
+            len(manifest.stale_reasons("a.md", "abc", inputs, self.root)), 1
+        )
+        self.assertEqual(manifest.stale_reasons("b.md", "def", inputs, self.root), [])
+
+    def test_dangling_refs(self):
+        (self.root / "blog" / "post").mkdir(parents=True)
+        (self.root / "blog" / "post" / "index.html").write_text("x")
+        (self.root / "logo.png").write_text("x")
+        inputs = self.inputs()
+        manifest = BuildManifest(None, inputs)
+        refs = {"/blog/post#top", "/logo.png", "/gone", "/blog/gone.png"}
+        manifest.record("index.md", "abc", "index.html", inputs, refs)
+        manifest.record("other.md", "def", "other.html", inputs, {"/gone"})
+        self.assertEqual(
+            manifest.dangling_refs(self.root),
+            [
+                ("index.md", "/blog/gone.png"),
+                ("index.md", "/gone"),
+                ("other.md", "/gone"),
+            ],
+        )
+
+    def test_unreadable_manifest_is_ignored(self):
+        path = self.root / "manifest.json"
+        path.write_text("{not json")
+        with self.assertLogs(level="WARNING"):
+            manifest = BuildManifest.load(path)
+        self.assertEqual(manifest.pages, {})
+
+
+class TestIncrementalBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.content = root / "content"
+        self.docs = root / "docs"
+        self.manifest = root / "cache" / "manifest.json"
+        (self.content / "blog").mkdir(parents=True)
+        self.docs.mkdir()
+        (self.content / "index.md").write_text("# Home\n\nHello")
+        (self.content / "blog" / "post.md").write_text("# Post\n\nWorld")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, basepath="/", force=False):
+        generate_pages_recursive(
+            self.content,
+            TEMPLATE,
+            self.docs,
+            basepath=basepath,
+            force=force,
+            manifest_path=self.manifest,
+        )
+
+    def test_unchanged_pages_are_skipped(self):
+        self.build()
+        post = self.docs / "blog" / "post.html"
+        post.write_text("sentinel")
+        self.build()
+        self.assertEqual(post.read_text(), "sentinel")
+        self.build(force=True)
+        self.assertNotEqual(post.read_text(), "sentinel")
+
+    def test_changed_inputs_rebuild(self):
+        self.build()
+        post = self.docs / "blog" / "post.html"
+        post.write_text("sentinel")
+        (self.content / "blog" / "post.md").write_text("# Post\n\nChanged")
+        self.build()
+        self.assertIn("Changed", post.read_text())
+
+        post.write_text("sentinel")
+        self.build(basepath="/site/")
+        self.assertIn("/site/index.css", post.read_text())
+
+    def test_deleted_source_is_pruned(self):
+        self.build()
+        (self.content / "blog" / "post.md").unlink()
+        self.build()
+        self.assertFalse((self.docs / "blog").exists())
+        self.assertTrue((self.docs / "index.html").exists())
+
+    def test_removals_and_dangling_links_are_summarized(self):
+        (self.content / "index.md").write_text("# Home\n\n[a](/gone) [b](/lost)")
+        with self.assertLogs(level="WARNING"):
+            self.build()
+        (self.content / "blog" / "post.md").unlink()
+        with self.assertLogs(level="INFO") as logs:
+            self.build()
+        log = "\n".join(logs.output)
+        self.assertIn("Removed 1 stale pages whose source is gone", log)
+        self.assertNotIn("Removing stale page", log)
+        self.assertIn("2 links to missing pages or assets in 1 pages", log)
+        self.assertEqual(log.count("WARNING"), 1)
+
+    def test_build_limited_to_sources(self):
+        self.build()
+        index, post = self.docs / "index.html", self.docs / "blog" / "post.html"
+        index.write_text("sentinel")
+        post.write_text("sentinel")
+        (self.content / "blog" / "post.md").write_text("# Post\n\nChanged")
+        (self.content / "index.md").write_text("# Home\n\nChanged")
+        generate_pages_recursive(
+            self.content,
+            TEMPLATE,
+            self.docs,
+            manifest_path=self.manifest,
+            sources=[self.content / "blog" / "post.md"],
+        )
+        self.assertIn("Changed", post.read_text())
+        self.assertEqual(index.read_text(), "sentinel")
+
+        (self.content / "blog" / "post.md").unlink()
+        generate_pages_recursive(
+            self.content,
+            TEMPLATE,
+            self.docs,
+            manifest_path=self.manifest,
+            sources=[self.content / "blog" / "post.md"],
+        )
+        self.assertFalse(post.exists())
+        self.assertTrue(index.exists())
+        self.assertEqual(list(BuildManifest.load(self.manifest).pages), ["index.md"])
+
+    def test_explain(self):
+        self.build()
+        (self.content / "blog" / "post.md").write_text("# Post\n\nChanged")
+        with self.assertLogs(level="INFO") as logs:
+            generate_pages_recursive(
+                self.content,
+                TEMPLATE,
+                self.docs,
+                manifest_path=self.manifest,
+                explain=True,
+            )
+        rebuilt = [line for line in logs.output if "Rebuilding" in line]
+        self.assertEqual(len(rebuilt), 1)
+        self.assertIn("post.md: source changed", rebuilt[0])
+
+    def test_only_dependent_pages_are_rebuilt(self):
+        templates = Path(self.tmp.name) / "templates"
+        templates.mkdir()
+        template = templates / "page.html"
+        template.write_text('{{ Content }}{% include "footer.html" %}')
+        footer = templates / "footer.html"
+        footer.write_text("<footer></footer>")
+        (self.content / "index.md").write_text("# Home\n\n[post](/blog/post)")
+
+        def build(basepath="/"):
+            with self.assertLogs(level="INFO") as logs:
+                generate_pages_recursive(
+                    self.content,
+                    template,
+                    self.docs,
+                    basepath=basepath,
+                    manifest_path=self.manifest,
+                    explain=True,
+                )
+            return sorted(
+                line.split("Rebuilding ")[1]
+                for line in logs.output
+                if "Rebuilding" in line
+            )
+
+        build()
+        index = self.content / "index.md"
+        # The template does not call url(), so only the page with a
+        # site-absolute link depends on the basepath
+        self.assertEqual(build("/site/"), [f"{index}: basepath changed (/ -> /site/)"])
+        self.assertIn('href="/site/blog/post"', (self.docs / "index.html").read_text())
+
+        footer.write_text("<footer>new</footer>")
+        self.assertEqual(
+            build("/site/"),
+            [
+                f"{self.content / 'blog' / 'post.md'}: template footer.html changed",
+                f"{index}: template footer.html changed",
+            ],
+        )
+        self.assertEqual(build("/site/"), [])
+
+    def test_manifest_records_inputs(self):
+        self.build()
+        manifest = BuildManifest.load(self.manifest)
+        self.assertEqual(manifest.inputs, build_inputs(TEMPLATE, "/"))
+        self.assertTrue(manifest.inputs["template_uses_basepath"])
+        self.assertEqual(
+            manifest.pages["index.md"]["source"],
+            file_digest(self.content / "index.md"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import fragments
+import metrics
+from metrics import Histogram, Metrics, Progress
+from parallel import PageResult
+from sitefixture import SiteTestCase
+
+
+class Terminal(io.StringIO):
+    def isatty(self):
+        return True
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_buckets(self):
+        histogram = Histogram()
+        for value in (0.0005, 0.003, 0.003, 30):
+            histogram.observe(value)
+        buckets = dict(histogram.cumulative())
+        self.assertEqual(buckets[0.001], 1)
+        self.assertEqual(buckets[0.0025], 1)
+        self.assertEqual(buckets[0.005], 3)
+        self.assertEqual(buckets[5.0], 3)
+        self.assertEqual(buckets["+Inf"], 4)
+        self.assertEqual(histogram.count, 4)
+
+    def test_exports(self):
+        collected = Metrics()
+        collected.inc("ssg_pages_total", outcome="generated")
+        collected.inc("ssg_pages_total", 2, outcome="generated")
+        collected.inc("ssg_bytes_written_total", 10, kind='a "b"')
+        collected.observe("ssg_stage_seconds", 0.02, stage="render")
+        text = collected.to_prometheus()
+        self.assertIn("# TYPE ssg_pages_total counter", text)
+        self.assertIn('ssg_pages_total{outcome="generated"} 3\n', text)
+        self.assertIn('ssg_bytes_written_total{kind="a \\"b\\""} 10\n', text)
+        self.assertIn('ssg_stage_seconds_bucket{stage="render",le="0.01"} 0\n', text)
+        self.assertIn('ssg_stage_seconds_bucket{stage="render",le="0.025"} 1\n', text)
+        self.assertIn('ssg_stage_seconds_count{stage="render"} 1\n', text)
+        self.assertNotIn("ssg_files_total", text)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            prom_path, json_path = collected.write(Path(tmp) / "metrics")
+            self.assertEqual(prom_path.read_text(), text)
+            data = json.loads(json_path.read_text())
+        self.assertEqual(
+            data["ssg_pages_total"], [{"labels": {"outcome": "generated"}, "value": 3}]
+        )
+        self.assertEqual(data["ssg_stage_seconds"][0]["count"], 1)
+
+    def test_recording_is_off_by_default(self):
+        self.assertIsNone(metrics.active())
+        metrics.inc("ssg_pages_total", outcome="generated")
+        with metrics.phase("pages"):
+            pass
+        self.assertIsNone(metrics.stop())
+
+    def test_progress_line(self):
+        stream = Terminal()
+        progress = Progress(stream, interval=0)
+        progress.advance(PageResult({}, 0.1))
+        progress.advance(PageResult({}, 0.1, error="ValueError: x"))
+        self.assertIn("Pages: 2 done, 1 failed", stream.getvalue())
+        progress.finish()
+        self.assertTrue(stream.getvalue().endswith("\r\033[K"))
+
+        stream = io.StringIO()
+        progress = Progress(stream, interval=0)
+        progress.advance(PageResult({}, 0.1))
+        progress.finish()
+        self.assertEqual(stream.getvalue(), "")
+        self.assertEqual(progress.done, 1)
+
+
+class TestBuildMetrics(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.destination = self.root / "docs"
+
+    def tearDown(self):
+        metrics.stop()
+        super().tearDown()
+
+    def build(self, **kwargs):
+        collected = metrics.start()
+        log = self.generate(
+            self.destination, manifest_path=self.root / "manifest.json", **kwargs
+        )
+        metrics.stop()
+        return collected, log
+
+    def test_pages_are_counted(self):
+        for io_threads in (0, 4):
+            with self.subTest(io_threads=io_threads):
+                fragments.activate(None)
+                collected, log = self.build(
+                    io_threads=io_threads, force=True, fragment_cache_size=1024
+                )
+                self.assertEqual(
+                    collected.value("ssg_pages_total", outcome="generated"), 3
+                )
+                size = sum(
+                    path.stat().st_size for path in self.destination.rglob("*.html")
+                )
+                self.assertEqual(
+                    collected.value("ssg_bytes_written_total", kind="page"), size
+                )
+                # "Some words" is rendered again on the second page and
+                # taken from the fragment cache on the third
+                lookups = sum(
+                    collected.value(
+                        "ssg_cache_lookups_total", cache="fragment", result=result
+                    )
+                    for result in ("hit", "miss")
+                )
+                self.assertEqual(lookups, 2)
+                stages = {
+                    dict(labels)["stage"]
+                    for name, labels in collected.histograms
+                    if name == "ssg_stage_seconds"
+                }
+                expected = (
+                    {"render"} if io_threads == 0 else {"read", "render", "write"}
+                )
+                self.assertEqual(stages, expected)
+                # Per-file lines are only logged at DEBUG
+                self.assertNotIn("Generated HTML page", log)
+
+        collected, _ = self.build()
+        self.assertEqual(collected.value("ssg_pages_total", outcome="up_to_date"), 3)
+        self.assertEqual(collected.value("ssg_pages_total", outcome="generated"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
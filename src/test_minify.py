@@ -0,0 +1,108 @@
+import unittest
+from pathlib import Path
+
+from minify import Minifier, minify_html
+from sitefixture import SiteTestCase
+
+CODE = "  indented\n    more   spaces\n"
+
+MARKDOWN = f"""# Title
+
+Some **bold**   and [a link](/blog/post)
+
+- one
+- two
+
+```
+{CODE}```
+"""
+
+
+def split(text, size):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+class TestMinifier(unittest.TestCase):
+    def test_whitespace_around_blocks_is_dropped(self):
+        html = (
+            "<!doctype html>\n<html>\n  <body>\n    <p>  Hi  </p>\n  </body>\n</html>\n"
+        )
+        self.assertEqual(
+            minify_html(html), "<!doctype html><html><body><p>Hi</p></body></html>"
+        )
+
+    def test_inline_whitespace_is_collapsed(self):
+        html = "<p>a  <b>bold</b>\n  <i>it</i>  &amp; 1 < 2</p>"
+        self.assertEqual(
+            minify_html(html), "<p>a <b>bold</b> <i>it</i>  &amp; 1 < 2</p>"
+        )
+
+    def test_raw_elements_are_kept(self):
+        html = (
+            f"<div>\n<pre><code>{CODE}</code></pre>\n"
+            "<textarea>  a\n b</textarea>\n<script>if (a  <b) {}</script></div>"
+        )
+        self.assertEqual(
+            minify_html(html),
+            f"<div><pre><code>{CODE}</code></pre>"
+            "<textarea>  a\n b</textarea> <script>if (a  <b) {}</script></div>",
+        )
+
+    def test_tags_and_comments_are_kept(self):
+        html = '<p>\n<img alt="a  > b"  src="x.png">  <!-- a  >  b -->  x</p>'
+        self.assertEqual(
+            minify_html(html),
+            '<p><img alt="a  > b"  src="x.png"><!-- a  >  b --> x</p>',
+        )
+
+    def test_chunk_boundaries_do_not_matter(self):
+        html = (
+            '<!doctype html>\n<html>\n<p>  a <a href="/x">link</a>\n'
+            f"<!-- note -->\n</p>\n<PRE>{CODE}</PRE>\n<p> b < c </p>\n</html>\n"
+        )
+        expected = minify_html(html)
+        for size in range(1, 12):
+            minifier = Minifier()
+            self.assertEqual("".join(minifier.minify(split(html, size))), expected)
+            self.assertEqual(minifier.saved, len(html) - len(expected))
+
+
+class TestMinifiedBuild(SiteTestCase):
+    def page(self, i):
+        return MARKDOWN.replace("Title", f"Post {i}")
+
+    def build(self, name, minify=True, **kwargs):
+        destination = self.root / name
+        log = self.generate(
+            destination,
+            manifest_path=self.root / f"{name}.json",
+            minify=minify,
+            **kwargs,
+        )
+        return self.read_pages(destination), log
+
+    def test_all_render_paths_minify_alike(self):
+        pipelined, log = self.build("pipelined")
+        self.assertRegex(log, r"Minification: \d+ bytes saved on 3 pages")
+        serial, _ = self.build("serial", io_threads=0, ast_cache_dir=self.root / "ast")
+        parallel, _ = self.build("parallel", jobs=2)
+        self.assertEqual(pipelined, serial)
+        self.assertEqual(pipelined, parallel)
+
+        page = pipelined[Path("post0/index.html")]
+        self.assertIn(f"<pre><code>{CODE}</code></pre>", page)
+        self.assertIn("<li>one</li><li>two</li>", page)
+        self.assertNotIn("\n    ", page.replace(CODE, ""))
+
+    def test_toggling_minify_rebuilds(self):
+        plain, _ = self.build("out", minify=False)
+        minified, log = self.build("out")
+        self.assertIn("3 generated", log)
+        for path, html in plain.items():
+            self.assertLess(len(minified[path]), len(html))
+        _, log = self.build("out")
+        self.assertIn("0 generated", log)
+
+
+if __name__ == "__main__":
+    unittest.main()
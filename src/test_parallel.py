@@ -0,0 +1,151 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+import main
+from parallel import chunk_size, pipeline_pages, render_pages, resolve_jobs
+from sitefixture import SiteTestCase
+
+
+def fail_on_odd(n):
+    if n % 2:
+        raise ValueError(f"odd {n}")
+
+
+class TestRenderPages(unittest.TestCase):
+    def test_errors_are_collected_per_task(self):
+        for jobs in (1, 2):
+            with self.assertLogs(level="INFO"):
+                results = render_pages(
+                    fail_on_odd, [{"n": n} for n in range(6)], jobs=jobs
+                )
+            self.assertEqual([r.task["n"] for r in results], list(range(6)))
+            self.assertEqual(
+                [r.error for r in results],
+                [
+                    None,
+                    "ValueError: odd 1",
+                    None,
+                    "ValueError: odd 3",
+                    None,
+                    "ValueError: odd 5",
+                ],
+            )
+
+    def test_resolve_jobs(self):
+        self.assertEqual(resolve_jobs(3), 3)
+        self.assertGreaterEqual(resolve_jobs(0), 1)
+        with self.assertRaises(ValueError):
+            resolve_jobs(-1)
+
+    def test_chunk_size(self):
+        self.assertEqual(chunk_size(3, 4), 1)
+        self.assertEqual(chunk_size(1000, 4), 62)
+
+
+class TestPipeline(unittest.TestCase):
+    def test_stages_and_errors(self):
+        written = {}
+
+        def read(n):
+            if n == 1:
+                raise OSError("unreadable")
+            return n * 10
+
+        def render(n, data):
+            if n == 2:
+                raise ValueError("bad markup")
+            return data + 1, f"value {n}"
+
+        def write(n, output):
+            if n == 3:
+                raise OSError("disk full")
+            written[n] = output
+
+        with self.assertLogs(level="INFO"):
+            results = pipeline_pages(read, render, write, list(range(5)), prefetch=2)
+        self.assertEqual([r.task for r in results], list(range(5)))
+        self.assertEqual(
+            [r.error for r in results],
+            [
+                None,
+                "OSError: unreadable",
+                "ValueError: bad markup",
+                "OSError: disk full",
+                None,
+            ],
+        )
+        self.assertEqual(results[4].value, "value 4")
+        self.assertEqual(written, {0: 1, 4: 41})
+
+    def test_backpressure(self):
+        lock = threading.Lock()
+        held = {"now": 0, "max": 0}
+
+        def render(n, data):
+            with lock:
+                held["now"] += 1
+                held["max"] = max(held["max"], held["now"])
+            return data, None
+
+        def write(n, output):
+            time.sleep(0.002)
+            with lock:
+                held["now"] -= 1
+
+        with self.assertLogs(level="INFO"):
+            pipeline_pages(lambda n: n, render, write, list(range(40)), prefetch=3)
+        self.assertEqual(held["now"], 0)
+        self.assertLessEqual(held["max"], 3)
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            pipeline_pages(None, None, None, [], prefetch=0)
+
+
+class TestParallelBuild(SiteTestCase):
+    pages = 12
+
+    def page(self, i):
+        return f"# Post {i}\n\nSome **bold** [link](/post{i})\n"
+
+    def build(self, name, jobs, io_threads=4):
+        destination = self.root / name
+        self.generate(destination, basepath="/site/", jobs=jobs, io_threads=io_threads)
+        return self.read_pages(destination)
+
+    def test_parallel_output_matches_serial(self):
+        serial = self.build("serial", jobs=1, io_threads=0)
+        pipelined = self.build("pipelined", jobs=1)
+        parallel = self.build("parallel", jobs=3)
+        self.assertEqual(len(serial), 12)
+        self.assertEqual(serial, pipelined)
+        self.assertEqual(serial, parallel)
+
+    def test_pipeline_streams_large_pages(self):
+        big = self.content / "post3" / "index.md"
+        big.write_text("# Big\n\n" + "Many words of a long post.\n\n" * 40)
+        serial = self.build("serial", jobs=1, io_threads=0)
+        with (
+            mock.patch.object(main, "STREAM_MIN_BYTES", 500),
+            mock.patch.object(
+                main, "generate_page", wraps=main.generate_page
+            ) as streamed,
+        ):
+            pipelined = self.build("pipelined", jobs=1)
+        self.assertEqual(serial, pipelined)
+        self.assertEqual(
+            [call.kwargs["from_path"] for call in streamed.call_args_list], [big]
+        )
+
+    def test_failures_do_not_stop_the_build(self):
+        (self.content / "post3" / "index.md").write_bytes(b"\xff\xfe broken")
+        with self.assertRaises(RuntimeError) as cm:
+            self.build("out", jobs=2)
+        self.assertIn("post3", str(cm.exception))
+        self.assertEqual(len(list((self.root / "out").rglob("*.html"))), 11)
+
+
+if __name__ == "__main__":
+    unittest.main()
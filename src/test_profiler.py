@@ -0,0 +1,97 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import profiler
+from main import generate_pages_recursive
+
+TEMPLATE = Path(__file__).resolve().parent.parent / "template.html"
+
+
+class TestTracer(unittest.TestCase):
+    def tearDown(self):
+        profiler.stop()
+
+    def test_span_is_a_no_op_when_profiling_is_off(self):
+        self.assertIsNone(profiler.active())
+        with profiler.span("parse"):
+            pass
+
+    def test_stage_spans_are_attributed_to_their_page(self):
+        tracer = profiler.start()
+        with profiler.span("page", cat="page", path="a.md"):
+            with profiler.span("parse"):
+                pass
+        with profiler.span("static assets", cat="build"):
+            pass
+        parse, page, build = tracer.events
+        self.assertEqual((parse["name"], parse["ph"]), ("parse", "X"))
+        self.assertEqual(parse["args"], {"page": "a.md"})
+        self.assertEqual(page["args"], {"path": "a.md"})
+        self.assertEqual(build["args"], {})
+        self.assertGreaterEqual(page["dur"], parse["dur"])
+
+    def test_memory_peak(self):
+        tracer = profiler.start(track_memory=True)
+        with profiler.span("page", cat="page", memory=True, path="a.md"):
+            data = [0] * 100_000
+        del data
+        self.assertGreater(tracer.events[0]["args"]["peak_bytes"], 100_000 * 8)
+
+    def test_slowest_pages(self):
+        tracer = profiler.Tracer()
+        tracer.events = [
+            {"name": "page", "cat": "page", "dur": 2000, "args": {"path": "a"}},
+            {"name": "page", "cat": "page", "dur": 5000, "args": {"path": "b"}},
+            {"name": "parse", "cat": "stage", "dur": 1500, "args": {"page": "b"}},
+            {"name": "inline", "cat": "stage", "dur": 500, "args": {"page": "b"}},
+            {"name": "inline", "cat": "stage", "dur": 250, "args": {"page": "b"}},
+        ]
+        (slowest,) = profiler.slowest_pages(tracer, top=1)
+        self.assertEqual(slowest["path"], "b")
+        self.assertEqual(slowest["ms"], 5.0)
+        self.assertEqual(slowest["stages"], {"parse": 1.5, "inline": 0.75})
+
+    def test_write_trace(self):
+        tracer = profiler.start()
+        with profiler.span("parse"):
+            pass
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "cache" / "trace.json"
+            profiler.write_trace(tracer, path)
+            trace = json.loads(path.read_text(encoding="utf-8"))
+        metadata, event = trace["traceEvents"]
+        self.assertEqual(metadata["ph"], "M")
+        self.assertEqual(metadata["args"], {"name": "main"})
+        self.assertEqual(event["name"], "parse")
+
+
+class TestProfiledBuild(unittest.TestCase):
+    def tearDown(self):
+        profiler.stop()
+
+    def test_worker_spans_reach_the_parent(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for i in range(4):
+                page = root / "content" / f"post{i}" / "index.md"
+                page.parent.mkdir(parents=True)
+                page.write_text(f"# Post {i}\n\nSome **bold** text\n")
+            (root / "docs").mkdir()
+            tracer = profiler.start(track_memory=True)
+            with self.assertLogs(level="INFO"):
+                generate_pages_recursive(
+                    root / "content", TEMPLATE, root / "docs", jobs=2
+                )
+        pages = [event for event in tracer.events if event["cat"] == "page"]
+        self.assertEqual(len(pages), 4)
+        slowest = profiler.slowest_pages(tracer)
+        self.assertEqual(len(slowest), 4)
+        for page in slowest:
+            self.assertIn("parse", page["stages"])
+            self.assertIsNotNone(page["peak_bytes"])
+
+
+if __name__ == "__main__":
+    unittest.main()
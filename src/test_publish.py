@@ -0,0 +1,118 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from publish import Generations
+
+
+class TestGenerations(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.output = self.root / "docs"
+        self.output.mkdir()
+        (self.output / "index.html").write_text("v0")
+        (self.output / "index.css").write_text("body {}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, generations, version, clean=False):
+        with self.assertLogs(level="INFO"):
+            staging = generations.stage(clean=clean)
+            # Outputs are replaced, as generate_page writes them
+            tmp = staging / "index.html.tmp"
+            tmp.write_text(version)
+            tmp.replace(staging / "index.html")
+            return generations.publish(staging)
+
+    def test_publish_exchanges_directories(self):
+        generations = Generations(self.output)
+        self.assertEqual(self.build(generations, "v1"), "000001")
+        self.assertTrue(self.output.is_dir())
+        self.assertFalse(self.output.is_symlink())
+        self.assertEqual((self.output / "index.html").read_text(), "v1")
+        # What was built in place before is kept as a generation
+        old = generations.directory / "000000"
+        self.assertEqual((old / "index.html").read_text(), "v0")
+        self.assertEqual(
+            (old / "index.css").stat().st_ino,
+            (self.output / "index.css").stat().st_ino,
+        )
+
+        self.assertEqual(self.build(generations, "v2"), "000002")
+        self.assertEqual(generations.names(), ["000000", "000001", "000002"])
+        self.assertEqual(generations.current(), "000002")
+        self.assertEqual((self.output / "index.html").read_text(), "v2")
+
+    def test_publish_without_exchange(self):
+        generations = Generations(self.output)
+        with mock.patch("publish.exchange", return_value=False) as exchange:
+            self.build(generations, "v1")
+            with self.assertLogs(level="INFO"):
+                generations.rollback()
+        exchange.assert_called()
+        self.assertEqual((self.output / "index.html").read_text(), "v0")
+        self.assertEqual(generations.names(), ["000000", "000001"])
+        self.assertEqual(generations.current(), "000000")
+
+    def test_symlinked_output_is_replaced(self):
+        generations = Generations(self.output)
+        old = generations.directory / "000001"
+        old.parent.mkdir()
+        self.output.rename(old)
+        self.output.symlink_to(Path(old.parent.name) / old.name)
+        self.assertEqual(self.build(generations, "v2"), "000002")
+        self.assertFalse(self.output.is_symlink())
+        self.assertEqual(generations.names(), ["000001", "000002"])
+
+    def test_clean_build_starts_empty(self):
+        generations = Generations(self.output)
+        self.build(generations, "v1", clean=True)
+        self.assertEqual(os.listdir(self.output), ["index.html"])
+
+    def test_rollback(self):
+        generations = Generations(self.output)
+        self.build(generations, "v1")
+        self.build(generations, "v2")
+        with self.assertLogs(level="INFO"):
+            self.assertEqual(generations.rollback(), "000001")
+            self.assertEqual((self.output / "index.html").read_text(), "v1")
+            self.assertEqual(generations.rollback("000002"), "000002")
+            with self.assertRaises(ValueError):
+                generations.rollback("000009")
+        # A new build starts from the last build, not the rolled back one
+        with self.assertLogs(level="INFO"):
+            generations.rollback("000000")
+        self.build(generations, "v3")
+        self.assertEqual((self.output / "index.css").read_text(), "body {}")
+
+    def test_failed_build_is_resumed(self):
+        generations = Generations(self.output)
+        with self.assertLogs(level="INFO"):
+            staging = generations.stage()
+        (staging / "new.html").write_text("new")
+        self.assertEqual((self.output / "index.html").read_text(), "v0")
+        with self.assertLogs(level="INFO"):
+            self.assertEqual(generations.stage(), staging)
+        self.build(generations, "v1")
+        self.assertEqual((self.output / "new.html").read_text(), "new")
+
+    def test_clean_keeps_the_published_generation(self):
+        generations = Generations(self.output, keep=2)
+        for version in ("v1", "v2", "v3"):
+            self.build(generations, version)
+        with self.assertLogs(level="INFO"):
+            generations.rollback("000000")
+        self.assertEqual(generations.stale(), ["000001"])
+        with self.assertLogs(level="INFO") as logs:
+            generations.clean().join()
+        self.assertIn("Removed 1 old generations", "\n".join(logs.output))
+        self.assertEqual(generations.names(), ["000000", "000002", "000003"])
+        self.assertEqual((self.output / "index.html").read_text(), "v0")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from htmlnode import LeafNode, ParentNode
+from render import (
+    RenderContext,
+    compile_template,
+    get_render_context,
+    template_dependencies,
+)
+
+
+class TestRenderContext(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.template = self.root / "templates" / "page.html"
+        self.template.parent.mkdir()
+        self.template.write_text("<title>{{ Title }}</title><main>{{ Content }}</main>")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_generate_streams_chunks(self):
+        context = RenderContext(self.template)
+        chunks = list(context.generate(Title="T", Content="<p>x</p>"))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), "<title>T</title><main><p>x</p></main>")
+
+    def test_stream_splices_content(self):
+        context = RenderContext(self.template)
+        body = ParentNode("p", [LeafNode("b", "x")])
+        chunks = list(context.stream(body, Title="T"))
+        self.assertIn("<b>", chunks)
+        self.assertEqual(
+            "".join(chunks), "<title>T</title><main><p><b>x</b></p></main>"
+        )
+
+    def test_context_is_shared(self):
+        first = get_render_context(self.template)
+        self.assertIs(get_render_context(self.template), first)
+
+    def test_context_is_rebuilt_when_template_changes(self):
+        first = get_render_context(self.template)
+        self.template.write_text("{{ Title }}!")
+        stat = self.template.stat()
+        os.utime(self.template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        second = get_render_context(self.template)
+        self.assertIsNot(second, first)
+        self.assertEqual("".join(second.generate(Title="T")), "T!")
+
+    def test_compiled_template(self):
+        cache_dir = self.root / "cache"
+        (cache_dir / "old").mkdir(parents=True)
+        digests = {"page.html": "abc"}
+        compiled_dir = compile_template(self.template, digests, cache_dir)
+        self.assertEqual(list(cache_dir.iterdir()), [compiled_dir])
+        self.assertEqual(len(list(compiled_dir.glob("tmpl_*.py"))), 1)
+
+        # The template source is no longer needed once it is compiled
+        self.template.write_text("changed")
+        context = RenderContext(self.template, compiled_dir)
+        self.assertEqual(
+            "".join(context.generate(Title="T", Content="")),
+            "<title>T</title><main></main>",
+        )
+        self.assertEqual(
+            compile_template(self.template, digests, cache_dir), compiled_dir
+        )
+        self.assertNotEqual(
+            compile_template(self.template, {"page.html": "def"}, cache_dir),
+            compiled_dir,
+        )
+        self.assertFalse(compiled_dir.exists())
+
+    def test_compiled_template_follows_jinja2_version(self):
+        cache_dir = self.root / "cache"
+        digests = {"page.html": "abc"}
+        compiled_dir = compile_template(self.template, digests, cache_dir)
+        with mock.patch("render.jinja2_version", return_value="0.0"):
+            upgraded_dir = compile_template(self.template, digests, cache_dir)
+        self.assertNotEqual(upgraded_dir, compiled_dir)
+        self.assertFalse(compiled_dir.exists())
+
+    def test_template_dependencies(self):
+        (self.root / "templates" / "base.html").write_text(
+            "{{ url('/x.css') }}{% block body %}{% endblock %}"
+        )
+        (self.root / "templates" / "footer.html").write_text("{{ Year }}")
+        self.template.write_text(
+            '{% extends "base.html" %}'
+            '{% block body %}{{ Content }}{% include "footer.html" %}{% endblock %}'
+        )
+        templates, variables, urls = template_dependencies(self.template)
+        self.assertEqual(sorted(templates), ["base.html", "footer.html", "page.html"])
+        self.assertEqual(templates["page.html"], self.template)
+        self.assertEqual(variables, {"url", "Content", "Year"})
+        self.assertEqual(urls, {"/x.css"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from blocks import markdown_to_html_node
+from search import SearchIndex, index_page, page_url, tokenize
+from sitefixture import SiteTestCase
+
+MARKDOWN = """# Glorfindel
+
+The **elf** lord of [Rivendell](/blog/rivendell).
+
+- Balrog slayer
+- Elf of Gondolin
+
+![An elf](/images/elf.png)
+"""
+
+
+class TestIndexing(unittest.TestCase):
+    def test_tokenize(self):
+        self.assertEqual(
+            tokenize("The Elf-lord, of Gondolin: a Balrog's bane"),
+            ["elf", "lord", "gondolin", "balrog", "bane"],
+        )
+
+    def test_terms_are_weighted_by_block(self):
+        terms = index_page("Glorfindel", markdown_to_html_node(MARKDOWN))
+        # Title and heading
+        self.assertEqual(terms["glorfindel"], 18)
+        # Paragraph and list item
+        self.assertEqual(terms["elf"], 3)
+        self.assertEqual(terms["balrog"], 2)
+        self.assertEqual(terms["rivendell"], 1)
+        # Image alt text and urls are not indexed
+        self.assertNotIn("an", terms)
+        self.assertNotIn("images", terms)
+
+    def test_terms_collected_while_parsing_match(self):
+        terms = {}
+        node = markdown_to_html_node(MARKDOWN, lazy=True, terms=terms)
+        node.to_html()
+        self.assertEqual(
+            index_page("Glorfindel", node, terms),
+            index_page("Glorfindel", markdown_to_html_node(MARKDOWN)),
+        )
+
+    def test_page_url(self):
+        self.assertEqual(page_url("index.html"), "/")
+        self.assertEqual(page_url("blog/tom/index.html"), "/blog/tom/")
+        self.assertEqual(page_url("about.html"), "/about.html")
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.state = self.root / "search.json"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self, name):
+        return json.loads((self.root / "search" / name).read_text())
+
+    def test_write_only_changed_shards(self):
+        index = SearchIndex(self.state)
+        index.update("a.md", "a/index.html", "A", {"elf": 3, "balrog": 1})
+        index.update("b.md", "b.html", "B", {"elf": 5})
+        self.assertEqual(index.write(self.root, "/site/"), (2, 0))
+        self.assertEqual(
+            self.read("index.json"),
+            {
+                "prefix_length": 2,
+                "pages": [["/site/a/", "A"], ["/site/b.html", "B"]],
+                "shards": ["ba", "el"],
+            },
+        )
+        self.assertEqual(self.read("el.json"), {"elf": [[1, 5], [0, 3]]})
+
+        index = SearchIndex.load(self.state)
+        index.update("b.md", "b.html", "B", {"elf": 5, "elbereth": 1})
+        self.assertEqual(index.write(self.root), (1, 0))
+        index.prune(["b.md"])
+        self.assertEqual(index.write(self.root), (1, 1))
+        self.assertFalse((self.root / "search" / "ba.json").exists())
+        self.assertEqual(self.read("index.json")["pages"], [None, ["/b.html", "B"]])
+
+        # Ids of removed pages are reused
+        index = SearchIndex.load(self.state)
+        index.update("d.md", "d.html", "D", {"tom": 1})
+        index.update("c.md", "c.html", "C", {"tom": 1})
+        index.write(self.root)
+        self.assertEqual(index.pages["c.md"]["id"], 0)
+        self.assertEqual(index.pages["d.md"]["id"], 2)
+
+
+class TestIndexedBuild(SiteTestCase):
+    def page(self, i):
+        return MARKDOWN.replace("Glorfindel", f"Post{i}")
+
+    def build(self, name, **kwargs):
+        destination = self.root / name
+        log = self.generate(
+            destination,
+            manifest_path=self.root / f"{name}.json",
+            search=True,
+            search_state_path=self.root / f"{name}-search.json",
+            **kwargs,
+        )
+        outputs = {
+            path.name: path.read_text() for path in (destination / "search").iterdir()
+        }
+        return outputs, log
+
+    def test_all_render_paths_index_alike(self):
+        pipelined, _ = self.build("pipelined")
+        serial, _ = self.build("serial", io_threads=0, ast_cache_dir=self.root / "ast")
+        parallel, _ = self.build("parallel", jobs=2)
+        self.assertEqual(pipelined, serial)
+        self.assertEqual(pipelined, parallel)
+        self.assertEqual(json.loads(pipelined["po.json"])["post1"], [[1, 18]])
+
+    def test_only_changed_pages_are_reindexed(self):
+        self.build("out")
+        (self.content / "post1" / "index.md").write_text("# Post1\n\nNew words\n")
+        outputs, log = self.build("out")
+        self.assertIn("1 generated", log)
+        # The shards of the words post1 lost or gained; "po" kept its postings
+        self.assertIn("3 pages, 8 shards written", log)
+        self.assertEqual(json.loads(outputs["ba.json"]), {"balrog": [[0, 2], [2, 2]]})
+        self.assertEqual(json.loads(outputs["ne.json"]), {"new": [[1, 1]]})
+
+        (self.content / "post2" / "index.md").unlink()
+        outputs, log = self.build("out")
+        self.assertIn("Search index: 2 pages", log)
+        self.assertEqual(len(json.loads(outputs["index.json"])["pages"]), 2)
+
+    def test_enabling_search_indexes_up_to_date_pages(self):
+        self.generate(self.root / "out", manifest_path=self.root / "out.json")
+        _, log = self.build("out", explain=True)
+        self.assertIn("not in the search index", log)
+        self.assertIn("Search index: 3 pages", log)
+
+
+if __name__ == "__main__":
+    unittest.main()
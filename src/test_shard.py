@@ -0,0 +1,126 @@
+import unittest
+
+from shard import (
+    SHARD_MANIFEST,
+    assign_shards,
+    load_shard_manifest,
+    merge_shards,
+    parse_shard,
+)
+from sitefixture import SiteTestCase
+
+
+class TestAssignShards(unittest.TestCase):
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/4"), (2, 4))
+        for value in ("0/4", "5/4", "2", "a/4", "-1/4"):
+            with self.assertRaises(ValueError):
+                parse_shard(value)
+
+    def test_pages_keep_their_shard(self):
+        sizes = {f"post{i}/index.md": 0 for i in range(50)}
+        shards = assign_shards(sizes, 4)
+        self.assertEqual(set(shards.values()), {1, 2, 3, 4})
+        more = assign_shards({**sizes, "new/index.md": 0}, 4)
+        self.assertEqual({key: more[key] for key in sizes}, shards)
+
+    def test_balance_by_size(self):
+        sizes = {"a.md": 900, "b.md": 500, "c.md": 400, "d.md": 100}
+        shards = assign_shards(sizes, 2, balance=True)
+        self.assertEqual(shards, {"a.md": 1, "b.md": 2, "c.md": 2, "d.md": 1})
+
+
+class TestShardedBuild(SiteTestCase):
+    pages = 10
+
+    def page(self, i):
+        return f"# Post {i}\n\n" + "Words. " * i * 10
+
+    def build(self, name, shard=None, balance=False):
+        destination = self.root / name
+        destination.mkdir()
+        (destination / "index.css").write_text("body {}")
+        self.generate(
+            destination,
+            manifest_path=self.root / f"{name}.json",
+            shard=shard,
+            shard_balance=balance,
+        )
+        return destination
+
+    def tree(self, directory):
+        return {
+            path.relative_to(directory): path.read_bytes()
+            for path in directory.rglob("*")
+            if path.is_file()
+        }
+
+    def test_merged_shards_match_a_full_build(self):
+        for balance in (False, True):
+            with self.subTest(balance=balance):
+                name = f"b{int(balance)}"
+                full = self.build(f"{name}-full")
+                shards = [self.build(f"{name}-{i}", (i, 3), balance) for i in (1, 2, 3)]
+                pages = [len(load_shard_manifest(s)["pages"]) for s in shards]
+                self.assertEqual(sum(pages), 10)
+                self.assertNotIn(0, pages)
+
+                merged = self.root / f"{name}-merged"
+                with self.assertLogs(level="INFO"):
+                    merge_shards(shards, merged)
+                self.assertEqual(self.tree(merged), self.tree(full))
+
+    def test_collisions_are_refused(self):
+        shards = [self.build(f"s{i}", (i, 2)) for i in (1, 2)]
+        merged = self.root / "merged"
+
+        (shards[1] / "index.css").write_text("body { margin: 0 }")
+        with self.assertLogs(level="ERROR") as logs:
+            with self.assertRaises(ValueError):
+                merge_shards(shards, merged)
+        self.assertIn("index.css differs", "\n".join(logs.output))
+        self.assertFalse(merged.exists())
+        (shards[1] / "index.css").write_text("body {}")
+
+        page = next(iter(load_shard_manifest(shards[0])["pages"].values()))
+        (shards[1] / page).parent.mkdir(parents=True)
+        (shards[1] / page).write_text("stale")
+        with self.assertLogs(level="ERROR") as logs:
+            with self.assertRaises(ValueError):
+                merge_shards(shards, merged)
+        self.assertIn(f"{page} is in {shards[1]}", "\n".join(logs.output))
+
+    def test_full_build_removes_the_shard_manifest(self):
+        destination = self.build("out", (1, 2))
+        self.assertTrue((destination / SHARD_MANIFEST).exists())
+        self.generate(destination, manifest_path=self.root / "out.json")
+        self.assertFalse((destination / SHARD_MANIFEST).exists())
+
+    def test_shard_built_over_a_full_build(self):
+        full = self.build("s1")
+        self.generate(full, manifest_path=self.root / "s1-shard.json", shard=(1, 2))
+        shards = [full, self.build("s2", (2, 2))]
+        with self.assertLogs(level="INFO"):
+            merge_shards(shards, self.root / "merged")
+        self.assertEqual(len(list((self.root / "merged").rglob("*.html"))), 10)
+
+    def test_missing_shard_is_refused(self):
+        shard = self.build("s1", (1, 2))
+        with self.assertLogs(level="ERROR") as logs:
+            with self.assertRaises(ValueError):
+                merge_shards([shard], self.root / "merged")
+        self.assertIn("Shard 2/2 is missing", "\n".join(logs.output))
+
+    def test_shard_manifest_is_not_merged(self):
+        shards = [self.build(f"s{i}", (i, 2)) for i in (1, 2)]
+        merged = self.root / "merged"
+        merged.mkdir()
+        (merged / "old.html").write_text("old")
+        with self.assertLogs(level="INFO"):
+            self.assertEqual(merge_shards(shards, merged)[1], 1)
+        self.assertFalse((merged / SHARD_MANIFEST).exists())
+        self.assertFalse((merged / "old.html").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
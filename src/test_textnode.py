@@ -1,5 +1,7 @@
 import unittest
 
+from bench import inline_texts, legacy_text_to_textnodes
+from corpus import generate_corpus
 from textnode import (
     TextNode,
     TextType,
@@ -24,6 +26,9 @@ class TestTextNode(unittest.TestCase):
         node2 = TextNode("This is a different text node", TextType.TEXT)
         self.assertNotEqual(node, node2)
 
+    def test_no_instance_dict(self):
+        self.assertFalse(hasattr(TextNode("x", TextType.TEXT), "__dict__"))
+
     def test_repr(self):
         node = TextNode("This is a text node", TextType.BOLD)
         expected_repr = "TextNode(This is a text node, bold, None)"
@@ -187,6 +192,122 @@ class TestTextToTextNodes(unittest.TestCase):
         ]
         self.assertEqual(nodes, expected_nodes)
 
+    def test_matches_four_pass_tokenizer(self):
+        pages = [page for _, page in generate_corpus(20, inline_density=0.3, seed=1)]
+        for text in inline_texts(pages):
+            with self.subTest(text=text):
+                expected = [
+                    node
+                    for node in legacy_text_to_textnodes(text)
+                    if node.text or node.text_type != TextType.TEXT
+                ]
+                self.assertEqual(text_to_textnodes(text), expected)
+
+    def test_empty_text(self):
+        self.assertEqual(text_to_textnodes(""), [])
+
+    def test_no_empty_text_nodes(self):
+        self.assertEqual(
+            text_to_textnodes("**bold**"), [TextNode("bold", TextType.BOLD)]
+        )
+
+
+class TestInlineNestingRules(unittest.TestCase):
+    def test_span_contents_are_literal(self):
+        self.assertEqual(
+            text_to_textnodes("**a _b_ `c`** d"),
+            [
+                TextNode("a _b_ `c`", TextType.BOLD),
+                TextNode(" d", TextType.TEXT),
+            ],
+        )
+
+    def test_code_keeps_underscores(self):
+        self.assertEqual(
+            text_to_textnodes("call `snake_case_name` now"),
+            [
+                TextNode("call ", TextType.TEXT),
+                TextNode("snake_case_name", TextType.CODE),
+                TextNode(" now", TextType.TEXT),
+            ],
+        )
+
+    def test_link_label_is_literal(self):
+        self.assertEqual(
+            text_to_textnodes("[**x**](/a) and ![_y_](/b.png)"),
+            [
+                TextNode("**x**", TextType.LINK, "/a"),
+                TextNode(" and ", TextType.TEXT),
+                TextNode("_y_", TextType.IMAGE, "/b.png"),
+            ],
+        )
+
+    def test_leftmost_construct_wins(self):
+        self.assertEqual(
+            text_to_textnodes("`a [b](/c) d` e"),
+            [
+                TextNode("a [b](/c) d", TextType.CODE),
+                TextNode(" e", TextType.TEXT),
+            ],
+        )
+
+    def test_links_inside_spans(self):
+        self.assertEqual(
+            text_to_textnodes("**Read [the guide](/guide)** now"),
+            [
+                TextNode("Read ", TextType.BOLD),
+                TextNode("the guide", TextType.LINK, "/guide"),
+                TextNode(" now", TextType.TEXT),
+            ],
+        )
+        self.assertEqual(
+            text_to_textnodes("_see ![pic](/images/a.png)_"),
+            [
+                TextNode("see ", TextType.ITALIC),
+                TextNode("pic", TextType.IMAGE, "/images/a.png"),
+            ],
+        )
+
+    def test_span_does_not_close_inside_a_link(self):
+        self.assertEqual(
+            text_to_textnodes("snake_case [link](/a_b)"),
+            [
+                TextNode("snake_case ", TextType.TEXT),
+                TextNode("link", TextType.LINK, "/a_b"),
+            ],
+        )
+        self.assertEqual(
+            text_to_textnodes("_a [b_c](/d_e) f_ g"),
+            [
+                TextNode("a ", TextType.ITALIC),
+                TextNode("b_c", TextType.LINK, "/d_e"),
+                TextNode(" f", TextType.ITALIC),
+                TextNode(" g", TextType.TEXT),
+            ],
+        )
+
+    def test_unmatched_delimiters_are_text(self):
+        self.assertEqual(
+            text_to_textnodes("2 ** 3 and a_b and ![broken]( and ``"),
+            [TextNode("2 ** 3 and a_b and ![broken]( and ``", TextType.TEXT)],
+        )
+
+    def test_bang_before_link(self):
+        self.assertEqual(
+            text_to_textnodes("Wow![x](/y)"),
+            [
+                TextNode("Wow", TextType.TEXT),
+                TextNode("x", TextType.IMAGE, "/y"),
+            ],
+        )
+        self.assertEqual(
+            text_to_textnodes("Wow! [x](/y)"),
+            [
+                TextNode("Wow! ", TextType.TEXT),
+                TextNode("x", TextType.LINK, "/y"),
+            ],
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+from blocks import markdown_to_html_node
+from htmlnode import LeafNode, ParentNode
+from urls import asset_url, rewrite_urls, site_urls, url_for
+
+
+class TestUrlFor(unittest.TestCase):
+    def test_site_absolute_urls_get_basepath(self):
+        self.assertEqual(url_for("/index.css", "/site/"), "/site/index.css")
+        self.assertEqual(url_for("/blog/tom", "/site"), "/site/blog/tom")
+        self.assertEqual(url_for("/", "/site/"), "/site/")
+
+    def test_other_urls_are_unchanged(self):
+        for url in ["https://boot.dev", "//cdn.example.com/x.js", "img.png", "#top"]:
+            self.assertEqual(url_for(url, "/site/"), url)
+
+    def test_default_basepath(self):
+        self.assertEqual(url_for("/index.css"), "/index.css")
+
+    def test_fingerprinted_assets(self):
+        assets = {"/index.css": "/index.abc.css"}
+        self.assertEqual(url_for("/index.css", "/site/", assets), "/site/index.abc.css")
+        self.assertEqual(url_for("/index.css", "/", assets), "/index.abc.css")
+        self.assertEqual(url_for("/other.css", "/", assets), "/other.css")
+        self.assertEqual(asset_url("/index.css?v=1#x", assets), "/index.abc.css?v=1#x")
+        self.assertIsNone(asset_url("/index.cs", assets))
+
+
+class TestRewriteUrls(unittest.TestCase):
+    def test_rewrites_href_and_src(self):
+        shared = {"href": "/a", "class": "x"}
+        node = ParentNode(
+            "p",
+            [
+                LeafNode("a", "A", shared),
+                LeafNode("img", "", {"src": "/i.png", "alt": "/not-a-url"}),
+            ],
+        )
+        rewrite_urls(node, "/site/")
+        self.assertEqual(
+            node.to_html(),
+            '<p><a href="/site/a" class="x">A</a>'
+            '<img src="/site/i.png" alt="/not-a-url"></img></p>',
+        )
+        self.assertEqual(shared, {"href": "/a", "class": "x"})
+
+    def test_rewrites_fingerprinted_assets(self):
+        node = markdown_to_html_node(
+            "![i](/i.png) [a](/a)", assets={"/i.png": "/i.123.png"}
+        )
+        self.assertEqual(
+            node.to_html(),
+            '<div><p><img src="/i.123.png" alt="i"></img> <a href="/a">a</a></p></div>',
+        )
+
+    def test_markdown_text_is_not_rewritten(self):
+        md = 'See [home](/) and `href="/x"`\n\n```\n<img src="/y.png">\n```'
+        html = markdown_to_html_node(md, basepath="/site/").to_html()
+        self.assertEqual(
+            html,
+            '<div><p>See <a href="/site/">home</a> and <code>href="/x"</code></p>'
+            '<pre><code><img src="/y.png">\n</code></pre></div>',
+        )
+
+
+class TestSiteUrls(unittest.TestCase):
+    def test_collects_site_absolute_urls(self):
+        md = "[a](/blog/a) [b](https://x.org) ![i](/i.png) [c](rel)\n\n[a](/blog/a)"
+        refs = set()
+        node = markdown_to_html_node(md, basepath="/site/", refs=refs)
+        self.assertEqual(refs, {"/blog/a", "/i.png"})
+        self.assertEqual(site_urls(node), {"/site/blog/a", "/site/i.png"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import main
+from watch import diff_snapshots, snapshot, watch
+
+TEMPLATE = Path(__file__).resolve().parent.parent / "template.html"
+
+# An hour ago: older than any page a rebuild writes
+PAST = time.time_ns() - 3600 * 10**9
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        (self.root / "content" / "blog").mkdir(parents=True)
+        self.page = self.root / "content" / "blog" / "index.md"
+        self.page.write_text("# Hi")
+        self.template = self.root / "template.html"
+        self.template.write_text("{{ Content }}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_snapshot_walks_directories_and_files(self):
+        snap = snapshot([self.root / "content", self.template, self.root / "missing"])
+        self.assertEqual(set(snap), {self.page, self.template})
+        self.assertEqual(snap[self.page][1], 4)
+
+    def test_snapshot_skips_ignored_content(self):
+        content = self.root / "content"
+        for rel in ("drafts/secret.md", "node_modules/pkg/README.md", "blog/x.md"):
+            (content / rel).parent.mkdir(parents=True, exist_ok=True)
+            (content / rel).write_text("# x")
+        ignore = content / ".ssgignore"
+        ignore.write_text("drafts/\nx.md\n")
+        with mock.patch("watch.os.scandir", wraps=os.scandir) as scandir:
+            snap = snapshot([content], content)
+        self.assertEqual(set(snap), {self.page, ignore})
+        walked = {Path(call.args[0]).name for call in scandir.call_args_list}
+        self.assertEqual(walked, {"content", "blog"})
+        # Other roots are not filtered
+        self.assertEqual(len(snapshot([content])), 5)
+
+    def test_diff_snapshots(self):
+        before = snapshot([self.root / "content"])
+        self.page.write_text("# Hello")
+        new_page = self.root / "content" / "new.md"
+        new_page.write_text("x")
+        changed, removed = diff_snapshots(before, snapshot([self.root / "content"]))
+        self.assertEqual(changed, {self.page, new_page})
+        self.assertEqual(removed, set())
+
+        before = snapshot([self.root / "content"])
+        new_page.unlink()
+        changed, removed = diff_snapshots(before, snapshot([self.root / "content"]))
+        self.assertEqual((changed, removed), (set(), {new_page}))
+
+    def test_watch_reports_changes(self):
+        calls = []
+
+        def edit(_):
+            stat = self.page.stat()
+            os.utime(self.page, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        with mock.patch("watch.time.sleep", side_effect=edit):
+            with self.assertLogs(level="INFO") as logs:
+                watch(
+                    [self.root / "content"],
+                    lambda changed, removed: calls.append((changed, removed)),
+                    max_rounds=2,
+                )
+        self.assertEqual(calls, [({self.page}, set())] * 2)
+        self.assertIn("Rebuilt after 1 changed", logs.output[-1])
+
+    def test_watch_survives_failed_rebuild(self):
+        def fail(changed, removed):
+            raise ValueError("broken page")
+
+        def edit(_):
+            self.page.write_text(self.page.read_text() + "!")
+
+        with mock.patch("watch.time.sleep", side_effect=edit):
+            with self.assertLogs(level="ERROR") as logs:
+                watch([self.root / "content"], fail, max_rounds=2)
+        self.assertEqual(len(logs.output), 2)
+
+
+class TestRebuildOutputs(unittest.TestCase):
+    """
+    What watch mode rebuilds: main.rebuild_outputs on a small site, built
+    in a temporary working directory as main.py builds the current one.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.tmp.name)
+        for i in range(3):
+            page = main.CONTENT_DIR / f"post{i}" / "index.md"
+            page.parent.mkdir(parents=True)
+            page.write_text(f"# Post {i}\n")
+        (main.CONTENT_DIR / ".ssgignore").write_text("drafts/\n")
+        main.STATIC_DIR.mkdir()
+        (main.STATIC_DIR / "index.css").write_text("body {}\n")
+        shutil.copy(TEMPLATE, main.TEMPLATE_FILE)
+        self.args = main.parse_args(["/"])
+        with self.assertLogs(level="INFO"):
+            main.build_site(self.args)
+
+    def rebuilt(self, touched):
+        """
+        Run the rebuild for touched and return the pages it wrote.
+        """
+        pages = list(main.OUTPUT_DIR.rglob("*.html"))
+        for page in pages:
+            os.utime(page, ns=(PAST, PAST))
+        with self.assertLogs(level="INFO"):
+            main.rebuild_outputs(self.args, touched, assets_changed=False)
+        return {
+            page.relative_to(main.OUTPUT_DIR).as_posix()
+            for page in main.OUTPUT_DIR.rglob("*.html")
+            if page.stat().st_mtime_ns != PAST
+        }
+
+    def test_content_edit_rebuilds_its_page(self):
+        page = main.CONTENT_DIR / "post1" / "index.md"
+        page.write_text("# Post 1\n\nEdited\n")
+        self.assertEqual(self.rebuilt({page}), {"post1/index.html"})
+        self.assertIn("Edited", (main.OUTPUT_DIR / "post1" / "index.html").read_text())
+
+    def test_template_edit_rebuilds_every_page(self):
+        main.TEMPLATE_FILE.write_text(
+            main.TEMPLATE_FILE.read_text() + "<!-- edited -->\n"
+        )
+        self.assertEqual(
+            self.rebuilt({main.TEMPLATE_FILE}),
+            {f"post{i}/index.html" for i in range(3)},
+        )
+
+    def test_ignored_content_is_not_published(self):
+        touched = set()
+        for rel in ("drafts/secret.md", "node_modules/pkg/README.md"):
+            path = main.CONTENT_DIR / rel
+            path.parent.mkdir(parents=True)
+            path.write_text("# Secret\n")
+            touched.add(path)
+        page = main.CONTENT_DIR / "post0" / "index.md"
+        page.write_text("# Post 0\n\nEdited\n")
+        self.assertEqual(self.rebuilt({*touched, page}), {"post0/index.html"})
+        self.assertFalse((main.OUTPUT_DIR / "drafts").exists())
+        self.assertFalse((main.OUTPUT_DIR / "node_modules").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,7 +13,18 @@ class TextType(Enum):
     IMAGE = "image"
 
 
+_IMAGE_RE = re.compile(r"!\[(.*?)\]\((.*?)\)")
+_LINK_RE = re.compile(r"\[(.*?)\]\((.*?)\)")
+_LINK_OR_IMAGE_RE = re.compile(r"(!)?\[(.*?)\]\((.*?)\)")
+
+# Everything that can start an inline construct, for text_to_textnodes
+_INLINE_START_RE = re.compile(r"!?\[|\*\*|_|`")
+_DELIMITERS = {"**": TextType.BOLD, "_": TextType.ITALIC, "`": TextType.CODE}
+
+
 class TextNode:
+    __slots__ = ("text", "text_type", "url")
+
     def __init__(self, text, text_type, url=None):
         self.text = text
         self.text_type = text_type
@@ -63,11 +74,11 @@ def split_nodes_delimiter(old_nodes, delimiter, text_type):
 
 
 def extract_markdown_images(text):
-    return re.findall(r"!\[(.*?)\]\((.*?)\)", text)
+    return _IMAGE_RE.findall(text)
 
 
 def extract_markdown_links(text):
-    return re.findall(r"\[(.*?)\]\((.*?)\)", text)
+    return _LINK_RE.findall(text)
 
 
 def split_nodes_links_and_images(old_nodes):
@@ -75,11 +86,9 @@ def split_nodes_links_and_images(old_nodes):
     for old_node in old_nodes:
         old_node_text = old_node.text
         old_node_type = old_node.text_type
-
-        pattern = re.compile(r"(!)?\[(.*?)\]\((.*?)\)")
         last_end = 0
 
-        for m in pattern.finditer(old_node_text):
+        for m in _LINK_OR_IMAGE_RE.finditer(old_node_text):
             if m.start() > last_end:
                 text_chunk = old_node_text[last_end : m.start()]
                 new_nodes.append(TextNode(text_chunk, old_node_type))
@@ -108,26 +117,74 @@ def split_nodes_link(old_nodes):
     return split_nodes_links_and_images(old_nodes)
 
 
+def find_span_close(text, delimiter, start):
+    """
+    Return the index of the delimiter closing a span whose contents start
+    at start, or -1. A delimiter inside a complete link or image, such as
+    the _ of [link](/a_b), does not close the span.
+    """
+    pos = start
+    while True:
+        close = text.find(delimiter, pos)
+        if close == -1:
+            return -1
+        link = _LINK_OR_IMAGE_RE.search(text, pos)
+        if link is None or link.start() >= close:
+            return close
+        pos = link.end()
+
+
 def text_to_textnodes(text):
-    node = TextNode(text, TextType.TEXT)
-    pass1 = split_nodes_links_and_images([node])
-    pass2 = []
-    for text_chunk in pass1:
-        if text_chunk.text_type == TextType.TEXT:
-            pass2 += split_nodes_delimiter([text_chunk], "**", TextType.BOLD)
-        else:
-            pass2.append(text_chunk)
-    pass3 = []
-    for text_chunk in pass2:
-        if text_chunk.text_type == TextType.TEXT:
-            pass3 += split_nodes_delimiter([text_chunk], "_", TextType.ITALIC)
-        else:
-            pass3.append(text_chunk)
-    pass4 = []
-    for text_chunk in pass3:
-        if text_chunk.text_type == TextType.TEXT:
-            pass4 += split_nodes_delimiter([text_chunk], "`", TextType.CODE)
+    """
+    Split text into TextNodes in a single left-to-right scan.
+
+    Nesting rules:
+    - The leftmost construct wins. The label of a link or image and the
+      contents of a `code` span are kept literally.
+    - A **bold** or _italic_ span ends at the next occurrence of its own
+      delimiter outside a link or image. Links and images in it become
+      nodes of their own (not bold or italic), the rest of its contents is
+      kept literally.
+    - A delimiter with no closing partner, or with nothing between it and
+      its partner, is plain text. So is a [ or ![ that does not start a
+      complete [label](url).
+    - Empty text nodes are never emitted.
+    """
+    nodes = []
+    text_start = 0
+    scan_from = 0
+    while True:
+        m = _INLINE_START_RE.search(text, scan_from)
+        if m is None:
+            break
+        start, token = m.start(), m.group()
+
+        if token[-1] == "[":
+            link = _LINK_OR_IMAGE_RE.match(text, start)
+            if link is None:
+                scan_from = start + 1
+                continue
+            text_type = TextType.IMAGE if link.group(1) else TextType.LINK
+            span = [TextNode(link.group(2), text_type, link.group(3))]
+            end = link.end()
         else:
-            pass4.append(text_chunk)
-
-    return pass4
+            if token == "`":
+                close = text.find(token, m.end())
+            else:
+                close = find_span_close(text, token, m.end())
+            if close <= m.end():
+                scan_from = m.end()
+                continue
+            span = [TextNode(text[m.end() : close], _DELIMITERS[token])]
+            if token != "`" and "[" in span[0].text:
+                span = split_nodes_links_and_images(span)
+            end = close + len(token)
+
+        if start > text_start:
+            nodes.append(TextNode(text[text_start:start], TextType.TEXT))
+        nodes.extend(span)
+        text_start = scan_from = end
+
+    if text_start < len(text):
+        nodes.append(TextNode(text[text_start:], TextType.TEXT))
+    return nodes
@@ -0,0 +1,74 @@
+URL_PROPS = ("href", "src")
+
+
+def url_for(url, basepath="/", assets=None):
+    """
+    Prefix a site-absolute url ("/blog/tom") with basepath.
+    Relative urls, full urls and protocol-relative urls ("//cdn...") are
+    returned unchanged.
+
+    assets maps the urls of fingerprinted assets to their fingerprinted
+    urls ({"/index.css": "/index.1a2b3c4d5e.css"}); such urls are replaced
+    before the basepath is added.
+    """
+    if not is_site_url(url):
+        return url
+    if assets:
+        url = asset_url(url, assets) or url
+    if basepath == "/":
+        return url
+    return basepath.rstrip("/") + url
+
+
+def is_site_url(url):
+    return url.startswith("/") and not url.startswith("//")
+
+
+def asset_url(url, assets):
+    """
+    Return the fingerprinted url of the asset url points to, keeping any
+    query or fragment, or None if it is not a fingerprinted asset.
+    """
+    end = min((i for i in (url.find("?"), url.find("#")) if i != -1), default=None)
+    fingerprinted = assets.get(url[:end])
+    if fingerprinted is None:
+        return None
+    return fingerprinted + (url[end:] if end is not None else "")
+
+
+def rewrite_urls(node, basepath="/", assets=None):
+    """
+    Apply url_for to the href and src props of node and all its descendants.
+    Returns node. Props dicts are replaced rather than modified, so nodes
+    that share a props dict are not affected.
+    """
+    if basepath == "/" and not assets:
+        return node
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        props = current.props
+        if props and any(prop in props for prop in URL_PROPS):
+            current.props = {
+                prop: url_for(value, basepath, assets) if prop in URL_PROPS else value
+                for prop, value in props.items()
+            }
+        stack.extend(current.children)
+    return node
+
+
+def site_urls(node):
+    """
+    Return the set of site-absolute href and src urls in node and all its
+    descendants: the pages and assets it refers to.
+    """
+    urls = set()
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        for prop in URL_PROPS:
+            url = current.props.get(prop)
+            if url is not None and is_site_url(url):
+                urls.add(url)
+        stack.extend(current.children)
+    return urls
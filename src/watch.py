@@ -0,0 +1,99 @@
+import logging
+import os
+import time
+
+from discover import IGNORE_FILE, IgnoreRules, read_ignore_file
+
+
+def snapshot(roots, content=None):
+    """
+    Return {path: (mtime_ns, size)} for every file under roots.
+    A root can be a directory or a single file; missing roots are skipped.
+
+    Under the root content, the directories and markdown files that
+    .ssgignore rules exclude from a build are skipped, as
+    iter_markdown_files skips them; ignored directories are not walked.
+    """
+    files = {}
+    pending = []
+    for root in roots:
+        try:
+            stat = root.stat()
+        except FileNotFoundError:
+            continue
+        if root.is_dir():
+            rules = IgnoreRules.default() if root == content else None
+            pending.append((root, "", rules))
+        else:
+            files[root] = (stat.st_mtime_ns, stat.st_size)
+
+    while pending:
+        directory, rel, rules = pending.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            continue
+        if rules is not None:
+            rules = rules.extend(rel, read_ignore_file(directory / IGNORE_FILE)[1])
+        for entry in entries:
+            path = directory / entry.name
+            child = f"{rel}/{entry.name}" if rel else entry.name
+            try:
+                if entry.is_dir():
+                    if rules is None or not rules.ignored(child, is_dir=True):
+                        pending.append((path, child, rules))
+                elif rules is not None and entry.name.endswith(".md"):
+                    if not rules.ignored(child, is_dir=False):
+                        stat = entry.stat()
+                        files[path] = (stat.st_mtime_ns, stat.st_size)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files[path] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                continue
+    return files
+
+
+def diff_snapshots(old, new):
+    """
+    Return (changed, removed): the paths added or modified between two
+    snapshots, and the paths that disappeared.
+    """
+    changed = {path for path, state in new.items() if old.get(path) != state}
+    removed = set(old) - set(new)
+    return changed, removed
+
+
+def watch(roots, on_change, interval=0.5, max_rounds=None, content=None):
+    """
+    Poll roots every interval seconds and call on_change(changed, removed)
+    with the sets of changed and removed files whenever something changes.
+    Ignored files under content are not watched, see snapshot.
+
+    Errors raised by on_change are logged and watching continues, so a
+    broken edit does not end the session. max_rounds stops the loop after
+    that many polls, for tests.
+    """
+    logging.info(f"Watching {', '.join(str(root) for root in roots)} for changes")
+    previous = snapshot(roots, content)
+    rounds = 0
+    while max_rounds is None or rounds < max_rounds:
+        rounds += 1
+        time.sleep(interval)
+        current = snapshot(roots, content)
+        changed, removed = diff_snapshots(previous, current)
+        previous = current
+        if not changed and not removed:
+            continue
+
+        start = time.perf_counter()
+        try:
+            on_change(changed, removed)
+        except Exception as e:
+            logging.error(f"Rebuild failed: {e}")
+            continue
+        elapsed = (time.perf_counter() - start) * 1000
+        logging.info(
+            f"Rebuilt after {len(changed)} changed and {len(removed)} removed "
+            f"file(s) in {elapsed:.1f} ms"
+        )